@@ -6,13 +6,26 @@ Outputs a JSON report of findings categorized by type and risk level.
 
 import os
 import re
-import json
 import sys
+import time
+import tempfile
+import subprocess
+from collections import Counter
 from pathlib import Path
 from typing import TypedDict
 from dataclasses import dataclass, field, asdict
+from urllib.parse import urlsplit
 
-@dataclass
+from source_reader import SkippedFile
+from rules import rule, run_rules, project_rules, is_project_rule, SourceFile, ProjectView, Tag, CssRule
+from render_order import deferrable_sections
+from audit_hydration import audit_islands, HEAVY_ISLAND_GZIP_BYTES
+from apply_optimizations import SCRIPT_PATTERN, image_loading_tag, DELAYED_TYPE, load_delay_allowlist, delay_tracking_scripts
+from report_formats import add_report_arguments, emit
+from changed_files import (changed_files, touches_project, import_graph, affected_files, import_closure,
+                           tracked_files, materialize, link_build_output, PROJECT_FILE_PATTERN)
+
+@dataclass(slots=True)
 class Finding:
     type: str
     severity: str  # "high", "medium", "low"
@@ -22,12 +35,28 @@ class Finding:
     message: str
     suggestion: str
     auto_fixable: bool = False
+    
+    def __post_init__(self):
+        # A large report repeats a few rules and files many times; keep one copy of each
+        self.type = sys.intern(self.type)
+        self.severity = sys.intern(self.severity)
+        self.risk = sys.intern(self.risk)
+        self.file = sys.intern(self.file)
+    
+    def to_dict(self) -> dict:
+        """JSON-ready copy, without asdict's recursive deep copy."""
+        return {
+            'type': self.type, 'severity': self.severity, 'risk': self.risk, 'file': self.file,
+            'line': self.line, 'message': self.message, 'suggestion': self.suggestion,
+            'auto_fixable': self.auto_fixable,
+        }
 
 @dataclass
 class AnalysisReport:
     project_path: str
     findings: list[Finding] = field(default_factory=list)
     summary: dict = field(default_factory=dict)
+    skipped: list[SkippedFile] = field(default_factory=list)  # Binary/generated files not scanned
 
 def find_astro_root(start_path: str) -> Path | None:
     """Find the Astro project root by looking for astro.config.*"""
@@ -37,126 +66,111 @@ def find_astro_root(start_path: str) -> Path | None:
             return parent
     return None
 
-def analyze_images(project_path: Path) -> list[Finding]:
-    """Analyze image usage for optimization opportunities."""
-    findings = []
-    src_path = project_path / "src"
-    public_path = project_path / "public"
-    
-    # Check for images without width/height or aspect-ratio
-    for astro_file in src_path.rglob("*.astro"):
-        content = astro_file.read_text(errors='ignore')
-        
-        # Find img tags without width/height
-        img_pattern = r'<img[^>]*>'
-        for match in re.finditer(img_pattern, content, re.IGNORECASE):
-            img_tag = match.group()
-            has_dimensions = ('width=' in img_tag and 'height=' in img_tag) or 'aspect-ratio' in img_tag
-            
-            if not has_dimensions and 'Image' not in img_tag:
-                line_num = content[:match.start()].count('\n') + 1
-                findings.append(Finding(
-                    type="image_cls",
-                    severity="high",
-                    risk="safe",
-                    file=str(astro_file.relative_to(project_path)),
-                    line=line_num,
-                    message="Image missing width/height attributes (causes CLS)",
-                    suggestion="Add width and height attributes or use Astro's <Image> component",
-                    auto_fixable=False
-                ))
-        
-        # Check for missing loading attribute on below-fold images
-        if '<img' in content and 'loading=' not in content:
-            findings.append(Finding(
-                type="image_loading",
-                severity="medium",
-                risk="safe",
-                file=str(astro_file.relative_to(project_path)),
-                line=None,
-                message="Images without explicit loading strategy",
-                suggestion="Add loading='lazy' for below-fold images, loading='eager' for above-fold",
-                auto_fixable=True
-            ))
-        
-        # Check for missing fetchpriority on hero images
-        hero_patterns = ['hero', 'banner', 'header-image', 'main-image', 'lcp']
-        for pattern in hero_patterns:
-            if pattern in content.lower() and 'fetchpriority' not in content:
-                findings.append(Finding(
-                    type="image_priority",
-                    severity="high",
-                    risk="safe",
-                    file=str(astro_file.relative_to(project_path)),
-                    line=None,
-                    message=f"Potential hero/LCP image without fetchpriority attribute",
-                    suggestion="Add fetchpriority='high' to your main above-fold image",
-                    auto_fixable=True
-                ))
-                break
-    
-    # Check for non-optimized image formats in public/
-    if public_path.exists():
-        for img_file in public_path.rglob("*"):
-            if img_file.suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif']:
-                findings.append(Finding(
-                    type="image_format",
-                    severity="medium",
-                    risk="safe",
-                    file=str(img_file.relative_to(project_path)),
-                    line=None,
-                    message=f"Image could be converted to modern format (AVIF/WebP)",
-                    suggestion="Convert to AVIF for best compression, WebP for broader support",
-                    auto_fixable=False
-                ))
-    
-    return findings
+# ---------------------------------------------------------------------------
+# Rules
+#
+# Each analyzer is a rule registered with rules.py. File rules receive the parsed
+# form they declare for every matching file in a single walk of the tree; see
+# rules.py for the forms and for adding project-specific rules.
+# ---------------------------------------------------------------------------
 
-def analyze_fonts(project_path: Path) -> list[Finding]:
-    """Analyze font loading for optimization opportunities."""
-    findings = []
-    src_path = project_path / "src"
-    
-    # Check CSS files for @font-face without preload
-    css_files = list(src_path.rglob("*.css")) + list(src_path.rglob("*.scss"))
-    font_files = []
-    
-    for css_file in css_files:
-        content = css_file.read_text(errors='ignore')
-        
-        # Find @font-face declarations
-        font_face_pattern = r'@font-face\s*\{[^}]*src:\s*url\(["\']?([^"\')\s]+)["\']?\)[^}]*\}'
-        for match in re.finditer(font_face_pattern, content, re.IGNORECASE | re.DOTALL):
-            font_url = match.group(1)
-            font_files.append(font_url)
-    
-    # Check for Google Fonts
-    for file in src_path.rglob("*.astro"):
-        content = file.read_text(errors='ignore')
-        if 'fonts.googleapis.com' in content or 'fonts.gstatic.com' in content:
-            findings.append(Finding(
-                type="font_external",
+RASTER_FORMATS = ['.jpg', '.jpeg', '.png', '.gif']
+# Project rules that only read pages through ProjectView.render_order
+RENDER_ORDER_RULES = {'image_loading', 'image_priority', 'css_content_visibility', 'island_hydration'}
+
+@rule("image_dimensions", extensions=[".astro"], form="tags")
+def check_image_dimensions(tags: list[Tag], file: SourceFile, state: dict):
+    """Images without width/height or aspect-ratio shift layout when they load."""
+    for tag in tags:
+        if tag.name.lower() != 'img':
+            continue
+        has_dimensions = ('width=' in tag.raw and 'height=' in tag.raw) or 'aspect-ratio' in tag.raw
+        if not has_dimensions:
+            yield Finding(
+                type="image_cls",
                 severity="high",
-                risk="risky",
-                file=str(file.relative_to(project_path)),
-                line=None,
-                message="Using Google Fonts (external dependency, extra DNS lookup)",
-                suggestion="Self-host fonts for better performance. Download from google-webfonts-helper or fontsource",
+                risk="safe",
+                file=file.rel,
+                line=tag.line,
+                message="Image missing width/height attributes (causes CLS)",
+                suggestion="Add width and height attributes or use Astro's <Image> component",
                 auto_fixable=False
-            ))
-    
-    # Check if fonts are preloaded in layouts
-    layout_files = list(src_path.rglob("**/layouts/*.astro")) + list(src_path.rglob("Layout*.astro"))
-    fonts_preloaded = False
-    
-    for layout in layout_files:
-        content = layout.read_text(errors='ignore')
-        if 'rel="preload"' in content and ('as="font"' in content or "as='font'" in content):
-            fonts_preloaded = True
-            break
-    
-    if font_files and not fonts_preloaded:
-        findings.append(Finding(
+            )
+
+@rule("image_loading", form="project")
+def check_image_loading(project: ProjectView, state: dict):
+    """Find images below the fold on every page that renders them but not lazy-loaded."""
+    for (file, _), (decision, img) in project.render_order.loading_decisions.items():
+        if decision != 'lazy' or not image_loading_tag(img.tag, decision)[1]:
+            continue
+        yield Finding(
+            type="image_loading",
+            severity="medium",
+            risk="safe",
+            file=file,
+            line=img.line,
+            message="Below-the-fold image without a loading strategy",
+            suggestion="Add loading='lazy' (apply_optimizations.py)",
+            auto_fixable=True
+        )
+
+@rule("image_priority", form="project")
+def check_image_priority(project: ProjectView, state: dict):
+    """Find LCP image candidates that are not fetched eagerly at high priority."""
+    for (file, _), (decision, img) in project.render_order.loading_decisions.items():
+        if decision != 'lcp':
+            continue
+        if not image_loading_tag(img.tag, decision)[1]:
+            continue
+        yield Finding(
+            type="image_priority",
+            severity="high",
+            risk="safe",
+            file=file,
+            line=img.line,
+            message="LCP image candidate is not fetched eagerly at high priority",
+            suggestion="Add fetchpriority='high' and loading='eager' (apply_optimizations.py)",
+            auto_fixable=True
+        )
+
+@rule("image_format", extensions=RASTER_FORMATS, form="file", root="public")
+def check_image_format(file: SourceFile, _, state: dict):
+    """Check for non-optimized image formats in public/."""
+    yield Finding(
+        type="image_format",
+        severity="medium",
+        risk="safe",
+        file=file.rel,
+        line=None,
+        message=f"Image could be converted to modern format (AVIF/WebP)",
+        suggestion="Convert to AVIF for best compression, WebP for broader support",
+        auto_fixable=False
+    )
+
+FONT_SRC_PATTERN = r'src:\s*url\(["\']?([^"\')\s]+)["\']?\)'
+
+@rule("font_external", extensions=[".astro"], form="file")
+def check_font_external(file: SourceFile, _, state: dict):
+    """Check for Google Fonts."""
+    if file.contains(b'fonts.googleapis.com', b'fonts.gstatic.com'):
+        yield Finding(
+            type="font_external",
+            severity="high",
+            risk="risky",
+            file=file.rel,
+            line=None,
+            message="Using Google Fonts (external dependency, extra DNS lookup)",
+            suggestion="Self-host fonts for better performance. Download from google-webfonts-helper or fontsource",
+            auto_fixable=False
+        )
+
+def is_layout(file: SourceFile) -> bool:
+    return file.path.parent.name == 'layouts' or file.path.name.startswith('Layout')
+
+def finish_font_preload(project: ProjectView, state: dict):
+    """Check if fonts are preloaded in layouts."""
+    if state.get('fonts') and not state.get('preloaded'):
+        yield Finding(
             type="font_preload",
             severity="high",
             risk="safe",
@@ -165,262 +179,516 @@ def analyze_fonts(project_path: Path) -> list[Finding]:
             message="Fonts declared in CSS but not preloaded",
             suggestion="Add <link rel='preload' href='/fonts/your-font.woff2' as='font' type='font/woff2' crossorigin> in layout <head>",
             auto_fixable=True
-        ))
-    
-    # Check for font-display
-    for css_file in css_files:
-        content = css_file.read_text(errors='ignore')
-        if '@font-face' in content and 'font-display' not in content:
-            findings.append(Finding(
-                type="font_display",
-                severity="medium",
-                risk="safe",
-                file=str(css_file.relative_to(project_path)),
-                line=None,
-                message="@font-face without font-display property",
-                suggestion="Add font-display: swap (or optional) to prevent FOIT",
-                auto_fixable=True
-            ))
-    
-    return findings
+        )
 
-def analyze_prefetch(project_path: Path) -> list[Finding]:
-    """Analyze page prefetching configuration."""
-    findings = []
-    
-    # Check astro.config for prefetch settings
-    config_files = list(project_path.glob("astro.config.*"))
-    if config_files:
-        config_content = config_files[0].read_text(errors='ignore')
-        
-        if 'prefetch' not in config_content:
-            findings.append(Finding(
-                type="prefetch_config",
-                severity="medium",
-                risk="safe",
-                file=str(config_files[0].relative_to(project_path)),
-                line=None,
-                message="No prefetch configuration found",
-                suggestion="Enable Astro's built-in prefetch: prefetch: { defaultStrategy: 'viewport' }",
-                auto_fixable=True
-            ))
-    
-    return findings
+@rule("font_preload", extensions=[".css", ".scss", ".astro"], form="file", finish=finish_font_preload)
+def collect_font_preloads(file: SourceFile, _, state: dict):
+    """Note @font-face sources in CSS and font preloads in layouts."""
+    if file.suffix in ('.css', '.scss'):
+        for css_rule in file.css:
+            if css_rule.prelude.lower() == '@font-face' and re.search(FONT_SRC_PATTERN, css_rule.body, re.IGNORECASE):
+                state['fonts'] = True
+    elif is_layout(file):
+        if file.contains(b'rel="preload"') and file.contains(b'as="font"', b"as='font'"):
+            state['preloaded'] = True
 
-def analyze_preconnect(project_path: Path) -> list[Finding]:
-    """Analyze third-party origins that could benefit from preconnect."""
-    findings = []
-    src_path = project_path / "src"
-    
-    third_party_origins = set()
-    origin_pattern = r'https?://[a-zA-Z0-9][a-zA-Z0-9-]*\.[a-zA-Z]{2,}'
-    
-    for file in src_path.rglob("*.astro"):
-        content = file.read_text(errors='ignore')
-        for match in re.finditer(origin_pattern, content):
-            origin = match.group()
-            # Exclude common localhost patterns
-            if 'localhost' not in origin and '127.0.0.1' not in origin:
-                third_party_origins.add(origin.split('/')[0] + '//' + origin.split('/')[2])
-    
-    # Check if preconnect exists for these origins
-    layout_files = list(src_path.rglob("**/layouts/*.astro")) + list(src_path.rglob("Layout*.astro"))
-    preconnected = set()
-    
-    for layout in layout_files:
-        content = layout.read_text(errors='ignore')
-        if 'rel="preconnect"' in content or "rel='preconnect'" in content:
-            for origin in third_party_origins:
-                if origin in content:
-                    preconnected.add(origin)
-    
-    missing_preconnect = third_party_origins - preconnected
-    if missing_preconnect:
-        findings.append(Finding(
-            type="preconnect",
+@rule("font_display", extensions=[".css", ".scss"], form="css")
+def check_font_display(css_rules: list[CssRule], file: SourceFile, state: dict):
+    """Check for @font-face without font-display."""
+    missing = [r for r in css_rules if r.prelude.lower() == '@font-face' and 'font-display' not in r.body]
+    if missing:
+        yield Finding(
+            type="font_display",
             severity="medium",
             risk="safe",
-            file="src/layouts/",
+            file=file.rel,
+            line=missing[0].line,
+            message="@font-face without font-display property",
+            suggestion="Add font-display: swap (or optional) to prevent FOIT",
+            auto_fixable=True
+        )
+
+@rule("prefetch_config", form="project")
+def check_prefetch_config(project: ProjectView, state: dict):
+    """Check astro.config for prefetch settings."""
+    if project.config and 'prefetch' not in project.config_text:
+        yield Finding(
+            type="prefetch_config",
+            severity="medium",
+            risk="safe",
+            file=project.rel(project.config),
             line=None,
-            message=f"Third-party origins without preconnect: {', '.join(list(missing_preconnect)[:3])}",
-            suggestion="Add <link rel='preconnect' href='ORIGIN'> for external resources",
+            message="No prefetch configuration found",
+            suggestion="Enable Astro's built-in prefetch: prefetch: { defaultStrategy: 'viewport' }",
             auto_fixable=True
-        ))
-    
-    return findings
+        )
 
-def analyze_scripts(project_path: Path) -> list[Finding]:
-    """Analyze script loading patterns."""
-    findings = []
-    src_path = project_path / "src"
-    
-    for file in src_path.rglob("*.astro"):
-        content = file.read_text(errors='ignore')
-        
-        # Check for third-party scripts without defer/async
-        script_pattern = r'<script[^>]*src=["\']https?://[^"\']+["\'][^>]*>'
-        for match in re.finditer(script_pattern, content, re.IGNORECASE):
-            script_tag = match.group()
-            if 'defer' not in script_tag and 'async' not in script_tag:
-                line_num = content[:match.start()].count('\n') + 1
-                findings.append(Finding(
-                    type="script_blocking",
-                    severity="high",
-                    risk="risky",
-                    file=str(file.relative_to(project_path)),
-                    line=line_num,
-                    message="Third-party script without defer/async (render-blocking)",
-                    suggestion="Add defer or async attribute, or load on interaction",
-                    auto_fixable=True
-                ))
-        
-        # Check for analytics/tracking loaded immediately
-        tracking_patterns = ['analytics', 'gtag', 'gtm', 'facebook', 'pixel', 'hotjar', 'intercom', 'crisp', 'drift']
-        for pattern in tracking_patterns:
-            if pattern in content.lower() and 'setTimeout' not in content and 'requestIdleCallback' not in content:
-                if f'<script' in content and pattern in content.lower():
-                    findings.append(Finding(
-                        type="script_tracking",
-                        severity="medium",
-                        risk="risky",
-                        file=str(file.relative_to(project_path)),
-                        line=None,
-                        message=f"Tracking/analytics script loaded immediately",
-                        suggestion="Delay non-critical scripts with setTimeout or load on user interaction",
-                        auto_fixable=False
-                    ))
-                    break
-    
-    return findings
+RESOURCE_URL_PATTERNS = [
+    r'\b(?:src|srcset|poster|data)\s*=\s*[{`]?["\'`]?(?P<url>(?:https?:)?//[^\s"\'`)}>,]+)',
+    r'<link\b(?=[^>]*\brel\s*=\s*["\']?(?:stylesheet|preload|modulepreload|icon|manifest)\b)[^>]*\bhref\s*=\s*["\'](?P<url>(?:https?:)?//[^"\']+)',
+    r'url\(\s*["\']?(?P<url>(?:https?:)?//[^"\')\s]+)',
+    r'@import\s+(?:url\()?\s*["\'](?P<url>(?:https?:)?//[^"\']+)',
+    r'\b(?:fetch|import)\(\s*["\'`](?P<url>(?:https?:)?//[^"\'`]+)',
+    r'\bfrom\s+["\'](?P<url>https?://[^"\']+)',
+    r'!\[[^\]]*\]\(\s*(?P<url>https?://[^)\s]+)',  # Markdown images
+]
+HINT_PATTERN = r'<link\b(?=[^>]*\brel\s*=\s*["\']?(?P<rel>preconnect|dns-prefetch)\b)[^>]*\bhref\s*=\s*["\'](?P<url>[^"\']+)'
+ORIGIN_SOURCE_EXTENSIONS = ['.astro', '.mdx', '.md', '.css', '.scss', '.ts', '.js', '.jsx', '.tsx']
+MAX_PRECONNECTS = 3  # Browsers only benefit from a few early connections
+
+def normalize_origin(url: str) -> str | None:
+    """Parse a URL into scheme://host[:port], dropping default ports. None if not absolute."""
+    if url.startswith('//'):
+        url = 'https:' + url
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme not in ('http', 'https') or not host or '.' not in host:
+        return None
+    if port and not (parts.scheme == 'https' and port == 443) and not (parts.scheme == 'http' and port == 80):
+        return f"{parts.scheme}://{host}:{port}"
+    return f"{parts.scheme}://{host}"
+
+def site_origin(project_path: Path) -> str | None:
+    """The site's own origin from `site:` in astro.config."""
+    for config in project_path.glob("astro.config.*"):
+        match = re.search(r'\bsite\s*:\s*["\']([^"\']+)', config.read_text(errors='ignore'))
+        if match:
+            return normalize_origin(match.group(1))
+    return None
+
+@dataclass
+class OriginUsage:
+    origin: str
+    urls: set[str] = field(default_factory=set)
+    pages: set[str] = field(default_factory=set)
+    files: set[str] = field(default_factory=set)
+    critical: bool = False
+    first_use: tuple[str, int | None, int] | None = None  # (file, line, position) of the first critical use
+    
+    def record(self, url: str, where: str, file: str, line: int | None, position: int, critical: bool):
+        self.urls.add(url)
+        (self.pages if where.startswith('/') else self.files).add(where)
+        if critical:
+            # Offsets only order uses within one file; across files the first one recorded
+            # (sources in walk order, then built pages) is kept
+            if not self.critical or (file == self.first_use[0] and position < self.first_use[2]):
+                self.first_use = (file, line, position)
+            self.critical = True
+        elif self.first_use is None:
+            self.first_use = (file, line, position)
+
+def collect_source_origins(file: SourceFile, _, state: dict):
+    """Record third-party resource URLs referenced from a source file."""
+    usage = state.setdefault('usage', {})
+    hints = state.setdefault('hints', {})
+    if not file.contains(b'//'):
+        return  # No absolute URLs
+    content = file.text
+    rel = file.rel
+    for pattern in RESOURCE_URL_PATTERNS:
+        for match in re.finditer(pattern, content, re.IGNORECASE):
+            url = match.group('url')
+            origin = normalize_origin(url)
+            if origin:
+                line = content[:match.start()].count('\n') + 1
+                # Fonts and stylesheets referenced from layouts/CSS sit on the critical path
+                critical = file.suffix in ('.css', '.scss') or '/layouts/' in f"/{rel}" or match.group(0).lstrip().lower().startswith('<link')
+                usage.setdefault(origin, OriginUsage(origin)).record(url, rel, rel, line, match.start(), critical)
+    for match in re.finditer(HINT_PATTERN, content, re.IGNORECASE):
+        origin = normalize_origin(match.group('url'))
+        if origin:
+            hints.setdefault(origin, set()).add(match.group('rel').lower())
+
+def collect_dist_origins(project_path: Path, usage: dict[str, OriginUsage], hints: dict[str, set[str]]):
+    """Record third-party resources requested by built pages, with critical-path position."""
+    from dist_pages import find_dist, iter_pages, parse_page, rel_values
+    from estimate_lcp import pick_lcp_image
+    
+    dist = find_dist(project_path)
+    if not dist:
+        return
+    for route, html_file in iter_pages(dist):
+        page = parse_page(html_file, dist)
+        html_rel = str(html_file.relative_to(project_path))
+        lcp = pick_lcp_image(page)
+        for tag in page.tags:
+            rels = rel_values(tag) if tag.tag == 'link' else set()
+            if rels & {'preconnect', 'dns-prefetch'}:
+                origin = normalize_origin(tag.attrs.get('href') or '')
+                if origin:
+                    hints.setdefault(origin, set()).update(rels & {'preconnect', 'dns-prefetch'})
+                continue
+            urls = []
+            if tag.tag == 'link' and rels & {'stylesheet', 'preload', 'modulepreload', 'icon'}:
+                urls.append(tag.attrs.get('href') or '')
+            elif tag.tag in ('script', 'img', 'iframe', 'video', 'audio', 'source'):
+                urls.append(tag.attrs.get('src') or '')
+                urls.extend(c.strip().split(' ')[0] for c in (tag.attrs.get('srcset') or '').split(','))
+            elif tag.tag == 'style':
+                urls.extend(re.findall(r'url\(\s*["\']?([^"\')\s]+)', tag.text))
+            sync_script = tag.tag == 'script' and not ({'async', 'defer'} & set(tag.attrs)) and tag.attrs.get('type') != 'module'
+            critical = tag is lcp or (tag.in_head and (tag.tag in ('link', 'style') or sync_script))
+            for url in urls:
+                origin = normalize_origin(url)
+                if origin:
+                    usage.setdefault(origin, OriginUsage(origin)).record(url, route, html_rel, None, tag.offset, critical)
 
-def analyze_css(project_path: Path) -> list[Finding]:
-    """Analyze CSS for optimization opportunities."""
+def finish_preconnect(project: ProjectView, state: dict) -> list[Finding]:
+    """
+    Inventory third-party origins and produce a ranked resource-hint plan:
+    preconnect for the top critical origins, dns-prefetch for the rest.
+    """
     findings = []
-    src_path = project_path / "src"
-    
-    # Check for content-visibility usage
-    css_files = list(src_path.rglob("*.css")) + list(src_path.rglob("*.scss"))
-    has_content_visibility = False
-    
-    for css_file in css_files:
-        content = css_file.read_text(errors='ignore')
-        if 'content-visibility' in content:
-            has_content_visibility = True
-            break
+    project_path = project.path
+    usage: dict[str, OriginUsage] = state.setdefault('usage', {})
+    hints: dict[str, set[str]] = state.setdefault('hints', {})
+    
+    collect_dist_origins(project_path, usage, hints)
+    
+    own = site_origin(project_path)
+    for origin in list(usage):
+        host = urlsplit(origin).hostname or ''
+        if origin == own or host in ('localhost', '127.0.0.1'):
+            del usage[origin]
+    
+    ranked = sorted(
+        usage.values(),
+        key=lambda u: (not u.critical, -len(u.pages), -len(u.files), -len(u.urls), u.first_use[0], u.first_use[2]),
+    )
+    preconnect = [u for u in ranked if u.critical][:MAX_PRECONNECTS]
+    
+    for rank, u in enumerate(ranked, 1):
+        wanted = 'preconnect' if u in preconnect else 'dns-prefetch'
+        if wanted in hints.get(u.origin, set()) or (wanted == 'dns-prefetch' and 'preconnect' in hints.get(u.origin, set())):
+            continue
+        counts = f"{len(u.urls)} URL(s), {len(u.pages)} page(s), {len(u.files)} source file(s)"
+        crossorigin = ' crossorigin' if any(re.search(r'\.(woff2?|ttf|otf)(\?|$)', url) for url in u.urls) else ''
+        findings.append(Finding(
+            type="preconnect" if wanted == 'preconnect' else "dns_prefetch",
+            severity="medium" if wanted == 'preconnect' else "low",
+            risk="safe",
+            file=u.first_use[0],
+            line=u.first_use[1],
+            message=f"#{rank} third-party origin {u.origin} ({counts}"
+                    f"{', on the critical path' if u.critical else ''}) has no {wanted} hint",
+            suggestion=f"Add <link rel='{wanted}' href='{u.origin}'{crossorigin}> to the layout <head>",
+            auto_fixable=True
+        ))
     
-    if not has_content_visibility:
+    preconnected = {o for o, rels in hints.items() if 'preconnect' in rels}
+    planned = preconnected | {u.origin for u in preconnect}
+    if len(planned) > MAX_PRECONNECTS:
         findings.append(Finding(
-            type="css_content_visibility",
+            type="preconnect_excess",
+            severity="medium",
+            risk="safe",
+            file="src/layouts/",
+            line=None,
+            message=f"{len(planned)} preconnects compete for early connections (recommended: {MAX_PRECONNECTS} or fewer)",
+            suggestion="Keep preconnect for the top critical origins and downgrade the rest to dns-prefetch",
+            auto_fixable=False
+        ))
+    for origin in sorted(preconnected - set(usage)):
+        findings.append(Finding(
+            type="preconnect_unused",
             severity="low",
-            risk="risky",
-            file="Global CSS",
+            risk="safe",
+            file="src/layouts/",
             line=None,
-            message="Not using content-visibility: auto for off-screen content",
-            suggestion="Add content-visibility: auto to below-fold sections for paint performance",
+            message=f"Preconnect to {origin}, but no resources are loaded from it",
+            suggestion="Remove the unused preconnect; it opens a connection that is never used",
             auto_fixable=False
         ))
     
     return findings
 
-def analyze_astro_config(project_path: Path) -> list[Finding]:
+# Registered here so finish_preconnect exists; source files are collected during the walk
+rule("preconnect", extensions=ORIGIN_SOURCE_EXTENSIONS, form="file", finish=finish_preconnect)(collect_source_origins)
+
+TRACKING_PATTERNS = ['analytics', 'gtag', 'gtm', 'facebook', 'pixel', 'hotjar', 'intercom', 'crisp', 'drift']
+TRACKING_NEEDLES = tuple(p.encode() for p in TRACKING_PATTERNS)
+TRACKING_SOURCE_PATTERN = re.compile('|'.join(TRACKING_PATTERNS), re.IGNORECASE)
+
+@rule("script_blocking", extensions=[".astro"], form="tags")
+def check_script_blocking(tags: list[Tag], file: SourceFile, state: dict):
+    """Check for third-party scripts without defer/async."""
+    for tag in tags:
+        if tag.name.lower() != 'script' or not re.search(r'src=["\']https?://[^"\']+["\']', tag.raw, re.IGNORECASE):
+            continue
+        if 'defer' not in tag.raw and 'async' not in tag.raw:
+            yield Finding(
+                type="script_blocking",
+                severity="high",
+                risk="risky",
+                file=file.rel,
+                line=tag.line,
+                message="Third-party script without defer/async (render-blocking)",
+                suggestion="Add defer or async attribute, or load on interaction",
+                auto_fixable=True
+            )
+
+@rule("script_tracking", extensions=[".astro"], form="file")
+def check_script_tracking(file: SourceFile, _, state: dict):
+    """Check for analytics/tracking scripts that run immediately."""
+    if not file.contains(b'<script') or not file.contains_folded(*TRACKING_NEEDLES):
+        return
+    eager = [m for m in SCRIPT_PATTERN.finditer(file.text)
+             if DELAYED_TYPE not in m.group(1) and TRACKING_SOURCE_PATTERN.search(m.group(1) + (m.group(3) or ''))]
+    if not eager or 'setTimeout' in file.text or 'requestIdleCallback' in file.text:
+        return
+    if 'delay_allowlist' not in state:
+        state['delay_allowlist'] = load_delay_allowlist(file.path.parents[len(Path(file.rel).parts) - 1])
+    _, delayed = delay_tracking_scripts(file.text, state['delay_allowlist'])
+    yield Finding(
+        type="script_tracking",
+        severity="medium",
+        risk="risky",
+        file=file.rel,
+        line=file.text.count('\n', 0, eager[0].start()) + 1,
+        message=f"Tracking/analytics script loaded immediately",
+        suggestion="Delay non-critical scripts until user interaction or idle" +
+                   (" (apply_optimizations.py --include-risky)" if delayed else
+                    "; add the vendor to .astro-optimizer/delay-scripts if it is an external or is:inline script"),
+        auto_fixable=bool(delayed)
+    )
+
+@rule("css_content_visibility", form="project")
+def check_content_visibility(project: ProjectView, state: dict):
+    """Find below-the-fold sections of long pages that could skip rendering until scrolled near."""
+    for section in deferrable_sections(project.path, project.render_order):
+        pages = ', '.join(p.removeprefix('src/pages/') for p in section.pages)
+        yield Finding(
+            type="css_content_visibility",
+            severity="low",
+            risk="risky",
+            file=section.file,
+            line=section.line,
+            message=f"Below-the-fold <{section.tag}> is rendered before it is scrolled to (on {pages})",
+            suggestion=f"Add content-visibility: auto; contain-intrinsic-size: auto {section.height}px "
+                       "(apply_optimizations.py --content-visibility)",
+            auto_fixable=True
+        )
+
+@rule("island_hydration", form="project")
+def check_island_hydration(project: ProjectView, state: dict):
+    """Find islands that hydrate earlier than their position and interactivity need."""
+    for island in audit_islands(project.path, project.render_order)[0]:
+        if island.suggested is None:
+            continue
+        gzip_bytes = island.js_gzip_bytes or 0
+        size = f", {gzip_bytes / 1024:.1f} KB gzipped JS" if island.js_gzip_bytes is not None else ""
+        change = f"client:{island.suggested}" if island.suggested else "no client:* directive"
+        yield Finding(
+            type="island_hydration",
+            severity="high" if gzip_bytes >= 30_000 else "medium" if gzip_bytes >= HEAVY_ISLAND_GZIP_BYTES else "low",
+            risk="risky",
+            file=island.file,
+            line=island.line,
+            message=f"<{island.component} client:{island.directive}> hydrates earlier than needed{size}",
+            suggestion=f"Use {change}: {island.reason} (apply_optimizations.py --hydration)",
+            auto_fixable=True
+        )
+
+@rule("astro_config", form="project")
+def check_astro_config(project: ProjectView, state: dict):
     """Analyze Astro configuration for optimization opportunities."""
-    findings = []
-    
-    config_files = list(project_path.glob("astro.config.*"))
-    if not config_files:
-        return findings
-    
-    config_content = config_files[0].read_text(errors='ignore')
+    if not project.config:
+        return
+    config_content = project.config_text
+    config_file = project.rel(project.config)
     
     # Check for image optimization settings
     if 'image:' not in config_content and 'astro:assets' not in config_content:
-        findings.append(Finding(
+        yield Finding(
             type="config_image",
             severity="medium",
             risk="safe",
-            file=str(config_files[0].relative_to(project_path)),
+            file=config_file,
             line=None,
             message="No explicit image optimization configuration",
             suggestion="Configure image service for automatic optimization: image: { service: sharpImageService() }",
             auto_fixable=True
-        ))
+        )
     
     # Check for compression
     if 'compress' not in config_content and 'compressHTML' not in config_content:
-        findings.append(Finding(
+        yield Finding(
             type="config_compress",
             severity="low",
             risk="safe",
-            file=str(config_files[0].relative_to(project_path)),
+            file=config_file,
             line=None,
             message="HTML compression not explicitly enabled",
             suggestion="Astro compresses HTML by default, but verify compressHTML: true in config",
             auto_fixable=True
-        ))
-    
-    return findings
+        )
 
 def analyze_project(project_path: str) -> AnalysisReport:
-    """Run all analyzers on the project."""
+    """Run all registered rules (built-in and plugins) on the project."""
     path = Path(project_path).resolve()
     report = AnalysisReport(project_path=str(path))
     
-    analyzers = [
-        analyze_images,
-        analyze_fonts,
-        analyze_prefetch,
-        analyze_preconnect,
-        analyze_scripts,
-        analyze_css,
-        analyze_astro_config,
-    ]
+    report.findings.extend(run_rules(path, project_rules(path), skipped=report.skipped))
     
-    for analyzer in analyzers:
-        try:
-            findings = analyzer(path)
-            report.findings.extend(findings)
-        except Exception as e:
-            print(f"Warning: {analyzer.__name__} failed: {e}", file=sys.stderr)
+    report.summary = summarize(report.findings)
+    report.summary["skipped_files"] = len(report.skipped)
     
-    # Generate summary
-    report.summary = {
-        "total": len(report.findings),
-        "by_severity": {
-            "high": len([f for f in report.findings if f.severity == "high"]),
-            "medium": len([f for f in report.findings if f.severity == "medium"]),
-            "low": len([f for f in report.findings if f.severity == "low"]),
-        },
-        "by_risk": {
-            "safe": len([f for f in report.findings if f.risk == "safe"]),
-            "risky": len([f for f in report.findings if f.risk == "risky"]),
+    return report
+
+def summarize(findings: list[Finding]) -> dict:
+    """Counts by severity and risk, and how many are auto-fixable, in one pass."""
+    by_severity = {"high": 0, "medium": 0, "low": 0}
+    by_risk = {"safe": 0, "risky": 0}
+    auto_fixable = 0
+    for f in findings:
+        by_severity[f.severity] = by_severity.get(f.severity, 0) + 1
+        by_risk[f.risk] = by_risk.get(f.risk, 0) + 1
+        auto_fixable += f.auto_fixable
+    return {
+        "total": len(findings),
+        "by_severity": by_severity,
+        "by_risk": by_risk,
+        "auto_fixable": auto_fixable,
+    }
+
+def finding_key(f: Finding) -> tuple:
+    # Line numbers move with unrelated edits, so they are not part of a finding's identity
+    return (f.type, f.file, f.message)
+
+def diff_findings(before: list[Finding], after: list[Finding]) -> tuple[list[Finding], list[Finding]]:
+    """Split findings into (new, resolved), matching duplicates one for one."""
+    def unmatched(findings, others):
+        remaining = Counter(map(finding_key, others))
+        extra = []
+        for f in findings:
+            if remaining[finding_key(f)]:
+                remaining[finding_key(f)] -= 1
+            else:
+                extra.append(f)
+        return extra
+    return unmatched(after, before), unmatched(before, after)
+
+def analyze_since(project_path: str, ref: str) -> dict:
+    """
+    Analyze only what changed since a git ref: changed files plus every file that
+    imports them. The same files are analyzed as of the ref, and only new and
+    resolved findings are reported. Project-level rules run only when
+    astro.config.* or a global stylesheet (imported by a layout) changed;
+    otherwise the render-order rules re-check just the affected pages.
+    """
+    path = Path(project_path).resolve()
+    changed = changed_files(path, ref)
+    importers = import_graph(path)
+    affected = affected_files(path, changed, importers)
+    project_checks = touches_project(changed, importers)
+    
+    rules = project_rules(path)
+    file_rules = [r for r in rules if not is_project_rule(r)]
+    whole_project_rules = [r for r in rules if is_project_rule(r)]
+    render_rules = [r for r in whole_project_rules if r.name in RENDER_ORDER_RULES]
+    pages = set() if project_checks or not render_rules else {
+        f for f in affected if f.startswith('src/pages/') and f.endswith('.astro')}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        before_root = Path(tmp)
+        old_files = set(affected)
+        project_files = tracked_files(path, ref, ['.'])
+        if project_checks:
+            # Project rules follow tsconfig aliases into components of any type and
+            # read image sizes, so they need the ref's whole tree, not just rule inputs
+            old_files.update(project_files)
+            link_build_output(path, before_root)
+        else:
+            old_files.update(f for f in project_files if PROJECT_FILE_PATTERN.match(f) or f == 'tsconfig.json')
+            if pages:
+                # Everything the affected pages render; public/ and dist/ only feed sizes
+                old_files.update(import_closure(path, pages))
+                link_build_output(path, before_root)
+                link_build_output(path, before_root, 'public')
+        materialize(path, ref, sorted(old_files), before_root)
+        while pages:
+            # The ref's pages may import components the working tree no longer does
+            missing = import_closure(before_root, pages) - old_files
+            if not missing:
+                break
+            materialize(path, ref, sorted(missing), before_root)
+            old_files |= missing
+        
+        skipped: list[SkippedFile] = []
+        before = run_rules(before_root, file_rules, only=affected)
+        after = run_rules(path, file_rules, only=affected, skipped=skipped)
+        if project_checks:
+            before += run_rules(before_root, whole_project_rules)
+            after += run_rules(path, whole_project_rules, skipped=skipped)
+        elif pages:
+            before += run_rules(before_root, render_rules, pages=pages)
+            after += run_rules(path, render_rules, skipped=skipped, pages=pages)
+    
+    new, resolved = diff_findings(before, after)
+    return {
+        "project_path": str(path),
+        "since": ref,
+        "changed_files": changed,
+        "analyzed_files": sorted(affected),
+        "project_checks": project_checks,
+        "rechecked_pages": sorted(pages),
+        "new": [f.to_dict() for f in new],
+        "resolved": [f.to_dict() for f in resolved],
+        "skipped": [asdict(s) for s in skipped],
+        "summary": {
+            "changed": len(changed),
+            "analyzed": len(affected),
+            "new": len(new),
+            "resolved": len(resolved),
+            "new_by_severity": summarize(new)["by_severity"],
         },
-        "auto_fixable": len([f for f in report.findings if f.auto_fixable]),
     }
-    
-    return report
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: analyze.py <project-path>", file=sys.stderr)
-        sys.exit(1)
+    import argparse
     
-    project_path = sys.argv[1]
-    astro_root = find_astro_root(project_path)
+    parser = argparse.ArgumentParser(description='Analyze an Astro project for optimization opportunities')
+    parser.add_argument('project_path', help='Path to Astro project (or a directory inside it)')
+    parser.add_argument('--since', metavar='GIT_REF',
+                        help='Only analyze files changed since GIT_REF (and files importing them); '
+                             'report new and resolved findings')
+    add_report_arguments(parser)
+    
+    args = parser.parse_args()
+    if args.since and args.history:
+        parser.error('--history records full runs and cannot be combined with --since')
+    
+    astro_root = find_astro_root(args.project_path)
     
     if not astro_root:
-        print(f"Error: Could not find Astro project at {project_path}", file=sys.stderr)
+        print(f"Error: Could not find Astro project at {args.project_path}", file=sys.stderr)
         sys.exit(1)
     
+    if args.since:
+        try:
+            output = analyze_since(str(astro_root), args.since)
+        except subprocess.CalledProcessError as e:
+            print(f"Error: git failed: {e.stderr.decode(errors='ignore').strip()}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(emit(output, "new", astro_root, "astro-optimizer", args))
+    
+    started = time.perf_counter()
     report = analyze_project(str(astro_root))
+    timings = {'analyze': time.perf_counter() - started}
     
     # Convert to JSON-serializable format
     output = {
         "project_path": report.project_path,
-        "findings": [asdict(f) for f in report.findings],
-        "summary": report.summary
+        "findings": [f.to_dict() for f in report.findings],
+        "summary": report.summary,
+        "skipped": [asdict(s) for s in report.skipped],
     }
     
-    print(json.dumps(output, indent=2))
+    sys.exit(emit(output, "findings", astro_root, "astro-optimizer", args, timings))
 
 if __name__ == "__main__":
     main()
@@ -9,8 +9,87 @@ import re
 import json
 import sys
 import shutil
+import fnmatch
+import hashlib
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from walker import walk
+from render_order import (IMAGE_TAGS, LANDMARK_TAGS, TAG_PATTERN, CLIENT_DIRECTIVE_PATTERN, RenderOrder,
+                          loading_plan, content_visibility_plan)
+from audit_hydration import hydration_plan
+
+BACKUP_DIR = '.astro-optimizer-backups'
+MANIFEST_NAME = 'apply-manifest.json'
+MANIFEST_VERSION = 1
+TMP_SUFFIX = '.astro-optimizer-tmp'
+
+# Tracking scripts delayed until interaction or idle (risky tier). Entries match
+# an external script's src or an inline script's code: substrings, or globs
+# when they contain * or ?. The project's allowlist file adds entries, and
+# "!entry" keeps matching scripts eager; the last matching entry wins.
+DELAY_ALLOWLIST_FILE = '.astro-optimizer/delay-scripts'
+DEFAULT_DELAY_ALLOWLIST = (
+    'googletagmanager.com', 'google-analytics.com', 'gtag(', 'dataLayer',
+    'static.hotjar.com', '_hjSettings', 'widget.intercom.io', 'Intercom(',
+    'connect.facebook.net', 'fbq(', 'client.crisp.chat', '$crisp',
+    'js.driftt.com', 'drift.load', 'clarity.ms', 'snap.licdn.com', 'cdn.segment.com', 'analytics.load',
+)
+DELAYED_TYPE = 'text/astro-optimizer-delayed'
+DELAYED_TYPE_ATTR = 'data-astro-optimizer-type'
+DELAY_TIMEOUT_MS = 5000
+JS_TYPES = {'', 'text/javascript', 'application/javascript', 'module'}
+LOADER_BLOCK_START = '<!-- astro-optimizer:delayed-scripts:start -->'
+LOADER_BLOCK_END = '<!-- astro-optimizer:delayed-scripts:end -->'
+LOADER_BLOCK_PATTERN = re.compile(
+    r'^([ \t]*)' + re.escape(LOADER_BLOCK_START) + r'.*?' + re.escape(LOADER_BLOCK_END) + r'[ \t]*\n?',
+    re.DOTALL | re.MULTILINE,
+)
+SCRIPT_PATTERN = re.compile(
+    r'''<script\b((?:[^>"'{]|"[^"]*"|'[^']*'|\{(?:[^{}]|\{[^{}]*\})*\})*?)(/?)>(?:(?<=/>)|(.*?)</script\s*>)''',
+    re.DOTALL | re.IGNORECASE,
+)
+
+# Runs the delayed scripts once, in document order, on the first interaction or
+# when the browser is idle after load (with a timeout). External scripts are
+# awaited so later scripts still run after them. Guarded so that several
+# components each carrying a copy only run it once.
+DELAYED_SCRIPT_LOADER = """(() => {
+  if (window.__astroOptimizerDelayed) return;
+  window.__astroOptimizerDelayed = true;
+  const events = ['pointerdown', 'keydown', 'touchstart', 'scroll', 'wheel'];
+  let started = false;
+  const run = async () => {
+    if (started) return;
+    started = true;
+    events.forEach((name) => removeEventListener(name, run));
+    if (document.readyState === 'loading') {
+      await new Promise((done) => addEventListener('DOMContentLoaded', done, { once: true }));
+    }
+    for (const old of document.querySelectorAll('script[type="%(type)s"]')) {
+      const script = document.createElement('script');
+      for (const { name, value } of old.attributes) {
+        if (name === 'type') {
+          const type = old.getAttribute('%(type_attr)s');
+          if (type) script.setAttribute('type', type);
+        } else if (name !== '%(type_attr)s') {
+          script.setAttribute(name, value);
+        }
+      }
+      script.text = old.text;
+      const loaded = script.src && new Promise((done) => { script.onload = script.onerror = done; });
+      old.replaceWith(script);
+      if (loaded) await loaded;
+    }
+  };
+  events.forEach((name) => addEventListener(name, run, { once: true, passive: true }));
+  const idle = () => ('requestIdleCallback' in window
+    ? requestIdleCallback(run, { timeout: %(timeout)d })
+    : setTimeout(run, %(timeout)d));
+  if (document.readyState === 'complete') idle();
+  else addEventListener('load', idle, { once: true });
+})();""" % {'type': DELAYED_TYPE, 'type_attr': DELAYED_TYPE_ATTR, 'timeout': DELAY_TIMEOUT_MS}
 
 def backup_file(file_path: Path, backup_dir: Path) -> Path:
     """Create a backup of a file before modifying it."""
@@ -20,54 +99,95 @@ def backup_file(file_path: Path, backup_dir: Path) -> Path:
     shutil.copy2(file_path, backup_path)
     return backup_path
 
-def add_fetchpriority_to_hero_images(content: str) -> tuple[str, list[str]]:
-    """Add fetchpriority='high' to hero/banner images."""
+def insert_attribute(tag: str, attr: str) -> str:
+    """Add an attribute before the tag's closing, on its own line for multi-line tags."""
+    close = '/>' if tag.endswith('/>') else '>'
+    body = tag[:-len(close)]
+    stripped = body.rstrip()
+    if '\n' in stripped:
+        last_line = stripped[stripped.rfind('\n') + 1:]
+        indent = last_line[:len(last_line) - len(last_line.lstrip())]
+        return f"{stripped}\n{indent}{attr}{body[len(stripped):]}{close}"
+    return f"{stripped} {attr}{' ' if close == '/>' else ''}{close}"
+
+def image_loading_tag(tag: str, decision: str) -> tuple[str, list[str]]:
+    """
+    The page's LCP candidate ("lcp") gets fetchpriority="high" and
+    loading="eager" (replacing a lazy one); images clearly below the fold
+    ("lazy") get loading="lazy".
+    """
     changes = []
-    
-    hero_patterns = [
-        (r'(<img[^>]*(?:class|id)=["\'][^"\']*(?:hero|banner|featured|lcp|main-image)[^"\']*["\'][^>]*)(/?>)', 
-         'hero/banner class'),
-        (r'(<Image[^>]*(?:class|id)=["\'][^"\']*(?:hero|banner|featured|lcp|main-image)[^"\']*["\'][^>]*)(/?>)',
-         'Astro Image component'),
-    ]
-    
-    for pattern, desc in hero_patterns:
-        def add_priority(match):
-            tag = match.group(1)
-            closing = match.group(2)
-            if 'fetchpriority' not in tag.lower():
-                changes.append(f"Added fetchpriority='high' to {desc}")
-                return f'{tag} fetchpriority="high"{closing}'
-            return match.group(0)
-        
-        content = re.sub(pattern, add_priority, content, flags=re.IGNORECASE)
-    
-    return content, changes
+    loading = re.search(r'\sloading\s*=\s*["\']?(\w+)', tag, re.IGNORECASE)
+    if decision == 'lcp':
+        if 'fetchpriority' not in tag.lower():
+            tag = insert_attribute(tag, 'fetchpriority="high"')
+            changes.append("Added fetchpriority='high' to LCP image candidate")
+        if loading and loading.group(1).lower() == 'lazy':
+            tag = re.sub(r'(\sloading\s*=\s*["\']?)lazy', r'\1eager', tag, count=1, flags=re.IGNORECASE)
+            changes.append("Changed loading='lazy' to 'eager' on LCP image candidate")
+        elif not loading:
+            tag = insert_attribute(tag, 'loading="eager"')
+            changes.append("Added loading='eager' to LCP image candidate")
+    elif not loading:
+        tag = insert_attribute(tag, 'loading="lazy"')
+        changes.append("Added loading='lazy' to below-fold image")
+    return tag, changes
+
+def content_visibility_tag(tag: str, height: int) -> tuple[str, list[str]]:
+    """Add content-visibility: auto and an estimated contain-intrinsic-size to a section's static style."""
+    if 'content-visibility' in tag or re.search(r'\sstyle\s*=\s*\{', tag):
+        return tag, []
+    declaration = f"content-visibility: auto; contain-intrinsic-size: auto {height}px"
+    style = re.search(r'''\sstyle\s*=\s*(["'])(.*?)\1''', tag, re.DOTALL)
+    if style:
+        existing = style.group(2).strip().rstrip(';')
+        value = f"{existing}; {declaration}" if existing else declaration
+        tag = tag[:style.start(2)] + value + tag[style.end(2):]
+    else:
+        tag = insert_attribute(tag, f'style="{declaration}"')
+    return tag, [f"Added content-visibility: auto (contain-intrinsic-size {height}px) to below-fold section"]
 
-def add_loading_lazy_to_images(content: str) -> tuple[str, list[str]]:
-    """Add loading='lazy' to images without loading attribute (excluding heroes)."""
+def hydration_tag(tag: str, name: str, directive: str) -> tuple[str, list[str]]:
+    """Replace an island's client:* directive with `directive`, or drop it when empty."""
+    current = CLIENT_DIRECTIVE_PATTERN.search(tag)
+    if not current or current.group(1) == directive:
+        return tag, []
+    if not directive:
+        return (tag[:current.start()] + tag[current.end():],
+                [f"Removed client:{current.group(1)} from <{name}> (nothing to hydrate)"])
+    return (tag[:current.start()] + f" client:{directive}" + tag[current.end():],
+            [f"Changed client:{current.group(1)} to client:{directive} on <{name}>"])
+
+def apply_render_order(content: str, loading: dict[int, str], sections: dict[int, int],
+                       hydration: dict[int, str] | None = None) -> tuple[str, list[str]]:
+    """
+    Apply render-order decisions, keyed by tag offset: image loading from
+    render_order.loading_plan, section heights from
+    render_order.content_visibility_plan and island directives from
+    audit_hydration.hydration_plan. Every other tag is left alone.
+    """
+    edits = sorted([(offset, 'image', d) for offset, d in loading.items()] +
+                   [(offset, 'section', h) for offset, h in sections.items()] +
+                   [(offset, 'island', d) for offset, d in (hydration or {}).items()], reverse=True)
     changes = []
-    
-    def add_lazy(match):
-        tag = match.group(0)
-        # Skip if already has loading, or if it's a hero image
-        if 'loading=' in tag.lower():
-            return tag
-        hero_indicators = ['hero', 'banner', 'featured', 'lcp', 'above-fold', 'fetchpriority']
-        if any(ind in tag.lower() for ind in hero_indicators):
-            return tag
-        
-        # Add loading="lazy" before the closing
-        if tag.endswith('/>'):
-            changes.append("Added loading='lazy' to img tag")
-            return tag[:-2] + ' loading="lazy" />'
-        elif tag.endswith('>'):
-            changes.append("Added loading='lazy' to img tag")
-            return tag[:-1] + ' loading="lazy">'
-        return tag
-    
-    content = re.sub(r'<img[^>]*/?>', add_lazy, content, flags=re.IGNORECASE)
-    
+    # From the end, so earlier offsets stay valid
+    for offset, kind, decision in edits:
+        match = TAG_PATTERN.match(content, offset)
+        if not match:
+            continue
+        if kind == 'image':
+            if match.group(2) not in IMAGE_TAGS:
+                continue
+            tag, tag_changes = image_loading_tag(match.group(0), decision)
+        elif kind == 'island':
+            tag, tag_changes = hydration_tag(match.group(0), match.group(2), decision)
+        else:
+            if match.group(2) not in LANDMARK_TAGS:
+                continue
+            tag, tag_changes = content_visibility_tag(match.group(0), decision)
+        if tag != match.group(0):
+            content = content[:offset] + tag + content[match.end():]
+        changes[:0] = tag_changes
     return content, changes
 
 def add_decoding_async_to_images(content: str) -> tuple[str, list[str]]:
@@ -108,13 +228,93 @@ def add_font_display_swap(content: str) -> tuple[str, list[str]]:
     
     return content, changes
 
+def load_delay_allowlist(path: Path) -> list[tuple[str, bool]]:
+    """(entry, negated) pairs: DEFAULT_DELAY_ALLOWLIST, then the project's DELAY_ALLOWLIST_FILE."""
+    entries = [(entry, False) for entry in DEFAULT_DELAY_ALLOWLIST]
+    allowlist = path / DELAY_ALLOWLIST_FILE
+    if allowlist.exists():
+        for line in allowlist.read_text(errors='ignore').splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                entries.append((line[1:], True) if line.startswith('!') else (line, False))
+    return entries
+
+def delay_allowed(target: str, allowlist: list[tuple[str, bool]]) -> bool:
+    allowed = False
+    for entry, negated in allowlist:
+        if any(c in entry for c in '*?'):
+            matched = fnmatch.fnmatchcase(target.lower(), f'*{entry.lower()}*')
+        else:
+            matched = entry.lower() in target.lower()
+        if matched:
+            allowed = not negated
+    return allowed
+
+def delay_tracking_scripts(content: str, allowlist: list[tuple[str, bool]]) -> tuple[str, list[str]]:
+    """
+    Turn allowlisted tracking scripts into inert DELAYED_TYPE scripts run by a
+    shared loader (RISKY). Attributes stay in place; an existing type moves to
+    DELAYED_TYPE_ATTR so the loader can restore it. Only scripts Astro leaves
+    as written are touched: external ones, and inline ones with is:inline or
+    other attributes. Plain <script> blocks are bundled by Astro and already
+    load as deferred modules.
+    """
+    changes = []
+    
+    def delay(match):
+        attrs, body = match.group(1), match.group(3) or ''
+        src = re.search(r'''\ssrc\s*=\s*["']([^"']+)["']''', attrs, re.IGNORECASE)
+        type_attr = re.search(r'''(\stype\s*=\s*)(["'])([^"']*)\2''', attrs, re.IGNORECASE)
+        script_type = type_attr.group(3).strip().lower() if type_attr else ''
+        if script_type not in JS_TYPES or 'define:vars' in attrs or 'set:html' in attrs:
+            return match.group(0)
+        if src:
+            if not re.match(r'(?:https?:)?//', src.group(1), re.IGNORECASE):
+                return match.group(0)
+            target = src.group(1)
+        elif attrs.strip() and body.strip():
+            target = body
+        else:
+            return match.group(0)
+        if not delay_allowed(target, allowlist):
+            return match.group(0)
+        
+        if type_attr:
+            attrs = (attrs[:type_attr.start(3)] + DELAYED_TYPE + type_attr.group(2) +
+                     f' {DELAYED_TYPE_ATTR}={type_attr.group(2)}{type_attr.group(3)}' + attrs[type_attr.end(3):])
+        else:
+            attrs = f' type="{DELAYED_TYPE}"' + attrs
+        what = src.group(1) if src else 'inline tracking script'
+        changes.append(f"Delayed {what} until interaction or idle")
+        tag = match.group(0)
+        return '<script' + attrs + tag[len('<script') + len(match.group(1)):]
+    
+    content = SCRIPT_PATTERN.sub(delay, content)
+    if not changes:
+        return content, changes
+    
+    # One loader per file, after the last delayed script (or refreshed where it already is)
+    block_lines = [LOADER_BLOCK_START, '<script is:inline>', *DELAYED_SCRIPT_LOADER.split('\n'), '</script>', LOADER_BLOCK_END]
+    existing = LOADER_BLOCK_PATTERN.search(content)
+    if existing:
+        indent = existing.group(1)
+        block = '\n'.join(indent + line if line else line for line in block_lines) + '\n'
+        return content[:existing.start()] + block + content[existing.end():], changes
+    last = list(re.finditer(re.escape(DELAYED_TYPE) + r'''["']''', content))[-1]
+    script = SCRIPT_PATTERN.match(content, content.rfind('<script', 0, last.start()))
+    line_start = content.rfind('\n', 0, script.start()) + 1
+    indent = re.match(r'[ \t]*', content[line_start:]).group()
+    block = '\n'.join(indent + line if line else line for line in block_lines)
+    changes.append("Added the delayed script loader")
+    return content[:script.end()] + '\n' + block + content[script.end():], changes
+
 def add_defer_to_external_scripts(content: str) -> tuple[str, list[str]]:
     """Add defer to external scripts without defer/async (RISKY)."""
     changes = []
     
     def add_defer(match):
         tag = match.group(0)
-        if 'defer' in tag.lower() or 'async' in tag.lower():
+        if 'defer' in tag.lower() or 'async' in tag.lower() or DELAYED_TYPE in tag:
             return tag
         
         changes.append("Added defer to external script tag")
@@ -124,109 +324,327 @@ def add_defer_to_external_scripts(content: str) -> tuple[str, list[str]]:
     
     return content, changes
 
-def optimize_file(file_path: Path, backup_dir: Path, include_risky: bool = False) -> dict:
-    """Apply optimizations to a single file."""
+def rewrite_content(content: str, suffix: str, include_risky: bool = False,
+                    loading: dict[int, str] | None = None, sections: dict[int, int] | None = None,
+                    hydration: dict[int, str] | None = None,
+                    delay_allowlist: list[tuple[str, bool]] | None = None) -> tuple[str, list[str]]:
+    """
+    Run the optimizations for a file type over its content. `loading`,
+    `sections` and `hydration` hold this file's render-order decisions, keyed
+    by offsets into content; `delay_allowlist` selects the tracking scripts to
+    delay.
+    """
+    all_changes = []
+    if suffix == '.astro':
+        # Offsets refer to the unmodified content, so this step runs first
+        content, changes = apply_render_order(content, loading or {}, sections or {}, hydration)
+        all_changes.extend(changes)
+        steps = [add_decoding_async_to_images]
+        if include_risky:
+            # Delay first so deferring skips the scripts the loader now owns
+            steps.append(lambda c: delay_tracking_scripts(c, delay_allowlist or []))
+            steps.append(add_defer_to_external_scripts)
+    elif suffix in ['.css', '.scss']:
+        steps = [add_font_display_swap]
+    else:
+        steps = []
+    
+    for step in steps:
+        content, changes = step(content)
+        all_changes.extend(changes)
+    return content, all_changes
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def plan_file(file_path: str, include_risky: bool = False, loading: dict[int, str] | None = None,
+              sections: dict[int, int] | None = None, hydration: dict[int, str] | None = None,
+              delay_allowlist: list[tuple[str, bool]] | None = None) -> dict:
+    """
+    Compute one file's rewrite without touching the file. Runs inside a worker
+    process. `content` is the new text, or None when nothing changes.
+    """
     result = {
-        'file': str(file_path),
+        'file': file_path,
         'changes': [],
-        'backup': None,
+        'content': None,
+        'before': None,
+        'after': None,
         'error': None
     }
     
     try:
-        content = file_path.read_text(errors='ignore')
-        original_content = content
-        all_changes = []
-        
-        # Determine file type and apply relevant optimizations
-        suffix = file_path.suffix.lower()
-        
-        if suffix == '.astro':
-            content, changes = add_fetchpriority_to_hero_images(content)
-            all_changes.extend(changes)
-            
-            content, changes = add_loading_lazy_to_images(content)
-            all_changes.extend(changes)
-            
-            content, changes = add_decoding_async_to_images(content)
-            all_changes.extend(changes)
-            
-            if include_risky:
-                content, changes = add_defer_to_external_scripts(content)
-                all_changes.extend(changes)
-        
-        elif suffix in ['.css', '.scss']:
-            content, changes = add_font_display_swap(content)
-            all_changes.extend(changes)
-        
-        # Only write if changes were made
+        original = Path(file_path).read_bytes()
+        original_content = original.decode('utf-8', errors='ignore')
+        content, changes = rewrite_content(original_content, Path(file_path).suffix.lower(), include_risky,
+                                            loading, sections, hydration, delay_allowlist)
         if content != original_content:
-            backup_path = backup_file(file_path, backup_dir)
-            result['backup'] = str(backup_path)
-            file_path.write_text(content)
-            result['changes'] = all_changes
-        
+            result['content'] = content
+            result['changes'] = changes
+            result['before'] = sha256(original)
+            result['after'] = sha256(content.encode())
     except Exception as e:
         result['error'] = str(e)
     
     return result
 
-def optimize_project(project_path: str, include_risky: bool = False) -> dict:
-    """Apply optimizations to all relevant files in the project."""
+def render_plans(path: Path, content_visibility: bool = False, hydration: bool = False) -> tuple[dict, dict, dict]:
+    """
+    render_order's image loading plan and (when opted in) the content-visibility
+    and island hydration plans, keyed by absolute path. Each is empty if the
+    sources cannot be parsed.
+    """
+    plans = []
+    order = RenderOrder(path)
+    for build, wanted in ((loading_plan, True), (content_visibility_plan, content_visibility),
+                          (hydration_plan, hydration)):
+        try:
+            plans.append({str(path / rel): decisions for rel, decisions in build(path, order).items()} if wanted else {})
+        except Exception as e:
+            print(f"Warning: could not compute render order ({build.__name__}): {e}", file=sys.stderr)
+            plans.append({})
+    return plans[0], plans[1], plans[2]
+
+def plan_files(files: list[Path], include_risky: bool = False, jobs: int | None = None,
+               loading: dict[str, dict[int, str]] | None = None,
+               sections: dict[str, dict[int, int]] | None = None,
+               hydration: dict[str, dict[int, str]] | None = None,
+               delay_allowlist: list[tuple[str, bool]] | None = None) -> list[dict]:
+    """Plan every rewrite in parallel, in input order."""
+    loading = loading or {}
+    sections = sections or {}
+    hydration = hydration or {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(plan_file, str(f), include_risky, loading.get(str(f)), sections.get(str(f)),
+                               hydration.get(str(f)), delay_allowlist)
+                   for f in files]
+        return [future.result() for future in futures]
+
+# ---------------------------------------------------------------------------
+# Atomic commit and the run manifest
+# ---------------------------------------------------------------------------
+
+def temp_path(file_path: Path) -> Path:
+    """Sibling temp file, so the final rename never crosses filesystems."""
+    return file_path.with_name(f".{file_path.name}{TMP_SUFFIX}")
+
+def fsync_paths(paths):
+    """fsync files and directories (directories make renames durable)."""
+    for p in paths:
+        fd = os.open(p, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def write_manifest(manifest_path: Path, manifest: dict):
+    """Replace the manifest atomically and durably."""
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(manifest_path)
+    tmp.write_text(json.dumps(manifest, indent=2) + '\n')
+    fsync_paths([tmp])
+    os.replace(tmp, manifest_path)
+    fsync_paths([manifest_path.parent])
+
+def load_manifest(manifest_path: Path) -> dict | None:
+    if not manifest_path.exists():
+        return None
+    return json.loads(manifest_path.read_text())
+
+def commit_files(contents: dict[Path, bytes]):
+    """
+    Write every file as a batch: all temp files first, one fsync pass over
+    them, then a rename per file and one fsync per touched directory. Each
+    file is either wholly old or wholly new at any point.
+    """
+    temps = []
+    try:
+        for file_path, data in contents.items():
+            tmp = temp_path(file_path)
+            tmp.write_bytes(data)
+            shutil.copymode(file_path, tmp)
+            temps.append(tmp)
+        fsync_paths(temps)
+        for file_path in contents:
+            os.replace(temp_path(file_path), file_path)
+        fsync_paths({f.parent for f in contents})
+    finally:
+        for tmp in temps:
+            tmp.unlink(missing_ok=True)
+
+def current_hash(file_path: Path) -> str | None:
+    return sha256(file_path.read_bytes()) if file_path.exists() else None
+
+def project_files(path: Path) -> list[Path]:
+    files = walk(path / 'src', ['.astro', '.css', '.scss'], project=path)
+    return files.get('.astro', []) + files.get('.css', []) + files.get('.scss', [])
+
+def optimize_project(project_path: str, include_risky: bool = False, jobs: int | None = None,
+                     dry_run: bool = False, content_visibility: bool = False, hydration: bool = False) -> dict:
+    """
+    Apply optimizations to all relevant files in the project.
+    `content_visibility` opts in to content-visibility: auto on the
+    below-the-fold sections found by render_order.deferrable_sections, and
+    `hydration` to the cheaper client:* directives from audit_hydration.
+    
+    Rewrites are computed in parallel first, then committed as one batch. The
+    run's manifest (files, backups, content hashes before and after) is
+    written before any file changes and marked complete afterwards, so an
+    interrupted run can be finished with resume_run() or undone with
+    rollback_run().
+    """
     path = Path(project_path).resolve()
-    src_path = path / 'src'
-    backup_dir = path / '.astro-optimizer-backups'
+    backup_dir = path / BACKUP_DIR
+    manifest_path = backup_dir / MANIFEST_NAME
     
     results = {
         'project_path': str(path),
         'backup_dir': str(backup_dir),
         'include_risky': include_risky,
+        'content_visibility': content_visibility,
+        'hydration': hydration,
         'files_processed': [],
         'files_modified': [],
         'total_changes': 0,
         'errors': []
     }
     
-    # Process Astro files
-    for astro_file in src_path.rglob("*.astro"):
-        result = optimize_file(astro_file, backup_dir, include_risky)
-        results['files_processed'].append(str(astro_file.relative_to(path)))
-        
-        if result['changes']:
-            results['files_modified'].append({
-                'file': str(astro_file.relative_to(path)),
-                'changes': result['changes'],
-                'backup': result['backup']
-            })
-            results['total_changes'] += len(result['changes'])
-        
-        if result['error']:
-            results['errors'].append({
-                'file': str(astro_file.relative_to(path)),
-                'error': result['error']
-            })
-    
-    # Process CSS files
-    for css_file in list(src_path.rglob("*.css")) + list(src_path.rglob("*.scss")):
-        result = optimize_file(css_file, backup_dir, include_risky)
-        results['files_processed'].append(str(css_file.relative_to(path)))
-        
-        if result['changes']:
-            results['files_modified'].append({
-                'file': str(css_file.relative_to(path)),
-                'changes': result['changes'],
-                'backup': result['backup']
-            })
-            results['total_changes'] += len(result['changes'])
+    previous = load_manifest(manifest_path)
+    if previous and previous['status'] == 'pending' and not dry_run:
+        results['errors'].append({
+            'file': str(manifest_path.relative_to(path)),
+            'error': 'A previous run was interrupted; finish it with --resume or undo it with --rollback'
+        })
+        return results
+    
+    plans = plan_files(project_files(path), include_risky, jobs, *render_plans(path, content_visibility, hydration),
+                       delay_allowlist=load_delay_allowlist(path))
+    
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    run_backup_dir = backup_dir / run_id
+    entries = []
+    contents = {}
+    for plan in plans:
+        file_path = Path(plan['file'])
+        rel = str(file_path.relative_to(path))
+        results['files_processed'].append(rel)
+        if plan['error']:
+            results['errors'].append({'file': rel, 'error': plan['error']})
+            continue
+        if plan['content'] is None:
+            continue
         
-        if result['error']:
-            results['errors'].append({
-                'file': str(css_file.relative_to(path)),
-                'error': result['error']
-            })
+        backup = None
+        if not dry_run:
+            # Per-run tree, so files with the same name in different directories keep separate backups
+            backup = str(backup_file(file_path, run_backup_dir / Path(rel).parent).relative_to(path))
+        results['files_modified'].append({
+            'file': rel,
+            'changes': plan['changes'],
+            'backup': backup
+        })
+        results['total_changes'] += len(plan['changes'])
+        entries.append({'file': rel, 'backup': backup, 'before': plan['before'], 'after': plan['after']})
+        contents[file_path] = plan['content'].encode()
+    
+    if dry_run or not contents:
+        results['dry_run'] = dry_run
+        return results
+    
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'run': run_id,
+        'status': 'pending',
+        'include_risky': include_risky,
+        'content_visibility': content_visibility,
+        'hydration': hydration,
+        'files': entries,
+    }
+    write_manifest(manifest_path, manifest)
+    commit_files(contents)
+    manifest['status'] = 'complete'
+    write_manifest(manifest_path, manifest)
+    results['manifest'] = str(manifest_path.relative_to(path))
     
     return results
 
+def resume_run(project_path: str, jobs: int | None = None) -> dict:
+    """
+    Finish an interrupted run. Files still matching their recorded `before`
+    hash are re-planned and committed; files already at `after` are left
+    alone. A file that matches neither was edited since and is reported.
+    """
+    path = Path(project_path).resolve()
+    manifest_path = path / BACKUP_DIR / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    if not manifest or manifest['status'] != 'pending':
+        return {'error': 'No interrupted run to resume'}
+    
+    result = {'project_path': str(path), 'run': manifest['run'], 'applied': [], 'already_applied': [], 'errors': []}
+    remaining = []
+    for entry in manifest['files']:
+        file_path = path / entry['file']
+        temp_path(file_path).unlink(missing_ok=True)
+        digest = current_hash(file_path)
+        if digest == entry['after']:
+            result['already_applied'].append(entry['file'])
+        elif digest == entry['before']:
+            remaining.append(entry)
+        else:
+            result['errors'].append({'file': entry['file'], 'error': 'Changed since the run started; not touched'})
+    
+    plans = plan_files([path / e['file'] for e in remaining], manifest['include_risky'], jobs,
+                       *render_plans(path, manifest.get('content_visibility', False), manifest.get('hydration', False)),
+                       delay_allowlist=load_delay_allowlist(path))
+    contents = {}
+    for entry, plan in zip(remaining, plans):
+        if plan['error'] or plan['after'] != entry['after']:
+            result['errors'].append({'file': entry['file'], 'error': plan['error'] or 'Rewrite no longer matches the manifest'})
+            continue
+        contents[Path(plan['file'])] = plan['content'].encode()
+        result['applied'].append(entry['file'])
+    
+    commit_files(contents)
+    if not result['errors']:
+        manifest['status'] = 'complete'
+        write_manifest(manifest_path, manifest)
+    return result
+
+def rollback_run(project_path: str) -> dict:
+    """
+    Restore the last run's backups (interrupted or complete). Only files still
+    at their `after` hash are restored, so later hand edits are never lost.
+    """
+    path = Path(project_path).resolve()
+    manifest_path = path / BACKUP_DIR / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    if not manifest or manifest['status'] not in ('pending', 'complete'):
+        return {'error': 'No run to roll back'}
+    
+    result = {'project_path': str(path), 'run': manifest['run'], 'restored': [], 'unchanged': [], 'errors': []}
+    contents = {}
+    for entry in manifest['files']:
+        file_path = path / entry['file']
+        temp_path(file_path).unlink(missing_ok=True)
+        digest = current_hash(file_path)
+        if digest == entry['before']:
+            result['unchanged'].append(entry['file'])
+            continue
+        if digest != entry['after']:
+            result['errors'].append({'file': entry['file'], 'error': 'Changed since the run; not restored'})
+            continue
+        data = (path / entry['backup']).read_bytes()
+        if sha256(data) != entry['before']:
+            result['errors'].append({'file': entry['file'], 'error': f"Backup {entry['backup']} does not match"})
+            continue
+        contents[file_path] = data
+        result['restored'].append(entry['file'])
+    
+    commit_files(contents)
+    manifest['status'] = 'rolled_back'
+    write_manifest(manifest_path, manifest)
+    return result
+
 def main():
     import argparse
     
@@ -234,8 +652,17 @@ def main():
     parser.add_argument('project_path', help='Path to Astro project')
     parser.add_argument('--include-risky', action='store_true', 
                         help='Include risky optimizations (defer on scripts, etc.)')
+    parser.add_argument('--content-visibility', action='store_true',
+                        help='Add content-visibility: auto with an estimated contain-intrinsic-size '
+                             'to below-the-fold sections of long pages')
+    parser.add_argument('--hydration', action='store_true',
+                        help='Switch islands to the cheaper client:* directives suggested by audit_hydration.py')
     parser.add_argument('--dry-run', action='store_true',
                         help='Show what would be changed without modifying files')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    run = parser.add_mutually_exclusive_group()
+    run.add_argument('--resume', action='store_true', help='Finish an interrupted run from its manifest')
+    run.add_argument('--rollback', action='store_true', help="Restore the last run's backups")
     
     args = parser.parse_args()
     
@@ -243,14 +670,18 @@ def main():
         print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
         sys.exit(1)
     
-    if args.dry_run:
-        print("DRY RUN - No files will be modified", file=sys.stderr)
-        # TODO: Implement dry run mode
-        print(json.dumps({"error": "Dry run not yet implemented"}, indent=2))
-        sys.exit(0)
-    
-    results = optimize_project(args.project_path, args.include_risky)
+    if args.resume:
+        results = resume_run(args.project_path, args.jobs)
+    elif args.rollback:
+        results = rollback_run(args.project_path)
+    else:
+        if args.dry_run:
+            print("DRY RUN - No files will be modified", file=sys.stderr)
+        results = optimize_project(args.project_path, args.include_risky, args.jobs, args.dry_run,
+                                   args.content_visibility, args.hydration)
     print(json.dumps(results, indent=2))
+    if 'error' in results:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Attributes shipped JavaScript bytes in dist/_astro/*.js to source modules via
+sourcemaps, then annotates detect_js_patterns findings with the shipped size
+of the module each one is in and the number of pages that load it. The module
+size is an upper bound on what the CSS/HTML replacement removes: a finding
+usually covers only part of its module.
+
+Sourcemaps are scanned as a stream: `sourcesContent` is skipped without being
+held in memory and `mappings` is decoded one generated line at a time.
+
+Enable sourcemaps in astro.config for accurate results:
+    vite: { build: { sourcemap: true } }
+"""
+
+import re
+import json
+import sys
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+
+from walker import find_files
+from dist_pages import find_dist, iter_pages, parse_page, rel_values, resolve_local
+from detect_js_patterns import analyze_project as detect_patterns
+
+UNMAPPED = '<unmapped>'
+NO_SOURCEMAP = '<no sourcemap>'
+B64 = {c: i for i, c in enumerate('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/')}
+CHUNK_SIZE = 1 << 16
+STRING_SPECIAL = re.compile(r'["\\]')
+
+@dataclass
+class ModuleBytes:
+    source: str
+    bytes: int = 0
+    gzip_bytes: int = 0
+    bundles: set[str] = field(default_factory=set)
+    pages: set[str] = field(default_factory=set)
+
+# ---------------------------------------------------------------------------
+# Streaming sourcemap reading
+# ---------------------------------------------------------------------------
+
+class MappingsDecoder:
+    """Incremental VLQ decoder for the `mappings` field. Calls on_line per generated line."""
+    
+    def __init__(self, on_line):
+        self.on_line = on_line
+        self.gen_col = self.src = self.src_line = self.src_col = self.name = 0
+        self.fields: list[int] = []
+        self.value = self.shift = 0
+        self.segments: list[tuple[int, int | None]] = []
+    
+    def feed(self, chunk: str):
+        for ch in chunk:
+            if ch == ',':
+                self._end_segment()
+            elif ch == ';':
+                self._end_segment()
+                self.on_line(self.segments)
+                self.segments = []
+                self.gen_col = 0
+            else:
+                digit = B64.get(ch)
+                if digit is None:
+                    continue
+                self.value += (digit & 31) << self.shift
+                if digit & 32:
+                    self.shift += 5
+                else:
+                    self.fields.append(-(self.value >> 1) if self.value & 1 else self.value >> 1)
+                    self.value = self.shift = 0
+    
+    def close(self):
+        self._end_segment()
+        self.on_line(self.segments)
+        self.segments = []
+    
+    def _end_segment(self):
+        if not self.fields:
+            return
+        self.gen_col += self.fields[0]
+        source = None
+        if len(self.fields) >= 4:
+            self.src += self.fields[1]
+            self.src_line += self.fields[2]
+            self.src_col += self.fields[3]
+            source = self.src
+        if len(self.fields) >= 5:
+            self.name += self.fields[4]
+        self.segments.append((self.gen_col, source))
+        self.fields = []
+
+class SourcemapScanner:
+    """
+    Streams a sourcemap's top-level JSON object. Small fields (`sources`,
+    `sourceRoot`) are captured; `mappings` is forwarded in chunks; everything
+    else, notably `sourcesContent`, is skipped without being stored.
+    """
+    
+    CAPTURE = {'sources', 'sourceRoot'}
+    
+    def __init__(self, on_mappings):
+        self.on_mappings = on_mappings
+        self.fields: dict = {}
+        self.depth = 0
+        self.key: str | None = None
+        self.key_chars: list[str] | None = None
+        self.capture: list[str] | None = None
+        self.in_string = False
+        self.escape = False
+        self.streaming = False
+    
+    def feed(self, chunk: str):
+        i, n = 0, len(chunk)
+        while i < n:
+            if self.streaming:
+                end = chunk.find('"', i)
+                self.on_mappings(chunk[i:] if end == -1 else chunk[i:end])
+                if end == -1:
+                    return
+                self.streaming = False
+                i = end + 1
+                continue
+            if self.in_string:
+                i = self._scan_string(chunk, i)
+                continue
+            c = chunk[i]
+            if c == '"':
+                if self.depth == 1 and self.key is None:
+                    self.key_chars = []
+                elif self.depth == 1 and self.key == 'mappings':
+                    self.streaming = True
+                    i += 1
+                    continue
+                elif self.depth == 1 and self.key in self.CAPTURE:
+                    self.capture = []
+                self.in_string = True
+                self._append(c)
+            elif c in '{[':
+                if self.depth == 1 and self.key in self.CAPTURE and self.capture is None:
+                    self.capture = []
+                self._append(c)
+                self.depth += 1
+            elif c in '}]':
+                self.depth -= 1
+                self._append(c)
+                if self.depth == 1:
+                    self._finish_capture()
+            elif c == ',' and self.depth == 1:
+                self._finish_capture()
+                self.key = None
+            elif not (c == ':' and self.depth == 1):
+                self._append(c)
+            i += 1
+    
+    def _scan_string(self, chunk: str, i: int) -> int:
+        if self.escape:
+            self._append(chunk[i])
+            self.escape = False
+            return i + 1
+        match = STRING_SPECIAL.search(chunk, i)
+        end = match.start() if match else len(chunk)
+        self._append(chunk[i:end])
+        if not match:
+            return end
+        if chunk[end] == '\\':
+            self._append('\\')
+            self.escape = True
+            return end + 1
+        self._append('"')
+        self.in_string = False
+        if self.key_chars is not None:
+            self.key = json.loads(''.join(self.key_chars))
+            self.key_chars = None
+        elif self.depth == 1:
+            self._finish_capture()
+        return end + 1
+    
+    def _append(self, text: str):
+        if self.key_chars is not None:
+            self.key_chars.append(text)
+        elif self.capture is not None:
+            self.capture.append(text)
+    
+    def _finish_capture(self):
+        if self.capture is not None and self.key:
+            self.fields[self.key] = json.loads(''.join(self.capture))
+        self.capture = None
+
+def find_sourcemap(js_file: Path) -> Path | None:
+    """Locate a bundle's sourcemap via sourceMappingURL or the .map sibling."""
+    with open(js_file, 'rb') as f:
+        f.seek(max(0, js_file.stat().st_size - 512))
+        tail = f.read().decode('utf-8', errors='ignore')
+    match = re.search(r'[#@]\s*sourceMappingURL=([^\s*]+)', tail)
+    if match and not match.group(1).startswith('data:'):
+        candidate = js_file.parent / match.group(1)
+        if candidate.is_file():
+            return candidate
+    sibling = js_file.with_name(js_file.name + '.map')
+    return sibling if sibling.is_file() else None
+
+def attribute_bundle(js_file: Path, map_file: Path | None) -> dict[str | int, int]:
+    """Split a bundle's bytes by source index (or UNMAPPED), one generated line at a time."""
+    totals: dict[str | int, int] = defaultdict(int)
+    if map_file is None:
+        totals[NO_SOURCEMAP] = js_file.stat().st_size
+        return totals
+    
+    with open(js_file, encoding='utf-8', errors='ignore', newline='') as js:
+        def on_line(segments):
+            line = js.readline()
+            if not line:
+                return
+            previous_col, previous_src = 0, UNMAPPED
+            for col, source in segments:
+                totals[previous_src] += len(line[previous_col:col].encode('utf-8'))
+                previous_col, previous_src = col, source if source is not None else UNMAPPED
+            totals[previous_src] += len(line[previous_col:].encode('utf-8'))
+        
+        decoder = MappingsDecoder(on_line)
+        scanner = SourcemapScanner(decoder.feed)
+        with open(map_file, encoding='utf-8', errors='ignore') as m:
+            for chunk in iter(lambda: m.read(CHUNK_SIZE), ''):
+                scanner.feed(chunk)
+        decoder.close()
+        # Lines past the last mapping (e.g. the sourceMappingURL comment)
+        for line in iter(js.readline, ''):
+            totals[UNMAPPED] += len(line.encode('utf-8'))
+    
+    sources = scanner.fields.get('sources', [])
+    root = scanner.fields.get('sourceRoot') or ''
+    named: dict[str | int, int] = defaultdict(int)
+    for key, size in totals.items():
+        if isinstance(key, int) and key < len(sources):
+            named[(map_file.parent, root + sources[key])] += size
+        else:
+            named[UNMAPPED if isinstance(key, int) else key] += size
+    return named
+
+def normalize_source(source, project_path: Path) -> str:
+    """Turn a sourcemap source into a project-relative path (query strings dropped)."""
+    if isinstance(source, str):
+        return source
+    base, rel = source
+    rel = re.sub(r'^(?:webpack|vite|file)://', '', rel).split('?')[0]
+    path = (base / rel).resolve() if not rel.startswith('/') else Path(rel)
+    try:
+        return path.relative_to(project_path).as_posix()
+    except ValueError:
+        node_modules = path.as_posix().rfind('node_modules/')
+        return path.as_posix()[node_modules:] if node_modules >= 0 else path.as_posix()
+
+# ---------------------------------------------------------------------------
+# Pages and bundles
+# ---------------------------------------------------------------------------
+
+IMPORT_PATTERN = re.compile(r'''(?:\bimport\s*(?:[\w*{}\s,$]*from\s*)?|\bimport\(\s*)["'](\.{1,2}/[^"']+\.js)["']''')
+
+def bundle_imports(js_file: Path) -> list[Path]:
+    content = js_file.read_text(errors='ignore')
+    return [(js_file.parent / m.group(1)).resolve() for m in IMPORT_PATTERN.finditer(content)]
+
+def page_bundles(dist: Path) -> dict[str, set[Path]]:
+    """For every route, the bundles it loads, including transitive static imports."""
+    imports_cache: dict[Path, list[Path]] = {}
+    pages = {}
+    for route, html_file in iter_pages(dist):
+        page = parse_page(html_file, dist)
+        roots = []
+        for tag in page.tags:
+            if tag.tag == 'script' and tag.attrs.get('src'):
+                roots.append(tag.attrs['src'])
+            elif tag.tag == 'link' and 'modulepreload' in rel_values(tag) and tag.attrs.get('href'):
+                roots.append(tag.attrs['href'])
+            elif tag.tag == 'script' and tag.text:
+                # Astro inlines small hoisted scripts that import shared chunks
+                roots.extend(m.group(1) for m in re.finditer(r'''import\s*(?:[\w*{}\s,$]*from\s*)?["'](/_astro/[^"']+\.js)["']''', tag.text))
+        seen: set[Path] = set()
+        stack = [f.resolve() for f in (resolve_local(u, dist, route) for u in roots) if f and f.suffix in ('.js', '.mjs')]
+        while stack:
+            bundle = stack.pop()
+            if bundle in seen or not bundle.is_file():
+                continue
+            seen.add(bundle)
+            if bundle not in imports_cache:
+                imports_cache[bundle] = bundle_imports(bundle)
+            stack.extend(imports_cache[bundle])
+        pages[route] = seen
+    return pages
+
+# ---------------------------------------------------------------------------
+# Project
+# ---------------------------------------------------------------------------
+
+def attribute_project(project_path: str) -> dict:
+    """Attribute dist/ JS bytes to source modules and annotate JS-pattern findings."""
+    path = Path(project_path).resolve()
+    dist = find_dist(path)
+    if not dist:
+        return {'error': f"No build output found at {path / 'dist'}. Run `astro build` first."}
+    
+    bundles = sorted(f.resolve() for f in find_files(dist, ['.js'], gitignore=False))
+    modules: dict[str, ModuleBytes] = {}
+    bundle_modules: dict[Path, list[str]] = {}
+    missing_maps = []
+    
+    for bundle in bundles:
+        map_file = find_sourcemap(bundle)
+        if map_file is None:
+            missing_maps.append(bundle.relative_to(dist.resolve()).as_posix())
+        raw = bundle.read_bytes()
+        gzip_ratio = len(zlib.compress(raw, 9)) / len(raw) if raw else 0
+        bundle_rel = bundle.relative_to(dist.resolve()).as_posix()
+        bundle_modules[bundle] = []
+        for source, size in attribute_bundle(bundle, map_file).items():
+            name = normalize_source(source, path)
+            if name == NO_SOURCEMAP:
+                name = f"{NO_SOURCEMAP} {bundle_rel}"
+            module = modules.setdefault(name, ModuleBytes(source=name))
+            module.bytes += size
+            # Compression is not separable per module; share the bundle's ratio
+            module.gzip_bytes += round(size * gzip_ratio)
+            module.bundles.add(bundle_rel)
+            bundle_modules[bundle].append(name)
+    
+    for route, loaded in page_bundles(dist).items():
+        for bundle in loaded:
+            for name in bundle_modules.get(bundle, []):
+                modules[name].pages.add(route)
+    
+    detected = detect_patterns(str(path))
+    findings = []
+    for finding in detected['findings']:
+        module = modules.get(finding['file'])
+        # The whole module's size, not the finding's share of it (see module docstring)
+        finding['module_bytes'] = module.bytes if module else 0
+        finding['module_gzip_bytes'] = module.gzip_bytes if module else 0
+        finding['pages_loading'] = len(module.pages) if module else 0
+        findings.append(finding)
+    findings.sort(key=lambda f: (-f['module_gzip_bytes'] * max(f['pages_loading'], 1), f['file']))
+    
+    ranked = sorted(modules.values(), key=lambda m: -m.bytes)
+    return {
+        'project_path': str(path),
+        'modules': [
+            {**asdict(m), 'bundles': sorted(m.bundles), 'pages': len(m.pages)}
+            for m in ranked
+        ],
+        'findings': findings,
+        'missing_sourcemaps': missing_maps,
+        'summary': {
+            'bundles': len(bundles),
+            'modules': len(modules),
+            'total_bytes': sum(m.bytes for m in ranked),
+            'total_gzip_bytes': sum(m.gzip_bytes for m in ranked),
+            'findings_with_bytes': len([f for f in findings if f['module_bytes']]),
+            # Upper bound: the gzip size of every module holding a finding
+            'finding_modules_gzip_bytes': sum(
+                modules[f].gzip_bytes for f in {f['file'] for f in findings if f['module_bytes']}
+            ),
+        }
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Attribute built JS bytes to source modules and rank JS-pattern findings by module size')
+    parser.add_argument('project_path', help='Path to Astro project (built, ideally with sourcemaps)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    result = attribute_project(args.project_path)
+    if result.get('missing_sourcemaps'):
+        print("Warning: some bundles have no sourcemap; enable vite.build.sourcemap for per-module bytes",
+              file=sys.stderr)
+    print(json.dumps(result, indent=2))
+    if 'error' in result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Audits how Astro islands hydrate. Finds every framework component rendered
+with a client:* directive, places it above or below the fold from the
+composed render order, measures the JavaScript its island loads in the built
+site (component entry plus renderer, with their static imports), and suggests
+a cheaper directive: client:visible below the fold, client:idle for heavy
+islands above it, and no directive at all when the component has nothing to
+hydrate. apply_optimizations.py --hydration writes the suggestions.
+"""
+
+import re
+import json
+import sys
+import zlib
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+
+from changed_files import IMPORT_PATTERN, path_aliases, resolve_import
+from dist_pages import find_dist, iter_pages, parse_page, resolve_local
+from attribute_js_bytes import bundle_imports
+from estimate_lcp import page_route_for_source
+from render_order import RenderOrder, LCP_BANDS, MOBILE_VIEWPORT
+
+HEAVY_ISLAND_GZIP_BYTES = 10_000  # client:load islands above the fold this size or larger move to client:idle
+MAX_IMPORT_DEPTH = 8
+
+# Directives from most to least eager; a component used on several pages keeps
+# the most eager directive any of them needs
+EAGERNESS = {'load': 3, 'only': 3, 'idle': 2, 'media': 1, 'visible': 1, '': 0}
+
+# Framework packages whose imports say nothing about interactivity
+FRAMEWORK_PACKAGES = re.compile(r'^(?:react|react-dom|preact|vue|svelte|solid-js|@astrojs/[\w-]+)(?:/|$)')
+CODE_EXTENSIONS = {'.js', '.mjs', '.ts', '.jsx', '.tsx', '.vue', '.svelte'}
+
+# What makes a component need hydration, by source file type
+EVENT_PATTERNS = {
+    '.jsx': r'\bon[A-Z]\w*\s*=',
+    '.tsx': r'\bon[A-Z]\w*\s*=',
+    '.vue': r'(?:\s@|\bv-on:)[\w.:-]+\s*=',
+    '.svelte': r'\bon:\w+|\bon[a-z]+\s*=\s*\{',
+}
+STATE_PATTERNS = {
+    '.jsx': r'\buse[A-Z]\w*\s*\(|\bcreate(?:Signal|Effect|Store|Resource|Memo)\s*\(|\bsignal\s*\(',
+    '.tsx': r'\buse[A-Z]\w*\s*\(|\bcreate(?:Signal|Effect|Store|Resource|Memo)\s*\(|\bsignal\s*\(',
+    '.vue': r'\b(?:ref|reactive|computed|watch|watchEffect|onMounted|useStore)\s*\(|\bv-model\b|\bdata\s*\(\s*\)',
+    '.svelte': r'\bbind:|\$:|\$(?:state|effect|derived)\b|\bonMount\b|\bwritable\s*\(',
+}
+STATE_PATTERNS['.js'] = STATE_PATTERNS['.ts'] = STATE_PATTERNS['.mjs'] = STATE_PATTERNS['.jsx']
+BROWSER_PATTERN = re.compile(
+    r'\b(?:window|document|localStorage|sessionStorage|navigator|matchMedia|IntersectionObserver|'
+    r'ResizeObserver|MutationObserver|requestAnimationFrame|setInterval|setTimeout|fetch)\b'
+)
+
+@dataclass
+class IslandUse:
+    page: str
+    route: str | None
+    position: str      # "above" or "below" the fold
+    top: int           # Estimated top of the section it renders in, px
+    js_bytes: int | None = None       # None when the build output has no matching island
+    js_gzip_bytes: int | None = None
+
+@dataclass
+class IslandAudit:
+    file: str
+    offset: int
+    line: int
+    component: str
+    source: str | None
+    directive: str
+    value: str | None
+    uses: list[IslandUse] = field(default_factory=list)
+    signals: list[str] = field(default_factory=list)
+    js_bytes: int | None = None
+    js_gzip_bytes: int | None = None
+    suggested: str | None = None  # Directive to use instead; "" removes it
+    reason: str = ''
+
+# ---------------------------------------------------------------------------
+# Interactivity
+# ---------------------------------------------------------------------------
+
+def interactivity(component: Path, project_path: Path, aliases, cache: dict) -> list[str]:
+    """
+    Why a component needs hydration: event handlers, state, browser APIs, or
+    imports of packages that could hold any of these. Follows the component's
+    local imports. Empty means it renders the same without JavaScript.
+    """
+    if component in cache:
+        return cache[component]
+    signals = []
+    seen = {component}
+    queue = [(component, 0)]
+    while queue:
+        file, depth = queue.pop(0)
+        text = file.read_text(errors='ignore')
+        rel = file.relative_to(project_path).as_posix() if file.is_relative_to(project_path) else file.name
+        suffix = file.suffix.lower()
+        for kind, pattern in (('event handler', EVENT_PATTERNS.get(suffix)), ('state', STATE_PATTERNS.get(suffix)),
+                              ('browser API', BROWSER_PATTERN)):
+            match = re.search(pattern, text) if pattern else None
+            if match:
+                signals.append(f"{kind} {match.group().strip().rstrip('=(').strip()} in {rel}")
+        for match in IMPORT_PATTERN.finditer(text):
+            spec = match.group(1)
+            target = resolve_import(spec, file, aliases)
+            if target is None:
+                if not spec.startswith('.') and not FRAMEWORK_PACKAGES.match(spec) and not spec.endswith('.css'):
+                    signals.append(f"package import {spec} in {rel}")
+            elif target.suffix.lower() in CODE_EXTENSIONS and target not in seen and depth < MAX_IMPORT_DEPTH:
+                seen.add(target)
+                queue.append((target, depth + 1))
+    cache[component] = signals
+    return signals
+
+# ---------------------------------------------------------------------------
+# Shipped JavaScript
+# ---------------------------------------------------------------------------
+
+def bundle_closure(entry: Path, cache: dict) -> set[Path]:
+    """A bundle and everything it statically imports."""
+    seen: set[Path] = set()
+    stack = [entry.resolve()]
+    while stack:
+        bundle = stack.pop()
+        if bundle in seen or not bundle.is_file():
+            continue
+        seen.add(bundle)
+        if bundle not in cache:
+            cache[bundle] = bundle_imports(bundle)
+        stack.extend(cache[bundle])
+    return seen
+
+def bundle_sizes(bundles: set[Path], cache: dict) -> tuple[int, int]:
+    raw = gzip = 0
+    for bundle in bundles:
+        if bundle not in cache:
+            data = bundle.read_bytes()
+            cache[bundle] = (len(data), len(zlib.compress(data, 9)))
+        raw += cache[bundle][0]
+        gzip += cache[bundle][1]
+    return raw, gzip
+
+def built_islands(dist: Path) -> dict[str, list[tuple[str | None, int, int]]]:
+    """Per route, its <astro-island> elements in document order: (component name, bytes, gzip bytes)."""
+    imports: dict = {}
+    sizes: dict = {}
+    routes = {}
+    for route, html_file in iter_pages(dist):
+        islands = []
+        for tag in parse_page(html_file, dist).tags:
+            if tag.tag != 'astro-island':
+                continue
+            bundles: set[Path] = set()
+            for attr in ('component-url', 'renderer-url'):
+                entry = resolve_local(tag.attrs.get(attr) or '', dist, route)
+                if entry:
+                    bundles |= bundle_closure(entry, imports)
+            try:
+                name = json.loads(tag.attrs.get('opts') or '{}').get('name')
+            except ValueError:
+                name = None
+            islands.append((name, *bundle_sizes(bundles, sizes)))
+        routes[route] = islands
+    return routes
+
+# ---------------------------------------------------------------------------
+# Suggestions
+# ---------------------------------------------------------------------------
+
+def suggest(directive: str, signals: list[str], position: str, gzip_bytes: int | None) -> tuple[str, str]:
+    """The cheapest directive that still works for one use of an island, and why."""
+    if not signals:
+        return '', "no event handlers, state, browser APIs or package imports; it renders the same as static HTML"
+    if directive in ('only', 'media'):
+        return directive, ''
+    if position == 'below' and directive in ('load', 'idle'):
+        return 'visible', "starts below the fold; hydrate it when it scrolls into view"
+    if directive == 'load' and gzip_bytes is not None and gzip_bytes >= HEAVY_ISLAND_GZIP_BYTES:
+        return 'idle', f"ships {gzip_bytes / 1024:.1f} KB gzipped above the fold; hydrate it once the main thread is idle"
+    return directive, ''
+
+def audit_islands(path: Path, order: RenderOrder | None = None) -> tuple[list[IslandAudit], int, bool]:
+    """(audits of islands with a client:* directive, static framework components, whether dist/ was read)."""
+    order = order or RenderOrder(path)
+    aliases = path_aliases(path)
+    dist = find_dist(path)
+    built = built_islands(dist) if dist else {}
+    signals_cache: dict = {}
+    
+    audits: dict[tuple[str, int], IslandAudit] = {}
+    static = set()
+    for page in order.pages:
+        page_islands = order.page_islands(page)
+        route = page_route_for_source(page_islands.page)
+        remaining = list(built.get(route, []))
+        for ref in page_islands.islands:
+            if ref.directive is None:
+                static.add((ref.file, ref.offset))
+                continue
+            # Match the built island with the same name, in document order
+            match = next((b for b in remaining if b[0] in (ref.component, None)), None)
+            if match:
+                remaining.remove(match)
+            audit = audits.get((ref.file, ref.offset))
+            if audit is None:
+                component = path / ref.source if ref.source else None
+                audit = audits[(ref.file, ref.offset)] = IslandAudit(
+                    file=ref.file, offset=ref.offset, line=ref.line, component=ref.component,
+                    source=ref.source, directive=ref.directive, value=ref.value,
+                    # Unresolved components (packages, named imports) are assumed interactive
+                    signals=interactivity(component, path, aliases, signals_cache) if component
+                    else [f"unresolved component {ref.component}"],
+                )
+            position = 'above' if ref.band <= LCP_BANDS or ref.top < MOBILE_VIEWPORT[1] else 'below'
+            audit.uses.append(IslandUse(
+                page=page_islands.page, route=route, position=position, top=ref.top,
+                js_bytes=match[1] if match else None, js_gzip_bytes=match[2] if match else None,
+            ))
+    
+    for audit in audits.values():
+        measured = [use for use in audit.uses if use.js_bytes is not None]
+        if measured:
+            audit.js_bytes = max(use.js_bytes for use in measured)
+            audit.js_gzip_bytes = max(use.js_gzip_bytes for use in measured)
+        suggestions = [suggest(audit.directive, audit.signals, use.position, use.js_gzip_bytes) for use in audit.uses]
+        suggested, reason = max(suggestions, key=lambda s: EAGERNESS[s[0]])
+        if suggested != audit.directive:
+            audit.suggested, audit.reason = suggested, reason
+    return sorted(audits.values(), key=lambda a: (a.file, a.offset)), len(static), dist is not None
+
+def hydration_plan(project_path: Path, order: RenderOrder | None = None) -> dict[str, dict[int, str]]:
+    """Per source file, component tag offset -> suggested directive ("" removes it)."""
+    plan: dict[str, dict[int, str]] = {}
+    for audit in audit_islands(project_path, order)[0]:
+        if audit.suggested is not None:
+            plan.setdefault(audit.file, {})[audit.offset] = audit.suggested
+    return plan
+
+def audit_project(project_path: str) -> dict:
+    path = Path(project_path).resolve()
+    audits, static, built = audit_islands(path)
+    suggested = [a for a in audits if a.suggested is not None]
+    return {
+        'project_path': str(path),
+        'islands': [asdict(a) for a in audits],
+        'summary': {
+            'islands': len(audits),
+            'static_components': static,
+            'built_output': built,
+            'suggestions': len(suggested),
+            'removable': len([a for a in suggested if a.suggested == '']),
+            # Per component, since every use of it loads the same bundles
+            'deferrable_gzip_bytes': sum({a.source or a.component: a.js_gzip_bytes or 0 for a in suggested}.values()),
+        }
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Audit client:* hydration directives on Astro islands')
+    parser.add_argument('project_path', help='Path to Astro project (build it first to measure island JS)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    result = audit_project(args.project_path)
+    if not result['summary']['built_output']:
+        print("Warning: no build output; island JS is not measured and heavy client:load islands are not flagged",
+              file=sys.stderr)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
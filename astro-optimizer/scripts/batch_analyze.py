@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Batch mode for repositories holding many Astro sites. Finds every Astro root
+under a directory and analyzes all of them in one process with one shared
+worker pool, so total time follows the total amount of work rather than
+sites x interpreter startup. Compression measurements for built sites go
+through one content-addressed cache shared by every site.
+"""
+
+import os
+import sys
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from analyze import analyze_project as run_rules_analysis
+from detect_js_patterns import analyze_project as detect_patterns
+from compress_assets import compress_asset, compression_report, find_assets, brotli
+from dist_pages import find_dist
+from walker import DEFAULT_IGNORE
+from report_formats import dumps_json
+
+ANALYSES = ['analyze', 'js-patterns', 'compress']
+DEFAULT_CACHE_DIR = '.astro-optimizer-cache'
+
+# Never searched for nested sites
+SKIP_DIRS = {*DEFAULT_IGNORE, 'src', 'public'}
+
+def find_astro_roots(base: Path) -> list[Path]:
+    """Every directory under base with an astro.config.*, in a stable order."""
+    roots = []
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.'))
+        if any(name.startswith('astro.config.') for name in filenames):
+            roots.append(Path(dirpath))
+    return roots
+
+def rules_analysis(site: str) -> dict:
+    report = run_rules_analysis(site)
+    return {'findings': [f.to_dict() for f in report.findings], 'summary': report.summary}
+
+def pattern_analysis(site: str) -> dict:
+    result = detect_patterns(site)
+    return {'findings': result['findings'], 'summary': result['summary']}
+
+def submit_site(pool: ProcessPoolExecutor, site: Path, analyses: list[str], cache: Path, write: bool) -> dict:
+    """Queue every task for one site. Returns futures keyed by analysis."""
+    futures = {}
+    if 'analyze' in analyses:
+        futures['analyze'] = pool.submit(rules_analysis, str(site))
+    if 'js-patterns' in analyses:
+        futures['js_patterns'] = pool.submit(pattern_analysis, str(site))
+    dist = find_dist(site)
+    if 'compress' in analyses and dist:
+        # One task per asset so a large site spreads across the whole pool
+        futures['compress'] = [
+            pool.submit(compress_asset, str(a), str(dist), str(cache / 'compress'), write)
+            for a in find_assets(dist)
+        ]
+    return futures
+
+def collect_site(site: Path, base: Path, futures: dict, cache: Path, write: bool) -> dict:
+    """Wait for a site's tasks and assemble its section of the report."""
+    section = {'site': os.path.relpath(site, base), 'errors': []}
+    for name, future in futures.items():
+        try:
+            if name == 'compress':
+                results = [f.result() for f in future]
+                section[name] = compression_report(site, find_dist(site), cache / 'compress', results, write)
+            else:
+                section[name] = future.result()
+        except Exception as e:
+            section['errors'].append(f"{name}: {e}")
+    return section
+
+def totals(sections: list[dict]) -> dict:
+    """Aggregate counts across every site."""
+    result = {
+        'sites': len(sections),
+        'findings': 0,
+        'by_severity': {'high': 0, 'medium': 0, 'low': 0},
+        'js_patterns': 0,
+        'raw_bytes': 0,
+        'gzip_bytes': 0,
+        'br_bytes': 0 if brotli else None,
+        'errors': 0,
+    }
+    for section in sections:
+        result['errors'] += len(section['errors'])
+        analysis = section.get('analyze', {}).get('summary')
+        if analysis:
+            result['findings'] += analysis['total']
+            for severity, count in analysis['by_severity'].items():
+                result['by_severity'][severity] += count
+        patterns = section.get('js_patterns', {}).get('summary')
+        if patterns:
+            result['js_patterns'] += patterns['total']
+        compressed = section.get('compress', {}).get('summary')
+        if compressed:
+            result['raw_bytes'] += compressed['raw_bytes']
+            result['gzip_bytes'] += compressed['gzip_bytes']
+            if brotli:
+                result['br_bytes'] += compressed['br_bytes']
+    return result
+
+def batch_analyze(base_path: str, analyses: list[str] | None = None, jobs: int | None = None,
+                  cache_dir: str = DEFAULT_CACHE_DIR, write: bool = False) -> dict:
+    """Analyze every Astro site under base_path and aggregate the results."""
+    base = Path(base_path).resolve()
+    analyses = analyses or ANALYSES
+    cache = base / cache_dir
+    sites = find_astro_roots(base)
+    if not sites:
+        return {'error': f"No Astro projects (astro.config.*) found under {base}"}
+    if 'compress' in analyses:
+        (cache / 'compress').mkdir(parents=True, exist_ok=True)
+    
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # Queue every site before waiting on any, so the pool never idles between sites
+        pending = [(site, submit_site(pool, site, analyses, cache, write)) for site in sites]
+        sections = [collect_site(site, base, futures, cache, write) for site, futures in pending]
+    
+    return {
+        'base_path': str(base),
+        'analyses': analyses,
+        'cache_dir': os.path.relpath(cache, base),
+        'sites': sections,
+        'totals': totals(sections),
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Analyze every Astro site under a directory')
+    parser.add_argument('base_path', help='Directory containing one or more Astro projects')
+    parser.add_argument('--analyses', default=','.join(ANALYSES),
+                        help='Comma-separated analyses to run (default: %(default)s)')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Shared cache relative to the base path (default: %(default)s)')
+    parser.add_argument('--write', action='store_true',
+                        help='Also write .gz/.br siblings for built sites (as compress_assets.py --write)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.base_path).exists():
+        print(f"Error: Path does not exist: {args.base_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    analyses = [a.strip() for a in args.analyses.split(',') if a.strip()]
+    unknown = [a for a in analyses if a not in ANALYSES]
+    if unknown:
+        print(f"Error: Unknown analyses: {', '.join(unknown)} (choose from {', '.join(ANALYSES)})", file=sys.stderr)
+        sys.exit(1)
+    
+    if 'compress' in analyses and brotli is None:
+        print("Warning: brotli module not installed (pip install brotli), reporting gzip only", file=sys.stderr)
+    
+    result = batch_analyze(args.base_path, analyses, args.jobs, args.cache_dir, args.write)
+    print(dumps_json(result))
+    if 'error' in result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Changed-file helpers for pull request runs. Lists what changed since a git ref
+with plain `git diff`, expands it to every file that imports a changed file
+(directly or transitively) using the project's import graph, and materializes
+the ref's version of files so findings can be compared before and after.
+"""
+
+import re
+import json
+import subprocess
+from pathlib import Path
+
+from source_reader import open_source
+from walker import find_files
+
+# Files whose imports make up the graph
+GRAPH_EXTENSIONS = {'.astro', '.mdx', '.md', '.ts', '.tsx', '.js', '.jsx', '.mjs', '.vue', '.svelte'}
+
+# Extensions tried, in order, for specifiers written without one
+RESOLVE_SUFFIXES = ['', '.ts', '.tsx', '.js', '.jsx', '.mjs', '.astro', '.mdx', '.md', '.vue', '.svelte',
+                    '/index.ts', '/index.js', '/index.astro']
+
+IMPORT_PATTERN = re.compile(
+    r'''(?:\bimport\s*(?:[\w*{}\s,$]+?\s*from\s*)?|\bexport\s+[\w*{}\s,$]+?\s*from\s*|\bimport\s*\(\s*)["']([^"'\n]+)["']'''
+)
+
+# Changes to these always re-run project-level checks
+PROJECT_FILE_PATTERN = re.compile(r'^astro\.config\.[cm]?[jt]s$')
+GLOBAL_CSS_EXTENSIONS = {'.css', '.scss', '.sass', '.less'}
+
+def git(project_path: Path, *args: str, stdin: bytes | None = None) -> bytes:
+    return subprocess.run(
+        ['git', '-C', str(project_path), *args],
+        input=stdin, capture_output=True, check=True,
+    ).stdout
+
+def changed_files(project_path: Path, ref: str) -> list[str]:
+    """Project-relative paths that differ between ref and the working tree (including deletions)."""
+    out = git(project_path, 'diff', '--name-only', '--relative', '--no-renames', ref, '--')
+    return sorted(line for line in out.decode().splitlines() if line)
+
+def touches_project(files: list[str], importers: dict[str, set[str]]) -> bool:
+    """
+    Whether astro.config.* or a global stylesheet (one a layout imports, directly
+    or through other files) changed, which can move project-level findings.
+    `importers` is the reverse import graph from import_graph().
+    """
+    for f in files:
+        if PROJECT_FILE_PATTERN.match(f):
+            return True
+        if Path(f).suffix.lower() in GLOBAL_CSS_EXTENSIONS and any(
+                a.startswith('src/layouts/') for a in reachable([f], importers)):
+            return True
+    return False
+
+def path_aliases(project_path: Path) -> list[tuple[str, list[Path]]]:
+    """compilerOptions.paths from tsconfig.json, e.g. [('@/', [<project>/src/])]."""
+    tsconfig = project_path / 'tsconfig.json'
+    if not tsconfig.exists():
+        return []
+    text = re.sub(r'^\s*//.*$', '', tsconfig.read_text(errors='ignore'), flags=re.MULTILINE)
+    try:
+        options = json.loads(text).get('compilerOptions', {})
+    except ValueError:
+        return []
+    base = project_path / options.get('baseUrl', '.')
+    aliases = []
+    for pattern, targets in options.get('paths', {}).items():
+        prefix = pattern.rstrip('*')
+        aliases.append((prefix, [base / t.rstrip('*') for t in targets]))
+    # Longest prefix first so "@/components/" wins over "@/"
+    return sorted(aliases, key=lambda a: -len(a[0]))
+
+def resolve_import(spec: str, importer: Path, aliases: list[tuple[str, list[Path]]]) -> Path | None:
+    """Resolve an import specifier to a file, or None for packages and virtual modules."""
+    spec = spec.split('?')[0]
+    if spec.startswith('.'):
+        bases = [importer.parent / spec]
+    else:
+        bases = [target / spec[len(prefix):] for prefix, targets in aliases if spec.startswith(prefix) for target in targets]
+    for base in bases:
+        for suffix in RESOLVE_SUFFIXES:
+            candidate = Path(str(base) + suffix)
+            if candidate.is_file():
+                return candidate.resolve()
+    return None
+
+def import_graph(project_path: Path) -> dict[str, set[str]]:
+    """Reverse import graph of src/: file -> files that import it (project-relative)."""
+    aliases = path_aliases(project_path)
+    importers: dict[str, set[str]] = {}
+    for file in find_files(project_path / 'src', GRAPH_EXTENSIONS, project=project_path):
+        rel = file.relative_to(project_path).as_posix()
+        buffer, skip = open_source(file, rel)
+        if skip:
+            continue
+        with buffer:
+            if not buffer.contains(b'import', b'from'):
+                continue
+            content = buffer.text()
+        for match in IMPORT_PATTERN.finditer(content):
+            target = resolve_import(match.group(1), file, aliases)
+            if target and target.is_relative_to(project_path):
+                importers.setdefault(target.relative_to(project_path).as_posix(), set()).add(rel)
+    return importers
+
+def reachable(files, graph: dict[str, set[str]]) -> set[str]:
+    """The files plus everything reachable from them in graph, transitively."""
+    seen = set(files)
+    queue = list(seen)
+    while queue:
+        for target in graph.get(queue.pop(), ()):
+            if target not in seen:
+                seen.add(target)
+                queue.append(target)
+    return seen
+
+def affected_files(project_path: Path, changed: list[str], importers: dict[str, set[str]] | None = None) -> set[str]:
+    """The changed files plus everything that imports them, transitively."""
+    return reachable(changed, importers if importers is not None else import_graph(project_path))
+
+def import_closure(project_path: Path, files: set[str]) -> set[str]:
+    """The files plus everything they import, transitively (project-relative)."""
+    imports: dict[str, set[str]] = {}
+    for target, importers in import_graph(project_path).items():
+        for importer in importers:
+            imports.setdefault(importer, set()).add(target)
+    return reachable(files, imports)
+
+def tracked_files(project_path: Path, ref: str, paths: list[str]) -> list[str]:
+    """Project-relative files under `paths` as of ref."""
+    out = git(project_path, 'ls-tree', '-r', '--name-only', ref, '--', *paths)
+    return [line for line in out.decode().splitlines() if line]
+
+def materialize(project_path: Path, ref: str, files: list[str], dest: Path) -> list[str]:
+    """
+    Write the ref's version of each project-relative file under dest, in one
+    `git cat-file --batch` call. Files that did not exist at ref, or that would
+    land in a directory linked in by link_build_output, are skipped. Returns the
+    files written.
+    """
+    if not files:
+        return []
+    prefix = git(project_path, 'rev-parse', '--show-prefix').decode().strip()
+    specs = ''.join(f"{ref}:{prefix}{f}\n" for f in files).encode()
+    out = git(project_path, 'cat-file', '--batch', stdin=specs)
+    
+    written = []
+    pos = 0
+    for rel in files:
+        header_end = out.index(b'\n', pos)
+        header = out[pos:header_end]
+        pos = header_end + 1
+        if header.endswith((b' missing', b' ambiguous')):
+            continue
+        _, kind, size = header.split(b' ')
+        data = out[pos:pos + int(size)]
+        pos += int(size) + 1
+        target = dest / rel
+        if kind != b'blob' or any(p.is_symlink() for p in target.parents if p.is_relative_to(dest)):
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        written.append(rel)
+    return written
+
+def link_build_output(project_path: Path, dest: Path, name: str = 'dist'):
+    """
+    Point dest/dist at the current build output. dist/ is not in git, so both
+    sides of a comparison read the same build rather than one side having none.
+    Other directories (e.g. public/ for image sizes) can be shared the same way
+    when the ref's copy is not materialized.
+    """
+    dist = project_path / name
+    if dist.is_dir() and not (dest / name).exists():
+        dest.mkdir(parents=True, exist_ok=True)
+        try:
+            (dest / name).symlink_to(dist, target_is_directory=True)
+        except OSError:
+            pass  # No symlinks (e.g. Windows without privileges): the ref side has no build output
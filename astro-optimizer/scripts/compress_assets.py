@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Measures gzip and brotli sizes for every asset in dist/ and reports transfer size
+per route. Optionally writes precompressed .gz/.br siblings so the host does not
+compress on the fly. Compressed output is cached by content hash outside dist/,
+so unchanged hashed _astro/ assets are never compressed again between builds.
+"""
+
+import os
+import gzip
+import json
+import sys
+import hashlib
+import shutil
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:  # Brotli sizes are skipped without the module
+    brotli = None
+
+from walker import find_files
+from dist_pages import find_dist, iter_pages, parse_page, rel_values, resolve_local
+from estimate_lcp import font_faces, SITE_ORIGIN
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.html', '.css', '.js', '.mjs', '.json', '.svg', '.xml', '.txt', '.map',
+    '.webmanifest', '.ico', '.ttf', '.otf', '.eot',
+}
+DEFAULT_CACHE_DIR = '.astro-optimizer-cache/compress'
+
+@dataclass
+class CompressedAsset:
+    file: str
+    raw: int
+    gzip: int
+    br: int | None
+    cached: bool
+
+def cached_blob(cache_dir: Path, digest: str, encoding: str, data: bytes) -> tuple[Path, bool]:
+    """Return the cached compressed blob for `data`, creating it if needed."""
+    blob = cache_dir / digest[:2] / f"{digest}.{encoding}"
+    if blob.exists():
+        return blob, True
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    if encoding == 'gz':
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    else:
+        compressed = brotli.compress(data, quality=11)
+    # Temp file + rename so an interrupted run never leaves a truncated cache entry
+    tmp = blob.with_name(f"{blob.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(compressed)
+    os.replace(tmp, blob)
+    return blob, False
+
+def compress_asset(file_path: str, dist_path: str, cache_path: str, write: bool) -> CompressedAsset:
+    """Compress one asset (through the cache). Runs inside a worker process."""
+    src = Path(file_path)
+    cache_dir = Path(cache_path)
+    data = src.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    rel = src.relative_to(dist_path).as_posix()
+    
+    gz_blob, gz_cached = cached_blob(cache_dir, digest, 'gz', data)
+    br_blob, br_cached = (cached_blob(cache_dir, digest, 'br', data) if brotli else (None, True))
+    
+    if write:
+        for blob, suffix in ((gz_blob, '.gz'), (br_blob, '.br')):
+            # Only ship a sibling the host would actually prefer
+            if blob and blob.stat().st_size < len(data):
+                shutil.copyfile(blob, src.with_name(src.name + suffix))
+    
+    return CompressedAsset(
+        file=rel,
+        raw=len(data),
+        gzip=gz_blob.stat().st_size,
+        br=br_blob.stat().st_size if br_blob else None,
+        cached=gz_cached and br_cached,
+    )
+
+def find_assets(dist: Path) -> list[Path]:
+    """Every compressible file in dist/ (.gz/.br siblings are not compressible types)."""
+    return find_files(dist, COMPRESSIBLE_EXTENSIONS, gitignore=False)
+
+def css_fonts(css: str, css_url: str, dist: Path) -> set[Path]:
+    """Local font files referenced by @font-face rules in a stylesheet."""
+    fonts = set()
+    for font_url, _ in font_faces(css, css_url):
+        if font_url.startswith(SITE_ORIGIN):
+            font = resolve_local(font_url[len(SITE_ORIGIN):], dist)
+            if font:
+                fonts.add(font)
+    return fonts
+
+def route_resources(page_file: Path, dist: Path) -> set[Path]:
+    """Local files a page loads: stylesheets, scripts, images, preloads and CSS fonts."""
+    page = parse_page(page_file, dist)
+    files = {page_file}
+    for tag in page.tags:
+        url = None
+        if tag.tag == 'link' and rel_values(tag) & {'stylesheet', 'preload', 'modulepreload', 'icon'}:
+            url = tag.attrs.get('href')
+        elif tag.tag in ('script', 'img', 'source', 'video', 'audio'):
+            url = tag.attrs.get('src')
+        elif tag.tag == 'style':
+            files.update(css_fonts(tag.text, SITE_ORIGIN + page.route, dist))
+        file = resolve_local(url, dist, page.route) if url else None
+        if not file:
+            continue
+        files.add(file)
+        if file.suffix == '.css':
+            css_url = SITE_ORIGIN + '/' + file.relative_to(dist).as_posix()
+            files.update(css_fonts(file.read_text(errors='ignore'), css_url, dist))
+    return files
+
+def compress_project(project_path: str, write: bool = False, jobs: int | None = None,
+                     cache_dir: str = DEFAULT_CACHE_DIR) -> dict:
+    """Compress every dist/ asset and report raw vs transfer size per route."""
+    path = Path(project_path).resolve()
+    dist = find_dist(path)
+    if not dist:
+        return {'error': f"No build output found at {path / 'dist'}. Run `astro build` first."}
+    if brotli is None:
+        print("Warning: brotli module not installed (pip install brotli), reporting gzip only", file=sys.stderr)
+    
+    cache = path / cache_dir
+    cache.mkdir(parents=True, exist_ok=True)
+    
+    assets = find_assets(dist)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(compress_asset, str(a), str(dist), str(cache), write) for a in assets]
+        results = [f.result() for f in futures]
+    
+    return compression_report(path, dist, cache, results, write)
+
+def compression_report(path: Path, dist: Path, cache: Path, results: list[CompressedAsset], write: bool) -> dict:
+    """Per-route raw vs transfer size from compressed asset results."""
+    by_file = {r.file: r for r in results}
+    
+    routes = []
+    for route, html_file in iter_pages(dist):
+        raw = gz = br = 0
+        resources = route_resources(html_file, dist)
+        for file in resources:
+            rel = file.relative_to(dist).as_posix()
+            asset = by_file.get(rel)
+            size = file.stat().st_size
+            raw += size
+            # Images and woff2 are already compressed; they go over the wire as-is
+            gz += asset.gzip if asset else size
+            br += (asset.br if asset and asset.br is not None else (asset.gzip if asset else size))
+        routes.append({
+            'route': route,
+            'resources': len(resources),
+            'raw': raw,
+            'gzip': gz,
+            'br': br if brotli else None,
+        })
+    
+    return {
+        'project_path': str(path),
+        'cache_dir': os.path.relpath(cache, path),
+        'assets': [asdict(r) for r in results],
+        'routes': routes,
+        'summary': {
+            'assets': len(results),
+            'cached': len([r for r in results if r.cached]),
+            'raw_bytes': sum(r.raw for r in results),
+            'gzip_bytes': sum(r.gzip for r in results),
+            'br_bytes': sum(r.br for r in results) if brotli else None,
+            'precompressed_written': write,
+        }
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Measure and precompress built Astro assets')
+    parser.add_argument('project_path', help='Path to Astro project (built with `astro build`)')
+    parser.add_argument('--write', action='store_true',
+                        help='Write .gz and .br siblings next to each asset in dist/')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Compression cache relative to the project (default: %(default)s)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    result = compress_project(args.project_path, args.write, args.jobs, args.cache_dir)
+    print(json.dumps(result, indent=2))
+    if 'error' in result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,16 @@ patterns that could be replaced with pure CSS/HTML solutions.
 
 import os
 import re
-import json
 import sys
+import time
+from bisect import bisect_right
 from pathlib import Path
 from dataclasses import dataclass, asdict
 
-@dataclass
+from source_reader import SkippedFile, open_source
+from walker import walk
+
+@dataclass(slots=True)
 class JsToHtmlCssFinding:
     pattern: str
     severity: str  # "high" = easy win, "medium" = moderate effort, "low" = complex migration
@@ -22,6 +26,19 @@ class JsToHtmlCssFinding:
     explanation: str
     example_before: str
     example_after: str
+    
+    def __post_init__(self):
+        self.pattern = sys.intern(self.pattern)
+        self.file = sys.intern(self.file)
+    
+    def to_dict(self) -> dict:
+        """JSON-ready copy, without asdict's recursive deep copy."""
+        return {
+            'pattern': self.pattern, 'severity': self.severity, 'file': self.file, 'line': self.line,
+            'evidence': self.evidence, 'html_css_solution': self.html_css_solution,
+            'explanation': self.explanation, 'example_before': self.example_before,
+            'example_after': self.example_after,
+        }
 
 # Detection patterns with their CSS/HTML alternatives
 PATTERNS = [
@@ -573,32 +590,240 @@ document.querySelectorAll('.reveal').forEach(el => observer.observe(el));""",
 ]
 
 
-def analyze_file(file_path: Path, project_path: Path) -> list[JsToHtmlCssFinding]:
-    """Analyze a single file for JS patterns replaceable with CSS/HTML."""
-    findings = []
+# ---------------------------------------------------------------------------
+# Code regions
+#
+# Patterns only count when they match actual script code. Each file is lexed once:
+# comments (and, in components, everything outside <script>) are blanked to spaces
+# so offsets and line numbers still line up, and string literal spans are recorded.
+# ---------------------------------------------------------------------------
+
+# Files whose scripts live in <script> blocks inside markup
+COMPONENT_EXTENSIONS = {".astro", ".vue", ".svelte", ".html"}
+
+SCRIPT_BLOCK_PATTERN = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.DOTALL | re.IGNORECASE)
+SCRIPT_TYPE_PATTERN = re.compile(r'\btype\s*=\s*["\']?([^"\'\s>]+)', re.IGNORECASE)
+JS_SCRIPT_TYPES = {"module", "text/javascript", "application/javascript", "text/typescript"}
+
+TOKEN_PATTERN = re.compile(r'//|/\*|["\'`/{}]')
+QUOTED_STOP = {q: re.compile(r'\\.|' + q + r'|\n', re.DOTALL) for q in ('"', "'")}
+TEMPLATE_STOP = re.compile(r'\\.|`|\$\{', re.DOTALL)
+REGEX_LITERAL = re.compile(r'/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\[\n])+/[A-Za-z]*')
+
+# A `/` after one of these starts a regex literal rather than a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await",
+}
+
+def regex_allowed(text: str, pos: int, floor: int) -> bool:
+    """Whether a `/` at pos opens a regex literal, judged by the previous token."""
+    i = pos - 1
+    while i >= floor and text[i].isspace():
+        i -= 1
+    if i < floor or text[i] in REGEX_PRECEDERS:
+        return True
+    if text[i].isalpha() or text[i] in "_$":
+        word_end = i + 1
+        while i >= floor and (text[i].isalnum() or text[i] in "_$"):
+            i -= 1
+        return text[i + 1:word_end] in REGEX_KEYWORDS
+    return False
+
+def scan_template(text: str, open_at: int, end: int, strings: list, templates: list) -> int:
+    """Scan template literal text from a backtick (or the `}` closing a `${`)."""
+    i = open_at + 1
+    while True:
+        m = TEMPLATE_STOP.search(text, i, end)
+        if m is None:
+            strings.append((open_at, end))
+            return end
+        if m.group() == '`':
+            strings.append((open_at, m.end()))
+            return m.end()
+        if m.group() == '${':
+            # Back to code until the matching `}`
+            strings.append((open_at, m.end()))
+            templates.append(0)
+            return m.end()
+        i = m.end()
+
+def lex_js(text: str, start: int = 0, end: int | None = None) -> tuple[list, list]:
+    """
+    Find comment and string literal spans in JS/TS between start and end.
+    Returns (comments, strings) as (start, end) offsets, in order. Regex
+    literals count as strings. Unterminated quotes stop at the end of the line.
+    """
+    end = len(text) if end is None else end
+    comments: list[tuple[int, int]] = []
+    strings: list[tuple[int, int]] = []
+    templates: list[int] = []  # Brace depth inside each open `${`, innermost last
+    pos = start
     
+    while pos < end:
+        m = TOKEN_PATTERN.search(text, pos, end)
+        if m is None:
+            break
+        token, i = m.group(), m.start()
+        pos = i + len(token)
+        
+        if token == '//':
+            newline = text.find('\n', i, end)
+            pos = end if newline == -1 else newline
+            comments.append((i, pos))
+        elif token == '/*':
+            close = text.find('*/', pos, end)
+            pos = end if close == -1 else close + 2
+            comments.append((i, pos))
+        elif token in ('"', "'"):
+            stop = QUOTED_STOP[token].search(text, pos, end)
+            while stop is not None and stop.group().startswith('\\'):
+                stop = QUOTED_STOP[token].search(text, stop.end(), end)
+            pos = end if stop is None else (stop.start() if stop.group() == '\n' else stop.end())
+            strings.append((i, pos))
+        elif token == '`':
+            pos = scan_template(text, i, end, strings, templates)
+        elif token == '/':
+            literal = REGEX_LITERAL.match(text, i, end) if regex_allowed(text, i, start) else None
+            if literal:
+                pos = literal.end()
+                strings.append((i, pos))
+        elif token == '{':
+            if templates:
+                templates[-1] += 1
+        elif templates:  # '}'
+            if templates[-1] == 0:
+                templates.pop()
+                pos = scan_template(text, i, end, strings, templates)
+            else:
+                templates[-1] -= 1
+    
+    return comments, strings
+
+def script_regions(content: str, suffix: str) -> list[tuple[int, int]]:
+    """The spans of a file that hold client-side script code."""
+    if suffix not in COMPONENT_EXTENSIONS:
+        return [(0, len(content))]
+    regions = []
+    for m in SCRIPT_BLOCK_PATTERN.finditer(content):
+        script_type = SCRIPT_TYPE_PATTERN.search(m.group(1))
+        # Skip JSON-LD, templates and other non-JS payloads
+        if script_type and script_type.group(1).lower() not in JS_SCRIPT_TYPES:
+            continue
+        regions.append(m.span(2))
+    return regions
+
+def blank(text: str) -> str:
+    """Spaces in place of every character but line breaks."""
+    return '\n'.join(' ' * len(line) for line in text.split('\n'))
+
+def code_view(content: str, suffix: str,
+              regions: list[tuple[int, int]] | None = None) -> tuple[str, list[tuple[int, int]]]:
+    """
+    Return (text, strings): the content with everything but script code blanked
+    out, same length and line breaks as the original, plus string literal spans.
+    `regions` are the script regions, when the caller already has them.
+    """
+    blanks = []
+    strings = []
+    pos = 0
+    for start, end in (script_regions(content, suffix) if regions is None else regions):
+        blanks.append((pos, start))
+        comments, region_strings = lex_js(content, start, end)
+        blanks.extend(comments)
+        strings.extend(region_strings)
+        pos = end
+    blanks.append((pos, len(content)))
+    
+    pieces = []
+    pos = 0
+    for start, end in blanks:
+        pieces.append(content[pos:start])
+        pieces.append(blank(content[start:end]))
+        pos = end
+    return ''.join(pieces), strings
+
+def in_spans(starts: list[int], spans: list[tuple[int, int]], pos: int) -> bool:
+    i = bisect_right(starts, pos) - 1
+    return i >= 0 and pos < spans[i][1]
+
+def is_selector_pattern(js_pattern: str) -> bool:
+    """
+    Patterns naming a CSS class or data attribute (`\\.modal`, `data-tooltip`) look for
+    selector strings like querySelector('.modal'), so they may match inside string
+    literals. Method patterns (`\\.slideToggle`, `\\.animate\\(`) may not.
+    """
+    return (js_pattern.startswith(('\\.', 'data-'))
+            and '\\(' not in js_pattern and js_pattern == js_pattern.lower())
+
+COMPILED_PATTERNS = [
+    (pattern_def, [(re.compile(p, re.IGNORECASE), is_selector_pattern(p)) for p in pattern_def["js_patterns"]])
+    for pattern_def in PATTERNS
+]
+
+# Every pattern at once, as bytes: files with no raw match anywhere are never decoded or lexed
+ANY_PATTERN_BYTES = re.compile(
+    b'|'.join(b'(?:' + p.encode() + b')' for pattern_def in PATTERNS for p in pattern_def["js_patterns"]),
+    re.IGNORECASE,
+)
+
+# File patterns to analyze, plus inline scripts in HTML
+SCANNED_EXTENSIONS = [".js", ".ts", ".jsx", ".tsx", ".astro", ".vue", ".svelte", ".html"]
+
+
+def analyze_file(file_path: Path, project_path: Path,
+                 skipped: list[SkippedFile] | None = None) -> list[JsToHtmlCssFinding]:
+    """Analyze a single file for JS patterns replaceable with CSS/HTML."""
     try:
-        content = file_path.read_text(errors='ignore')
+        buffer, skip = open_source(file_path, str(file_path.relative_to(project_path)))
+        if skip:
+            if skipped is not None:
+                skipped.append(skip)
+            return []
+        with buffer:
+            if not buffer.search(ANY_PATTERN_BYTES):
+                return []
+            content = buffer.text()
     except Exception:
+        return []
+    return analyze_content(content, file_path.suffix.lower(), str(file_path.relative_to(project_path)))
+
+def analyze_content(content: str, suffix: str, rel: str) -> list[JsToHtmlCssFinding]:
+    """Find JS patterns in one file's content (e.g. an unsaved editor buffer); `rel` names the file."""
+    findings = []
+    regions = script_regions(content, suffix)
+    code, strings = code_view(content, suffix, regions)
+    if not code.strip():
         return findings
+    string_starts = [s for s, _ in strings]
+    lines = content.split('\n')
+    # Everything outside the script regions is blank, so only they are searched. Each
+    # search runs on to the end of the line, where a pattern's trailing class may match.
+    spans = []
+    for start, end in regions:
+        line_end = code.find('\n', end)
+        spans.append((start, len(code) if line_end == -1 else line_end + 1))
     
-    for pattern_def in PATTERNS:
-        for js_pattern in pattern_def["js_patterns"]:
-            matches = list(re.finditer(js_pattern, content, re.IGNORECASE))
+    for pattern_def, compiled in COMPILED_PATTERNS:
+        for regex, selector in compiled:
+            # First match that starts in code (or in a selector string, for selector patterns)
+            match = next(
+                (m for start, end in spans for m in regex.finditer(code, start, end)
+                 if selector or not in_spans(string_starts, strings, m.start())),
+                None
+            )
             
-            if matches:
-                # Get the first match for evidence
-                match = matches[0]
-                line_num = content[:match.start()].count('\n') + 1
+            if match:
+                line_num = code.count('\n', 0, match.start()) + 1
                 
                 # Extract surrounding context (the line containing the match)
-                lines = content.split('\n')
                 evidence_line = lines[line_num - 1].strip() if line_num <= len(lines) else ""
                 
                 findings.append(JsToHtmlCssFinding(
                     pattern=pattern_def["name"],
                     severity=pattern_def["severity"],
-                    file=str(file_path.relative_to(project_path)),
+                    file=rel,
                     line=line_num,
                     evidence=evidence_line[:100] + ("..." if len(evidence_line) > 100 else ""),
                     html_css_solution=pattern_def["solution"],
@@ -617,24 +842,15 @@ def analyze_project(project_path: str) -> dict:
     src_path = path / "src"
     
     all_findings = []
+    skipped: list[SkippedFile] = []
     
-    # File patterns to analyze
-    extensions = [".js", ".ts", ".jsx", ".tsx", ".astro", ".vue", ".svelte"]
-    
-    for ext in extensions:
-        for file in src_path.rglob(f"*{ext}"):
-            # Skip node_modules and build directories
-            if "node_modules" in str(file) or "dist" in str(file):
-                continue
-            
-            findings = analyze_file(file, path)
+    # One walk for every extension; node_modules and build directories are pruned by the walker
+    files = walk(src_path, SCANNED_EXTENSIONS, project=path)
+    for ext in SCANNED_EXTENSIONS:
+        for file in files.get(ext, []):
+            findings = analyze_file(file, path, skipped)
             all_findings.extend(findings)
     
-    # Also check inline scripts in HTML
-    for html_file in src_path.rglob("*.html"):
-        findings = analyze_file(html_file, path)
-        all_findings.extend(findings)
-    
     # Deduplicate by pattern+file
     seen = set()
     unique_findings = []
@@ -644,40 +860,44 @@ def analyze_project(project_path: str) -> dict:
             seen.add(key)
             unique_findings.append(f)
     
-    # Summary
+    # Summary, in one pass
+    by_severity = {"high": 0, "medium": 0, "low": 0}
+    by_pattern = {}
+    for f in unique_findings:
+        by_severity[f.severity] = by_severity.get(f.severity, 0) + 1
+        by_pattern[f.pattern] = by_pattern.get(f.pattern, 0) + 1
     summary = {
         "total": len(unique_findings),
-        "by_severity": {
-            "high": len([f for f in unique_findings if f.severity == "high"]),
-            "medium": len([f for f in unique_findings if f.severity == "medium"]),
-            "low": len([f for f in unique_findings if f.severity == "low"]),
-        },
-        "by_pattern": {}
+        "by_severity": by_severity,
+        "by_pattern": by_pattern,
     }
     
-    for f in unique_findings:
-        summary["by_pattern"][f.pattern] = summary["by_pattern"].get(f.pattern, 0) + 1
-    
     return {
-        "findings": [asdict(f) for f in unique_findings],
+        "findings": [f.to_dict() for f in unique_findings],
         "summary": summary,
-        "patterns_detected": list(summary["by_pattern"].keys())
+        "patterns_detected": list(summary["by_pattern"].keys()),
+        "skipped": [asdict(s) for s in skipped],
     }
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: detect_js_patterns.py <project-path>", file=sys.stderr)
-        sys.exit(1)
+    import argparse
+    from report_formats import add_report_arguments, emit
+    
+    parser = argparse.ArgumentParser(description='Find JavaScript replaceable with CSS/HTML')
+    parser.add_argument('project_path', help='Path to Astro project')
+    add_report_arguments(parser)
     
-    project_path = sys.argv[1]
+    args = parser.parse_args()
     
-    if not Path(project_path).exists():
-        print(f"Error: Path does not exist: {project_path}", file=sys.stderr)
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
         sys.exit(1)
     
-    result = analyze_project(project_path)
-    print(json.dumps(result, indent=2))
+    started = time.perf_counter()
+    result = analyze_project(args.project_path)
+    timings = {'detect_js_patterns': time.perf_counter() - started}
+    sys.exit(emit(result, "findings", Path(args.project_path).resolve(), "astro-optimizer-js-patterns", args, timings))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Helpers for reading a built Astro site (dist/).
+Maps HTML files to routes and collects resource-relevant tags in document order.
+"""
+
+import re
+from pathlib import Path
+from html.parser import HTMLParser
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from walker import find_files
+
+# Tags that reference or define resources the browser fetches (islands load their component-url)
+RESOURCE_TAGS = {'link', 'script', 'img', 'source', 'style', 'a', 'iframe', 'video', 'audio', 'astro-island'}
+
+# Sectioning elements recorded on each tag so callers can tell nav links from footer links
+LANDMARK_TAGS = {'header', 'nav', 'main', 'aside', 'footer'}
+
+@dataclass
+class PageTag:
+    tag: str
+    attrs: dict[str, str | None]
+    offset: int    # Character offset of the tag in the document
+    in_head: bool
+    text: str = ""  # Inline content for <style> and <script>
+    landmarks: tuple[str, ...] = ()  # Enclosing header/nav/main/aside/footer, outermost first
+
+@dataclass
+class ParsedPage:
+    route: str
+    file: Path
+    size: int
+    tags: list[PageTag] = field(default_factory=list)
+    head_end: int = 0  # Offset of </head> (or <body>)
+
+class _TagCollector(HTMLParser):
+    def __init__(self, content: str):
+        super().__init__(convert_charrefs=True)
+        self.tags: list[PageTag] = []
+        self.in_head = False
+        self.head_end = 0
+        self._line_starts = [0] + [m.end() for m in re.finditer('\n', content)]
+        self._open_text: PageTag | None = None
+        self._landmarks: list[str] = []
+    
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self._line_starts[line - 1] + col
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == 'head':
+            self.in_head = True
+        elif tag == 'body' and self.in_head:
+            self.in_head = False
+            self.head_end = self._offset()
+        if tag in LANDMARK_TAGS:
+            self._landmarks.append(tag)
+        if tag in RESOURCE_TAGS:
+            page_tag = PageTag(tag=tag, attrs=dict(attrs), offset=self._offset(), in_head=self.in_head,
+                               landmarks=tuple(self._landmarks))
+            self.tags.append(page_tag)
+            if tag in ('style', 'script'):
+                self._open_text = page_tag
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self._open_text = None
+        if tag in LANDMARK_TAGS:
+            self._landmarks.pop()
+    
+    def handle_endtag(self, tag):
+        if tag == 'head':
+            self.in_head = False
+            self.head_end = self._offset()
+        if tag in ('style', 'script'):
+            self._open_text = None
+        if tag in self._landmarks:
+            # Pop back to the matching element, tolerating unclosed inner landmarks
+            while self._landmarks.pop() != tag:
+                pass
+    
+    def handle_data(self, data):
+        if self._open_text is not None:
+            self._open_text.text += data
+
+def find_dist(project_path: Path) -> Path | None:
+    """Return the build output directory if the site has been built."""
+    dist = project_path / 'dist'
+    return dist if dist.is_dir() else None
+
+def route_for(html_file: Path, dist: Path) -> str:
+    """Map dist/services/index.html -> /services/ and dist/404.html -> /404."""
+    rel = html_file.relative_to(dist).as_posix()
+    if rel == 'index.html':
+        return '/'
+    if rel.endswith('/index.html'):
+        return '/' + rel[:-len('index.html')]
+    return '/' + rel[:-len('.html')]
+
+def iter_pages(dist: Path):
+    """Yield (route, html_file) for every built page, in a stable order."""
+    for html_file in find_files(dist, ['.html'], gitignore=False):
+        yield route_for(html_file, dist), html_file
+
+def parse_page(html_file: Path, dist: Path) -> ParsedPage:
+    """Parse a built HTML page into its resource tags."""
+    content = html_file.read_text(errors='ignore')
+    collector = _TagCollector(content)
+    collector.feed(content)
+    collector.close()
+    return ParsedPage(
+        route=route_for(html_file, dist),
+        file=html_file,
+        size=len(content.encode('utf-8')),
+        tags=collector.tags,
+        head_end=collector.head_end or len(content),
+    )
+
+def rel_values(tag: PageTag) -> set[str]:
+    """Split a link's rel attribute into lowercase tokens."""
+    return set((tag.attrs.get('rel') or '').lower().split())
+
+def is_local_url(url: str) -> bool:
+    """True for URLs served from the site itself."""
+    parts = urlsplit(url)
+    return not parts.scheme and not parts.netloc and not url.startswith(('data:', '#', 'mailto:', 'tel:'))
+
+def resolve_local(url: str, dist: Path, base_route: str = '/') -> Path | None:
+    """Resolve a same-site URL to a file in dist/, or None if it is not there."""
+    if not is_local_url(url):
+        return None
+    path = urlsplit(url).path
+    if not path.startswith('/'):
+        base = base_route if base_route.endswith('/') else base_route.rsplit('/', 1)[0] + '/'
+        path = base + path
+    candidate = dist / path.lstrip('/')
+    if candidate.is_dir():
+        candidate = candidate / 'index.html'
+    elif not candidate.suffix and not candidate.exists():
+        candidate = candidate.with_suffix('.html')
+    return candidate if candidate.is_file() else None
+
+def resolve_route(url: str, dist: Path, base_route: str = '/') -> str | None:
+    """Resolve a same-site link to the route of the built page it points at."""
+    target = resolve_local(url, dist, base_route)
+    if target is None or target.suffix != '.html':
+        return None
+    return route_for(target, dist)
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+Estimates render start and LCP for each built page without a browser.
+Models the critical request chain (blocking CSS/JS, CSS-triggered fonts, the LCP
+image, preloads and preconnects) over a simulated network, and can compare the
+result against the preloads proposed by generate_preloads.py.
+"""
+
+import re
+import json
+import sys
+import zlib
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+from urllib.parse import urljoin, urlsplit
+
+from dist_pages import find_dist, iter_pages, parse_page, rel_values, resolve_local, ParsedPage, PageTag
+
+SITE_ORIGIN = 'https://site.local'  # Placeholder origin for same-site URLs
+
+@dataclass
+class NetworkProfile:
+    name: str
+    rtt_ms: float
+    bandwidth_kbps: float
+    http2: bool = True
+    max_connections: int = 6  # Per origin, HTTP/1.1 only
+
+PROFILES = {
+    'slow-3g': NetworkProfile('slow-3g', rtt_ms=400, bandwidth_kbps=400, http2=False),
+    'slow-4g': NetworkProfile('slow-4g', rtt_ms=150, bandwidth_kbps=1638),
+    'fast-4g': NetworkProfile('fast-4g', rtt_ms=60, bandwidth_kbps=9000),
+    'cable': NetworkProfile('cable', rtt_ms=40, bandwidth_kbps=10240),
+}
+
+# Transfer sizes assumed for third-party resources we cannot measure
+EXTERNAL_SIZES = {
+    'stylesheet': 20_000,
+    'script': 30_000,
+    'font': 25_000,
+    'image': 80_000,
+    'other': 10_000,
+}
+
+TEXT_SUFFIXES = {'.html', '.css', '.js', '.mjs', '.json', '.svg', '.txt', '.xml'}
+FONT_DISPLAY_BLOCKING = {'', 'auto', 'block'}
+
+@dataclass
+class Request:
+    url: str
+    kind: str  # "document", "stylesheet", "script", "font", "image", "other"
+    origin: str
+    size: int
+    discovered_at: float | None = None  # Fixed discovery time, or None until deps finish
+    depends_on: list[int] = field(default_factory=list)
+    not_before: float = 0.0
+    render_blocking: bool = False
+    start: float | None = None
+    end: float | None = None
+
+@dataclass
+class RouteEstimate:
+    route: str
+    profile: str
+    ttfb_ms: float
+    render_start_ms: float
+    lcp_ms: float
+    lcp_element: dict
+    critical_chain: list[dict] = field(default_factory=list)
+    requests: int = 0
+
+# ---------------------------------------------------------------------------
+# Request graph
+# ---------------------------------------------------------------------------
+
+_size_cache: dict[Path, int] = {}
+
+def transfer_size(file_path: Path) -> int:
+    """Bytes on the wire: gzip-level compressed size for text, raw size otherwise."""
+    if file_path not in _size_cache:
+        data = file_path.read_bytes()
+        if file_path.suffix.lower() in TEXT_SUFFIXES:
+            _size_cache[file_path] = len(zlib.compress(data, 6))
+        else:
+            _size_cache[file_path] = len(data)
+    return _size_cache[file_path]
+
+def absolute(url: str, base: str) -> str:
+    return urljoin(base, url)
+
+def origin_of(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def local_file(url: str, dist: Path) -> Path | None:
+    if origin_of(url) != SITE_ORIGIN:
+        return None
+    return resolve_local(urlsplit(url).path, dist)
+
+def font_faces(css: str, css_url: str) -> list[tuple[str, str]]:
+    """Return (font_url, font-display) for @font-face rules that cover basic Latin."""
+    faces = []
+    for match in re.finditer(r'@font-face\s*\{([^}]*)\}', css, re.IGNORECASE):
+        body = match.group(1)
+        unicode_range = re.search(r'unicode-range\s*:\s*([^;]+)', body, re.IGNORECASE)
+        if unicode_range and not covers_basic_latin(unicode_range.group(1)):
+            continue
+        urls = re.findall(r'url\(\s*["\']?([^"\')]+)["\']?\s*\)', body)
+        if not urls:
+            continue
+        # Browsers take the first format they support; every target supports woff2
+        url = next((u for u in urls if '.woff2' in u.lower()), urls[0])
+        display = re.search(r'font-display\s*:\s*([a-z]+)', body, re.IGNORECASE)
+        faces.append((absolute(url, css_url), display.group(1).lower() if display else ''))
+    return faces
+
+def covers_basic_latin(unicode_range: str) -> bool:
+    """True if a unicode-range includes 'A' (U+0041), i.e. the face is used for Latin text."""
+    for part in unicode_range.split(','):
+        part = part.strip().upper().removeprefix('U+')
+        if '?' in part:
+            low, high = int(part.replace('?', '0'), 16), int(part.replace('?', 'F'), 16)
+        elif '-' in part:
+            low_s, high_s = part.split('-', 1)
+            low, high = int(low_s, 16), int(high_s.removeprefix('U+'), 16)
+        else:
+            try:
+                low = high = int(part, 16)
+            except ValueError:
+                continue
+        if low <= 0x41 <= high:
+            return True
+    return False
+
+def pick_lcp_image(page: ParsedPage) -> PageTag | None:
+    """Choose the likely LCP image: fetchpriority=high, else the largest early image, else the first."""
+    candidates = []
+    for tag in page.tags:
+        if tag.tag != 'img' or tag.in_head or not tag.attrs.get('src'):
+            continue
+        width, height = dimension(tag.attrs.get('width')), dimension(tag.attrs.get('height'))
+        if (width and width < 100) or (height and height < 100):
+            continue  # Icons and decorations never win LCP
+        candidates.append((tag, (width or 0) * (height or 0)))
+    if not candidates:
+        return None
+    for tag, _ in candidates:
+        if (tag.attrs.get('fetchpriority') or '').lower() == 'high':
+            return tag
+    early = candidates[:5]
+    tag, area = max(early, key=lambda c: c[1])
+    return tag if area else candidates[0][0]
+
+def dimension(value: str | None) -> int | None:
+    try:
+        return int(float(value)) if value else None
+    except ValueError:
+        return None
+
+def preload_kind(as_type: str | None) -> str:
+    return {'style': 'stylesheet', 'script': 'script', 'font': 'font', 'image': 'image'}.get(as_type or '', 'other')
+
+def build_requests(page: ParsedPage, dist: Path, profile: NetworkProfile,
+                   extra_preloads: list[PageTag]) -> tuple[list[Request], dict[str, float], dict]:
+    """
+    Build the request graph for one page.
+    Returns (requests, preconnect start times by origin, info about the LCP element).
+    """
+    bytes_per_ms = profile.bandwidth_kbps / 8
+    page_url = SITE_ORIGIN + page.route
+    doc = Request(url=page_url, kind='document', origin=SITE_ORIGIN,
+                  size=transfer_size(page.file), discovered_at=0.0)
+    requests = [doc]
+    by_url: dict[str, int] = {}
+    preconnects: dict[str, float] = {}
+    
+    # Without contention, byte N of the HTML arrives at ttfb + N / bandwidth
+    ttfb = 4 * profile.rtt_ms
+    html_rate = page.size / doc.size if doc.size else 1
+    def discovered(offset: int) -> float:
+        return ttfb + offset / html_rate / bytes_per_ms
+    
+    head_parsed = discovered(page.head_end)
+    
+    def add(url: str, kind: str, **kwargs) -> int:
+        if url in by_url:
+            return by_url[url]
+        file = local_file(url, dist)
+        size = transfer_size(file) if file else EXTERNAL_SIZES.get(kind, EXTERNAL_SIZES['other'])
+        requests.append(Request(url=url, kind=kind, origin=origin_of(url), size=size, **kwargs))
+        by_url[url] = len(requests) - 1
+        return by_url[url]
+    
+    blocking: list[int] = []
+    faces: list[tuple[str, str]] = []
+    # What-if preloads go first in <head>, ahead of everything the page already has
+    tags = [PageTag(tag=t.tag, attrs=t.attrs, offset=0, in_head=True) for t in extra_preloads] + page.tags
+    
+    for tag in tags:
+        attrs = tag.attrs
+        at = discovered(tag.offset)
+        if tag.tag == 'link':
+            rels = rel_values(tag)
+            href = attrs.get('href')
+            if not href:
+                continue
+            url = absolute(href, page_url)
+            if 'preconnect' in rels or 'dns-prefetch' in rels:
+                preconnects.setdefault(origin_of(url), at)
+            elif 'stylesheet' in rels:
+                media = (attrs.get('media') or 'all').lower()
+                idx = add(url, 'stylesheet', discovered_at=at)
+                if media in ('all', 'screen') and tag.in_head:
+                    requests[idx].render_blocking = True
+                    blocking.append(idx)
+                file = local_file(url, dist)
+                if file:
+                    faces.extend(font_faces(file.read_text(errors='ignore'), url))
+            elif 'preload' in rels:
+                add(url, preload_kind(attrs.get('as')), discovered_at=at)
+        elif tag.tag == 'script':
+            src = attrs.get('src')
+            if not src:
+                continue
+            url = absolute(src, page_url)
+            is_async = 'async' in attrs or 'defer' in attrs or (attrs.get('type') or '') == 'module'
+            idx = add(url, 'script', discovered_at=at)
+            if tag.in_head and not is_async:
+                requests[idx].render_blocking = True
+                blocking.append(idx)
+        elif tag.tag == 'style':
+            faces.extend(font_faces(tag.text, page_url))
+    
+    # Fonts are requested once styles are resolved, i.e. after every blocking stylesheet
+    blocking_css = [i for i in blocking if requests[i].kind == 'stylesheet']
+    font_display = {}
+    for url, display in faces:
+        font_display.setdefault(url, display)
+        add(url, 'font', depends_on=blocking_css, not_before=head_parsed)
+    
+    lcp_tag = pick_lcp_image(page)
+    lcp = {'type': 'text', 'url': None,
+           'blocking_fonts': [by_url[u] for u, d in font_display.items() if d in FONT_DISPLAY_BLOCKING]}
+    if lcp_tag:
+        url = absolute(lcp_tag.attrs['src'], page_url)
+        lazy = (lcp_tag.attrs.get('loading') or '').lower() == 'lazy'
+        if lazy:
+            # Lazy images are only requested after layout
+            idx = add(url, 'image', depends_on=blocking, not_before=head_parsed)
+        else:
+            idx = add(url, 'image', discovered_at=discovered(lcp_tag.offset))
+        lcp = {'type': 'image', 'url': url, 'index': idx, 'lazy': lazy}
+    
+    return requests, preconnects, {'head_parsed': head_parsed, 'blocking': blocking, 'lcp': lcp}
+
+# ---------------------------------------------------------------------------
+# Network simulation
+# ---------------------------------------------------------------------------
+
+def simulate(requests: list[Request], preconnects: dict[str, float], profile: NetworkProfile) -> None:
+    """
+    Simulate the requests over one shared bottleneck link.
+    Active transfers share bandwidth equally. New origins pay DNS+TCP+TLS
+    (3 RTT, started early by preconnect). With HTTP/2 every request to an origin
+    shares one connection; with HTTP/1.1 each origin gets at most
+    `max_connections`, and extra requests queue for a free one.
+    """
+    rtt = profile.rtt_ms
+    bytes_per_ms = profile.bandwidth_kbps / 8
+    
+    first_conn_ready: dict[str, float] = {}
+    open_conns: dict[str, int] = {}
+    busy: dict[str, int] = {}
+    queued: dict[str, list[int]] = {}
+    ready_at: dict[int, float] = {}
+    
+    def connection_ready(origin: str, at: float) -> float:
+        if origin not in first_conn_ready:
+            if origin in preconnects and preconnects[origin] < at:
+                first_conn_ready[origin] = preconnects[origin] + 3 * rtt
+            else:
+                first_conn_ready[origin] = at + 3 * rtt
+        return first_conn_ready[origin]
+    
+    def dispatch(i: int, at: float) -> None:
+        req = requests[i]
+        conn_at = connection_ready(req.origin, at)
+        if profile.http2:
+            ready_at[i] = max(at, conn_at) + rtt
+            return
+        if busy.get(req.origin, 0) >= profile.max_connections:
+            queued.setdefault(req.origin, []).append(i)
+            return
+        busy[req.origin] = busy.get(req.origin, 0) + 1
+        if open_conns.get(req.origin, 0) < busy[req.origin]:
+            # Another connection to a known origin: DNS is cached, TCP+TLS is not
+            open_conns[req.origin] = busy[req.origin]
+            conn_at = conn_at if busy[req.origin] == 1 else max(at, conn_at) + 2 * rtt
+        ready_at[i] = max(at, conn_at) + rtt
+    
+    def discover(i: int, at: float) -> None:
+        requests[i].discovered_at = at
+        dispatch(i, at)
+    
+    for i, req in enumerate(requests):
+        if not req.depends_on:
+            discover(i, req.discovered_at if req.discovered_at is not None else req.not_before)
+    
+    active: dict[int, float] = {}
+    now = 0.0
+    remaining = len(requests)
+    while remaining:
+        waiting = [(t, i) for i, t in ready_at.items() if requests[i].start is None]
+        next_start = min(waiting)[0] if waiting else float('inf')
+        share = bytes_per_ms / len(active) if active else 0
+        next_end = now + min(active.values()) / share if active else float('inf')
+        if next_start == float('inf') and next_end == float('inf'):
+            break  # Unreachable requests (cyclic or missing deps)
+        
+        step_to = min(next_start, next_end)
+        if active:
+            sent = (step_to - now) * share
+            for i in active:
+                active[i] -= sent
+        now = step_to
+        
+        for t, i in waiting:
+            if t <= now:
+                requests[i].start = now
+                active[i] = float(max(requests[i].size, 1))
+        
+        for i in [i for i, left in active.items() if left <= 1e-6]:
+            del active[i]
+            requests[i].end = now
+            remaining -= 1
+            origin = requests[i].origin
+            if not profile.http2:
+                busy[origin] -= 1
+                if queued.get(origin):
+                    dispatch(queued[origin].pop(0), now)
+            for j, other in enumerate(requests):
+                if other.discovered_at is None and other.depends_on and i in other.depends_on:
+                    if all(requests[d].end is not None for d in other.depends_on):
+                        discover(j, max(now, other.not_before))
+
+def estimate_page(page: ParsedPage, dist: Path, profile: NetworkProfile,
+                  extra_preloads: list[PageTag] | None = None) -> RouteEstimate:
+    """Estimate render start and LCP for one page under one profile."""
+    requests, preconnects, info = build_requests(page, dist, profile, extra_preloads or [])
+    simulate(requests, preconnects, profile)
+    
+    doc = requests[0]
+    ttfb = doc.start or 0.0
+    render_start = max([info['head_parsed']] + [requests[i].end or 0.0 for i in info['blocking']])
+    
+    lcp = info['lcp']
+    chain = set(info['blocking'])
+    if lcp['type'] == 'image':
+        image = requests[lcp['index']]
+        lcp_ms = max(render_start, image.end or render_start)
+        chain.add(lcp['index'])
+        lcp_element = {'type': 'image', 'url': display_url(image.url), 'lazy': lcp['lazy']}
+    else:
+        # Text paints with a fallback font unless font-display blocks it (up to 3s)
+        font_ends = [requests[i].end or 0.0 for i in lcp['blocking_fonts']]
+        lcp_ms = max([render_start] + [min(end, render_start + 3000) for end in font_ends])
+        lcp_element = {'type': 'text', 'url': None}
+    chain.update(i for i, r in enumerate(requests) if r.kind == 'font')
+    
+    return RouteEstimate(
+        route=page.route,
+        profile=profile.name,
+        ttfb_ms=round(ttfb, 1),
+        render_start_ms=round(render_start, 1),
+        lcp_ms=round(lcp_ms, 1),
+        lcp_element=lcp_element,
+        critical_chain=[
+            {
+                'url': display_url(requests[i].url),
+                'kind': requests[i].kind,
+                'bytes': requests[i].size,
+                'discovered_ms': round(requests[i].discovered_at or 0.0, 1),
+                'start_ms': round(requests[i].start or 0.0, 1),
+                'end_ms': round(requests[i].end or 0.0, 1),
+                'render_blocking': requests[i].render_blocking,
+            }
+            for i in sorted(chain, key=lambda i: requests[i].start or 0.0)
+        ],
+        requests=len(requests),
+    )
+
+def display_url(url: str) -> str:
+    return url[len(SITE_ORIGIN):] if url.startswith(SITE_ORIGIN) else url
+
+# ---------------------------------------------------------------------------
+# What-if: preloads proposed by generate_preloads.py
+# ---------------------------------------------------------------------------
+
+def page_route_for_source(source: str) -> str | None:
+    """Map src/pages/services/index.astro -> /services/. Dynamic routes return None."""
+    rel = source.removeprefix('src/pages/')
+    if '[' in rel:
+        return None
+    rel = re.sub(r'\.(astro|md|mdx)$', '', rel)
+    if rel == 'index':
+        return '/'
+    if rel.endswith('/index'):
+        return '/' + rel[:-len('index')]
+    return '/' + rel
+
+def match_built_url(href: str, dist: Path) -> str:
+    """
+    Map a source-level href (e.g. /fonts/inter.woff2) to the hashed URL Astro
+    emitted (e.g. /_astro/inter.Bx12.woff2) when the file was bundled.
+    """
+    if resolve_local(href, dist):
+        return href
+    stem = Path(urlsplit(href).path).stem
+    suffix = Path(urlsplit(href).path).suffix
+    for file in (dist / '_astro').glob(f"{stem}.*{suffix}") if (dist / '_astro').is_dir() else []:
+        return '/' + file.relative_to(dist).as_posix()
+    return href
+
+def proposed_preloads(project_path: Path) -> tuple[list[dict], dict[str, list[dict]]]:
+    """Layout-level preloads and page-level preloads keyed by route, from generate_preloads."""
+    from generate_preloads import analyze_project as generate_preloads
+    
+    result = generate_preloads(str(project_path))
+    layout = [p for p in result['preloads'] if p['scope'] == 'layout']
+    by_route: dict[str, list[dict]] = {}
+    for source, preloads in result['page_specific'].items():
+        route = page_route_for_source(source)
+        if route:
+            by_route.setdefault(route, []).extend(preloads)
+    return layout, by_route
+
+def preload_tags(preloads: list[dict], page: ParsedPage, dist: Path) -> list[PageTag]:
+    existing = {t.attrs.get('href') for t in page.tags if t.tag == 'link' and 'preload' in rel_values(t)}
+    tags = []
+    for p in preloads:
+        href = match_built_url(p['href'], dist)
+        if href in existing:
+            continue
+        tags.append(PageTag(tag='link', attrs={'rel': 'preload', 'href': href, 'as': p['as_type']},
+                            offset=0, in_head=True))
+    return tags
+
+# ---------------------------------------------------------------------------
+# Project
+# ---------------------------------------------------------------------------
+
+def estimate_project(project_path: str, profiles: list[NetworkProfile],
+                     with_preloads: bool = False, route_filter: str | None = None) -> dict:
+    """Estimate every built page under each network profile."""
+    path = Path(project_path).resolve()
+    dist = find_dist(path)
+    if not dist:
+        return {'error': f"No build output found at {path / 'dist'}. Run `astro build` first."}
+    
+    layout_preloads, route_preloads = proposed_preloads(path) if with_preloads else ([], {})
+    
+    routes = []
+    for route, html_file in iter_pages(dist):
+        if route_filter and not route.startswith(route_filter):
+            continue
+        page = parse_page(html_file, dist)
+        entry = {'route': route, 'estimates': {}}
+        extra = preload_tags(layout_preloads + route_preloads.get(route, []), page, dist) if with_preloads else []
+        for profile in profiles:
+            base = estimate_page(page, dist, profile)
+            estimate = asdict(base)
+            if with_preloads:
+                what_if = estimate_page(page, dist, profile, extra)
+                estimate['what_if_preloads'] = {
+                    'added': [t.attrs['href'] for t in extra],
+                    'render_start_ms': what_if.render_start_ms,
+                    'lcp_ms': what_if.lcp_ms,
+                    'lcp_delta_ms': round(what_if.lcp_ms - base.lcp_ms, 1),
+                }
+            entry['estimates'][profile.name] = estimate
+        routes.append(entry)
+    
+    summary = {}
+    for profile in profiles:
+        lcps = sorted(r['estimates'][profile.name]['lcp_ms'] for r in routes)
+        if not lcps:
+            continue
+        summary[profile.name] = {
+            'routes': len(lcps),
+            'median_lcp_ms': lcps[len(lcps) // 2],
+            'max_lcp_ms': lcps[-1],
+            'slowest_route': max(routes, key=lambda r: r['estimates'][profile.name]['lcp_ms'])['route'],
+        }
+    
+    return {
+        'project_path': str(path),
+        'profiles': [asdict(p) for p in profiles],
+        'routes': routes,
+        'summary': summary,
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Estimate LCP and render start for built Astro pages')
+    parser.add_argument('project_path', help='Path to Astro project (built with `astro build`)')
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                        help='Network profile (repeatable, default: slow-4g)')
+    parser.add_argument('--rtt', type=float, help='Custom round-trip time in ms')
+    parser.add_argument('--bandwidth', type=float, help='Custom downlink bandwidth in kbps')
+    parser.add_argument('--http1', action='store_true', help='Custom profile without HTTP/2 multiplexing')
+    parser.add_argument('--with-preloads', action='store_true',
+                        help='Also estimate each page with the preloads from generate_preloads.py')
+    parser.add_argument('--route', help='Only estimate routes starting with this prefix')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    profiles = [PROFILES[name] for name in (args.profile or [])]
+    if args.rtt or args.bandwidth or args.http1:
+        base = PROFILES['slow-4g']
+        profiles.append(NetworkProfile(
+            'custom',
+            rtt_ms=args.rtt or base.rtt_ms,
+            bandwidth_kbps=args.bandwidth or base.bandwidth_kbps,
+            http2=not args.http1,
+        ))
+    if not profiles:
+        profiles = [PROFILES['slow-4g']]
+    
+    result = estimate_project(args.project_path, profiles, args.with_preloads, args.route)
+    print(json.dumps(result, indent=2))
+    if 'error' in result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Generates a Netlify _headers file: immutable caching for hashed /_astro/* assets,
+short caching for HTML, and per-route `Link: rel=preload` headers (from
+generate_preloads.py and each page's render-blocking CSS) so the CDN can send
+103 Early Hints. Routes that share the same Link set are merged into one rule.
+"""
+
+import re
+import json
+import sys
+from pathlib import Path
+
+from apply_optimizations import backup_file
+from dist_pages import find_dist, iter_pages, parse_page, rel_values
+from estimate_lcp import proposed_preloads, match_built_url
+
+HEADERS_BLOCK_START = '# astro-optimizer:headers:start'
+HEADERS_BLOCK_END = '# astro-optimizer:headers:end'
+MANAGED_BLOCK_PATTERN = re.compile(
+    re.escape(HEADERS_BLOCK_START) + r'.*?' + re.escape(HEADERS_BLOCK_END) + r'\n?',
+    re.DOTALL,
+)
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+FONT_TYPES = {'.woff2': 'font/woff2', '.woff': 'font/woff', '.ttf': 'font/ttf', '.otf': 'font/otf'}
+
+def link_header(href: str, as_type: str, crossorigin: bool = False) -> str:
+    """Format one preload as a Link header value."""
+    parts = [f'<{href}>', 'rel=preload', f'as={as_type}']
+    suffix = Path(href.split('?')[0]).suffix.lower()
+    if as_type == 'font' and suffix in FONT_TYPES:
+        parts.append(f'type="{FONT_TYPES[suffix]}"')
+    if crossorigin or as_type == 'font':
+        parts.append('crossorigin')
+    return '; '.join(parts)
+
+def route_links(project_path: Path, dist: Path | None) -> dict[str, tuple[str, ...]]:
+    """Link header values for every route, fonts first, in a stable order."""
+    layout, by_route = proposed_preloads(project_path)
+    
+    if dist:
+        routes = {}
+        for route, html_file in iter_pages(dist):
+            page = parse_page(html_file, dist)
+            # Render-blocking CSS is the most valuable thing to hint early
+            styles = [
+                link_header(t.attrs['href'], 'style')
+                for t in page.tags
+                if t.tag == 'link' and t.in_head and 'stylesheet' in rel_values(t)
+                and (t.attrs.get('href') or '').startswith('/')
+            ]
+            routes[route] = styles
+    else:
+        routes = {'/': []}
+        routes.update({route: [] for route in by_route})
+    
+    links = {}
+    for route, styles in routes.items():
+        preloads = [
+            link_header(match_built_url(p['href'], dist) if dist else p['href'], p['as_type'], p['crossorigin'])
+            for p in layout + by_route.get(route, [])
+        ]
+        ordered = sorted(preloads, key=lambda v: 'as=font' not in v) + styles
+        links[route] = tuple(dict.fromkeys(ordered))
+    return links
+
+def merge_routes(links: dict[str, tuple[str, ...]]) -> list[tuple[str, tuple[str, ...]]]:
+    """
+    Collapse routes into path patterns. A directory whose routes all share one
+    Link set becomes a single `/dir/*` rule. The root is never collapsed to `/*`,
+    because Netlify applies every matching rule and that would also hit /_astro/*.
+    """
+    tree: dict = {}
+    for route, values in links.items():
+        node = tree
+        for segment in [s for s in route.strip('/').split('/') if s]:
+            node = node.setdefault(segment, {})
+        node[''] = values  # '' holds the route's own value
+    
+    rules: list[tuple[str, tuple[str, ...]]] = []
+    
+    def values_under(node: dict) -> set[tuple[str, ...]]:
+        found = {node['']} if '' in node else set()
+        for key, child in node.items():
+            if key:
+                found |= values_under(child)
+        return found
+    
+    def walk(node: dict, prefix: str):
+        children = sorted(k for k in node if k)
+        if prefix != '/' and children:
+            found = values_under(node)
+            if len(found) == 1:
+                rules.append((prefix + '*', found.pop()))
+                return
+        if '' in node:
+            # Leaf routes without a trailing slash (e.g. /404) keep their exact path
+            rules.append((prefix if children or prefix == '/' else prefix.rstrip('/'), node['']))
+        for key in children:
+            walk(node[key], f"{prefix}{key}/")
+    
+    walk(tree, '/')
+    return rules
+
+def render_headers(rules: list[tuple[str, tuple[str, ...]]], html_max_age: int) -> str:
+    """Render the managed block of the _headers file."""
+    lines = [
+        HEADERS_BLOCK_START,
+        '/_astro/*',
+        f'  Cache-Control: {IMMUTABLE_CACHE}',
+    ]
+    for pattern, values in rules:
+        lines.append('')
+        lines.append(pattern)
+        lines.append(f'  Cache-Control: public, max-age={html_max_age}, must-revalidate')
+        lines.extend(f'  Link: {value}' for value in values)
+    lines.append(HEADERS_BLOCK_END)
+    return '\n'.join(lines) + '\n'
+
+def generate_headers(project_path: str, target: str = 'public', html_max_age: int = 0) -> dict:
+    """Write (or refresh) the managed block in <target>/_headers."""
+    path = Path(project_path).resolve()
+    dist = find_dist(path)
+    links = route_links(path, dist)
+    rules = merge_routes(links)
+    block = render_headers(rules, html_max_age)
+    
+    headers_file = path / target / '_headers'
+    headers_file.parent.mkdir(parents=True, exist_ok=True)
+    content = headers_file.read_text() if headers_file.exists() else ''
+    if MANAGED_BLOCK_PATTERN.search(content):
+        updated = MANAGED_BLOCK_PATTERN.sub(lambda _: block, content, count=1)
+    else:
+        updated = content + ('\n' if content and not content.endswith('\n') else '') + block
+    
+    changed = updated != content
+    if changed:
+        if headers_file.exists():
+            backup_file(headers_file, path / '.astro-optimizer-backups')
+        headers_file.write_text(updated)
+    
+    return {
+        'project_path': str(path),
+        'file': str(headers_file.relative_to(path)),
+        'changed': changed,
+        'rules': [{'pattern': p, 'links': list(v)} for p, v in rules],
+        'summary': {
+            'routes': len(links),
+            'link_rules': len(rules),
+            'built_site': dist is not None,
+        }
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate Netlify _headers for caching and Early Hints')
+    parser.add_argument('project_path', help='Path to Astro project')
+    parser.add_argument('--target', choices=['public', 'dist'], default='public',
+                        help='Write public/_headers (copied on build) or dist/_headers (default: %(default)s)')
+    parser.add_argument('--html-max-age', type=int, default=0,
+                        help='max-age in seconds for HTML routes (default: %(default)s)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    result = generate_headers(args.project_path, args.target, args.html_max_age)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Generates responsive AVIF/WebP variants for raster images in public/ and src/.
+Variants are named by content hash, so unchanged images are never re-encoded,
+and a manifest maps each original to its variants and srcset strings.
+"""
+
+import os
+import re
+import json
+import sys
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, field, asdict, replace
+from concurrent.futures import ProcessPoolExecutor
+
+from walker import find_files
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow is only needed when something has to be encoded
+    Image = None
+    features = None
+
+RASTER_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+DEFAULT_WIDTHS = [480, 768, 1280, 1920]
+DEFAULT_FORMATS = ['avif', 'webp']
+DEFAULT_OUT_DIR = 'public/_variants'
+
+@dataclass
+class ImageVariant:
+    format: str
+    width: int
+    path: str  # Relative to the project root
+    url: str   # Public URL used in srcset
+
+@dataclass
+class ImageVariantSet:
+    original: str
+    content_hash: str
+    width: int
+    height: int
+    variants: list[ImageVariant] = field(default_factory=list)
+    srcset: dict[str, str] = field(default_factory=dict)
+    cached: bool = False
+    error: str | None = None
+
+def content_hash(file_path: Path) -> str:
+    """Hash file content in chunks so large images are not read at once."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def find_raster_images(project_path: Path, out_dir: Path) -> list[Path]:
+    """Find raster images in public/ and src/, skipping generated variants."""
+    images = []
+    for root in [project_path / 'public', project_path / 'src']:
+        for file in find_files(root, RASTER_EXTENSIONS, project=project_path):
+            if out_dir in file.parents:
+                continue
+            images.append(file)
+    return sorted(images)
+
+def target_widths(intrinsic_width: int, widths: list[int]) -> list[int]:
+    """Widths to encode: configured widths below the intrinsic width, plus the intrinsic width."""
+    return sorted({w for w in widths if w < intrinsic_width} | {intrinsic_width})
+
+def variant_stem(file_path: Path) -> str:
+    return re.sub(r'[^a-zA-Z0-9_-]+', '-', file_path.stem).strip('-') or 'image'
+
+def variant_name(file_path: Path, digest: str, width: int, quality: int, fmt: str) -> str:
+    """Cache-stable variant file name. Quality is part of the key so changing it re-encodes."""
+    return f"{variant_stem(file_path)}-{digest}-{width}w-q{quality}.{fmt}"
+
+def public_url(variant_path: Path, project_path: Path) -> str:
+    """URL a variant is served from. Files under public/ are served from the site root."""
+    public_path = project_path / 'public'
+    try:
+        return '/' + variant_path.relative_to(public_path).as_posix()
+    except ValueError:
+        return '/' + variant_path.relative_to(project_path).as_posix()
+
+def build_srcset(variants: list[ImageVariant], fmt: str) -> str:
+    """Build a srcset string for one format."""
+    return ', '.join(f"{v.url} {v.width}w" for v in variants if v.format == fmt)
+
+def read_cache_record(record_path: Path) -> dict | None:
+    try:
+        return json.loads(record_path.read_text())
+    except (OSError, ValueError):
+        return None
+
+def write_atomic(path: Path, write):
+    """
+    Call write(tmp_path), then rename into place. The per-process temp name
+    keeps concurrent workers apart, and an interrupted write never leaves a
+    truncated file that later looks like a cache hit.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+def encode_image(file_path: str, project_path: str, out_dir: str,
+                 widths: list[int], formats: list[str], quality: int, digest: str) -> ImageVariantSet:
+    """Encode one image into every width/format pair. Runs inside a worker process."""
+    src = Path(file_path)
+    project = Path(project_path)
+    out = Path(out_dir)
+    rel = src.relative_to(project).as_posix()
+    record_path = out / f".{digest}.json"
+    
+    result = ImageVariantSet(original=rel, content_hash=digest, width=0, height=0)
+    
+    # The record stores intrinsic size so cache hits never decode the image
+    record = read_cache_record(record_path)
+    if record:
+        result.width, result.height = record['width'], record['height']
+    else:
+        if Image is None:
+            result.error = "Pillow is not installed (pip install pillow)"
+            return result
+        try:
+            with Image.open(src) as img:
+                result.width, result.height = img.size
+        except Exception as e:
+            result.error = str(e)
+            return result
+    
+    pending = []
+    for width in target_widths(result.width, widths):
+        for fmt in formats:
+            variant_path = out / variant_name(src, digest, width, quality, fmt)
+            result.variants.append(ImageVariant(
+                format=fmt,
+                width=width,
+                path=variant_path.relative_to(project).as_posix(),
+                url=public_url(variant_path, project),
+            ))
+            if not variant_path.exists():
+                pending.append((variant_path, width, fmt))
+    
+    if pending:
+        if Image is None:
+            result.error = "Pillow is not installed (pip install pillow)"
+            return result
+        try:
+            with Image.open(src) as img:
+                img.load()
+                if img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+                for variant_path, width, fmt in pending:
+                    height = max(1, round(result.height * width / result.width))
+                    resized = img if width == result.width else img.resize((width, height), Image.LANCZOS)
+                    write_atomic(variant_path, lambda tmp_path: resized.save(tmp_path, format=fmt.upper(),
+                                                                             quality=quality))
+        except Exception as e:
+            result.error = str(e)
+            return result
+    else:
+        result.cached = True
+    
+    if not record:
+        record = json.dumps({'width': result.width, 'height': result.height})
+        write_atomic(record_path, lambda tmp_path: tmp_path.write_text(record))
+    
+    result.srcset = {fmt: build_srcset(result.variants, fmt) for fmt in formats}
+    return result
+
+def supported_formats(formats: list[str]) -> tuple[list[str], list[str]]:
+    """Split requested formats into those the local Pillow build can encode and the rest."""
+    if features is None:
+        return formats, []
+    supported = [f for f in formats if features.check(f)]
+    return supported, [f for f in formats if f not in supported]
+
+def generate_variants(project_path: str, widths: list[int] = DEFAULT_WIDTHS,
+                      formats: list[str] = DEFAULT_FORMATS, quality: int = 60,
+                      out_dir: str = DEFAULT_OUT_DIR, jobs: int | None = None) -> dict:
+    """Encode variants for every raster image in the project and write the manifest."""
+    path = Path(project_path).resolve()
+    out = (path / out_dir).resolve()
+    out.mkdir(parents=True, exist_ok=True)
+    
+    formats, unsupported = supported_formats(formats)
+    for fmt in unsupported:
+        print(f"Warning: local Pillow build cannot encode {fmt}, skipping", file=sys.stderr)
+    
+    images = find_raster_images(path, out)
+    
+    # Copies of one image (same content and file stem) map to the same variant
+    # files, so each is encoded once and the result is shared
+    results: list[ImageVariantSet] = []
+    groups: dict[tuple[str, str], list[Path]] = {}
+    for img in images:
+        try:
+            digest = content_hash(img)
+        except OSError as e:
+            results.append(ImageVariantSet(original=img.relative_to(path).as_posix(), content_hash='',
+                                           width=0, height=0, error=str(e)))
+            continue
+        groups.setdefault((digest, variant_stem(img)), []).append(img)
+    
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            (pool.submit(encode_image, str(copies[0]), str(path), str(out), widths, formats, quality, digest), copies)
+            for (digest, _), copies in groups.items()
+        ]
+        for future, copies in futures:
+            result = future.result()
+            results.append(result)
+            for copy in copies[1:]:
+                results.append(replace(result, original=copy.relative_to(path).as_posix(),
+                                       cached=result.cached or not result.error))
+    results.sort(key=lambda r: r.original)
+    
+    manifest = {
+        r.original: {
+            'hash': r.content_hash,
+            'width': r.width,
+            'height': r.height,
+            'variants': [asdict(v) for v in r.variants],
+            'srcset': r.srcset,
+        }
+        for r in results if not r.error
+    }
+    manifest_path = out / 'manifest.json'
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    
+    return {
+        'project_path': str(path),
+        'out_dir': str(out.relative_to(path)),
+        'manifest': str(manifest_path.relative_to(path)),
+        'errors': [{'file': r.original, 'error': r.error} for r in results if r.error],
+        'summary': {
+            'images': len(results),
+            'cached': len([r for r in results if r.cached]),
+            'encoded': len([r for r in results if not r.cached and not r.error]),
+            'failed': len([r for r in results if r.error]),
+            'variants': sum(len(r.variants) for r in results if not r.error),
+            'formats': formats,
+            'widths': widths,
+        }
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate responsive AVIF/WebP image variants')
+    parser.add_argument('project_path', help='Path to Astro project')
+    parser.add_argument('--widths', default=','.join(str(w) for w in DEFAULT_WIDTHS),
+                        help='Comma-separated target widths (default: %(default)s)')
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                        help='Comma-separated output formats (default: %(default)s)')
+    parser.add_argument('--quality', type=int, default=60, help='Encoder quality (default: %(default)s)')
+    parser.add_argument('--out-dir', default=DEFAULT_OUT_DIR,
+                        help='Variant/cache directory relative to the project (default: %(default)s)')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    result = generate_variants(
+        args.project_path,
+        widths=[int(w) for w in args.widths.split(',') if w.strip()],
+        formats=[f.strip().lower() for f in args.formats.split(',') if f.strip()],
+        quality=args.quality,
+        out_dir=args.out_dir,
+        jobs=args.jobs,
+    )
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,20 @@ import sys
 from pathlib import Path
 from dataclasses import dataclass, asdict
 
+from apply_optimizations import backup_file
+from changed_files import IMPORT_PATTERN, path_aliases, resolve_import, import_graph, reachable
+from render_order import TAG_PATTERN, attribute, class_list
+from walker import find_files, walk
+
+PRELOAD_BLOCK_START = '<!-- astro-optimizer:preloads:start -->'
+PRELOAD_BLOCK_END = '<!-- astro-optimizer:preloads:end -->'
+MANAGED_BLOCK_PATTERN = re.compile(
+    r'^([ \t]*)' + re.escape(PRELOAD_BLOCK_START) + r'.*?' + re.escape(PRELOAD_BLOCK_END) + r'[ \t]*\n?',
+    re.DOTALL | re.MULTILINE,
+)
+# Selectors that suggest above-fold content
+CRITICAL_SELECTORS = ['hero', 'banner', 'header', 'masthead', 'jumbotron', 'above-fold', 'splash']
+
 @dataclass
 class PreloadDirective:
     href: str
@@ -20,6 +34,7 @@ class PreloadDirective:
     scope: str  # "layout" or "page"
     source_file: str
     reason: str
+    selector: str | None = None  # CSS rule the preload came from, for page-scope background images
 
 def extract_fonts_from_css(css_content: str, css_file_path: Path, project_path: Path) -> list[PreloadDirective]:
     """Extract font URLs from @font-face declarations."""
@@ -79,9 +94,6 @@ def extract_critical_images_from_css(css_content: str, css_file_path: Path, proj
     """Extract background images that might be critical (hero images, etc.)."""
     preloads = []
     
-    # Look for background images in selectors that suggest above-fold content
-    critical_selectors = ['hero', 'banner', 'header', 'masthead', 'jumbotron', 'above-fold', 'splash']
-    
     # Pattern to match selectors with background-image
     rule_pattern = r'([^{]+)\{([^}]*background(?:-image)?:\s*url\(["\']?([^"\')\s]+)["\']?\)[^}]*)\}'
     
@@ -89,7 +101,7 @@ def extract_critical_images_from_css(css_content: str, css_file_path: Path, proj
         selector = match.group(1).lower()
         url = match.group(3)
         
-        is_critical = any(pattern in selector for pattern in critical_selectors)
+        is_critical = any(pattern in selector for pattern in CRITICAL_SELECTORS)
         
         if is_critical and not url.startswith('data:'):
             # Normalize URL
@@ -107,7 +119,8 @@ def extract_critical_images_from_css(css_content: str, css_file_path: Path, proj
                 crossorigin=False,
                 scope='layout' if 'header' in selector else 'page',
                 source_file=str(css_file_path.relative_to(project_path)),
-                reason=f'Critical background image in CSS selector: {selector.strip()[:50]}'
+                reason=f'Critical background image in CSS selector: {selector.strip()[:50]}',
+                selector=selector.strip(),
             ))
     
     return preloads
@@ -135,6 +148,63 @@ def analyze_page_specific_resources(astro_file: Path, project_path: Path) -> lis
     
     return preloads
 
+def critical_names(selector: str) -> set[str]:
+    """Classes and ids in a selector that mark it as above-fold content."""
+    return {name for name in re.findall(r'[.#]([\w-]+)', selector)
+            if any(pattern in name for pattern in CRITICAL_SELECTORS)}
+
+def selector_pages(project_path: Path, selectors: list[str]) -> dict[str, list[str]]:
+    """
+    Per selector, the pages that render an element carrying one of its critical
+    classes or ids, either themselves or through components they import.
+    """
+    wanted = {selector: critical_names(selector) for selector in selectors}
+    names = set().union(*wanted.values())
+    users: dict[str, set[str]] = {}
+    for file in find_files(project_path / 'src', ['.astro'], project=project_path):
+        rel = file.relative_to(project_path).as_posix()
+        for match in TAG_PATTERN.finditer(file.read_text(errors='ignore')):
+            tag = match.group(0)
+            for name in names.intersection(class_list(tag) + [attribute(tag, 'id')]):
+                users.setdefault(name, set()).add(rel)
+    
+    importers = import_graph(project_path)
+    pages = {}
+    for selector, selector_names in wanted.items():
+        reached = reachable(set().union(*(users.get(name, set()) for name in selector_names)), importers)
+        pages[selector] = sorted(f for f in reached if f.startswith('src/pages/'))
+    return pages
+
+def preload_priority(preloads: list[PreloadDirective]) -> list[PreloadDirective]:
+    """Order preloads by fetch priority: fonts, then the LCP image, then the rest."""
+    lcp_href = next((p.href for p in preloads if p.as_type == 'image'), None)
+    
+    def rank(p: PreloadDirective) -> int:
+        if p.as_type == 'font':
+            return 0
+        if p.href == lcp_href:
+            return 1
+        return 2
+    
+    # sorted() is stable, so source order is kept within each rank
+    return sorted(preloads, key=rank)
+
+def render_preload_tag(p: PreloadDirective) -> str:
+    """Render a single <link rel="preload"> tag."""
+    attrs = [
+        f'rel="preload"',
+        f'href="{p.href}"',
+        f'as="{p.as_type}"',
+    ]
+    
+    if p.type_attr:
+        attrs.append(f'type="{p.type_attr}"')
+    
+    if p.crossorigin:
+        attrs.append('crossorigin')
+    
+    return f'<link {" ".join(attrs)}>'
+
 def generate_preload_html(preloads: list[PreloadDirective]) -> dict[str, str]:
     """Generate HTML preload tags grouped by scope."""
     layout_preloads = []
@@ -142,24 +212,12 @@ def generate_preload_html(preloads: list[PreloadDirective]) -> dict[str, str]:
     
     seen = set()
     
-    for p in preloads:
+    for p in preload_priority(preloads):
         if p.href in seen:
             continue
         seen.add(p.href)
         
-        attrs = [
-            f'rel="preload"',
-            f'href="{p.href}"',
-            f'as="{p.as_type}"',
-        ]
-        
-        if p.type_attr:
-            attrs.append(f'type="{p.type_attr}"')
-        
-        if p.crossorigin:
-            attrs.append('crossorigin')
-        
-        tag = f'<link {" ".join(attrs)}>'
+        tag = render_preload_tag(p)
         
         if p.scope == 'layout':
             layout_preloads.append(tag)
@@ -171,7 +229,134 @@ def generate_preload_html(preloads: list[PreloadDirective]) -> dict[str, str]:
         'page': '\n'.join(page_preloads),
     }
 
-def analyze_project(project_path: str) -> dict:
+def strip_managed_block(content: str) -> str:
+    """Return content with the managed preload block removed."""
+    return MANAGED_BLOCK_PATTERN.sub('', content)
+
+def existing_preload_hrefs(content: str) -> set[str]:
+    """Collect hrefs of preload links written by hand (outside the managed block)."""
+    hrefs = set()
+    for match in re.finditer(r'<link\b[^>]*>', strip_managed_block(content), re.IGNORECASE | re.DOTALL):
+        tag = match.group()
+        if not re.search(r'rel=["\']preload["\']', tag, re.IGNORECASE):
+            continue
+        href = re.search(r'href=["\']([^"\']+)["\']', tag)
+        if href:
+            hrefs.add(href.group(1))
+    return hrefs
+
+def imported_preload_hrefs(file_path: Path, project_path: Path) -> set[str]:
+    """Hand-written preload hrefs in the .astro components a file imports, transitively (e.g. Meta.astro)."""
+    aliases = path_aliases(project_path)
+    hrefs = set()
+    seen = {file_path}
+    queue = [file_path]
+    while queue:
+        importer = queue.pop()
+        for match in IMPORT_PATTERN.finditer(importer.read_text(errors='ignore')):
+            target = resolve_import(match.group(1), importer, aliases)
+            if target and target.suffix == '.astro' and target not in seen and target.is_file():
+                seen.add(target)
+                queue.append(target)
+                hrefs |= existing_preload_hrefs(target.read_text(errors='ignore'))
+    return hrefs
+
+def inject_preload_block(content: str, preloads: list[PreloadDirective],
+                         present: set[str] = frozenset()) -> str | None:
+    """
+    Insert or replace the managed preload block in a file's <head>.
+    
+    An existing block is replaced in place, wherever it lives, so it can be moved
+    (e.g. into Meta.astro) by hand. Otherwise the block is inserted right before
+    </head>. Preloads already written by hand, in the file or in `present`, are
+    left out. Returns None when the file has neither markers nor a <head>.
+    """
+    present = existing_preload_hrefs(content) | present
+    tags = []
+    seen = set()
+    for p in preload_priority(preloads):
+        if p.href in seen or p.href in present:
+            continue
+        seen.add(p.href)
+        tags.append(render_preload_tag(p))
+    
+    existing = MANAGED_BLOCK_PATTERN.search(content)
+    if not existing and not tags:
+        return content
+    if existing:
+        indent = existing.group(1)
+        start, end = existing.start(), existing.end()
+    else:
+        head_close = re.search(r'^([ \t]*)</head>', content, re.IGNORECASE | re.MULTILINE)
+        if not head_close:
+            return None
+        indent = head_close.group(1) + '  '
+        start = end = head_close.start()
+    
+    lines = [PRELOAD_BLOCK_START, *tags, PRELOAD_BLOCK_END]
+    block = '\n'.join(indent + line for line in lines) + '\n'
+    return content[:start] + block + content[end:]
+
+def find_head_layouts(src_path: Path) -> list[Path]:
+    """Find the files that should hold layout-level preloads."""
+    pages_dir = src_path / 'pages'
+    # Blocks in pages are page-level blocks, never the layout's
+    candidates = [f for f in find_files(src_path, ['.astro'], project=src_path.parent) if pages_dir not in f.parents]
+    
+    # A block that was already placed (possibly moved by hand) wins
+    with_block = [f for f in candidates if PRELOAD_BLOCK_START in f.read_text(errors='ignore')]
+    if with_block:
+        return with_block
+    
+    layouts_dir = src_path / 'layouts'
+    return [
+        f for f in candidates
+        if layouts_dir in f.parents and re.search(r'</head>', f.read_text(errors='ignore'), re.IGNORECASE)
+    ]
+
+def write_preload_block(file_path: Path, preloads: list[PreloadDirective], backup_dir: Path,
+                        project_path: Path) -> str:
+    """Write the managed block into one file. Returns 'updated', 'unchanged' or 'no-head'."""
+    content = file_path.read_text(errors='ignore')
+    updated = inject_preload_block(content, preloads, imported_preload_hrefs(file_path, project_path))
+    if updated is None:
+        return 'no-head'
+    if updated == content:
+        return 'unchanged'
+    backup_file(file_path, backup_dir)
+    file_path.write_text(updated)
+    return 'updated'
+
+def apply_preloads(project_path: Path, preloads: list[PreloadDirective],
+                   page_specific: dict[str, list[PreloadDirective]],
+                   unplaced: list[PreloadDirective] = ()) -> dict:
+    """
+    Inject layout and page preloads between managed markers. `unplaced` are
+    page-scope preloads no page could be found for; they are reported as skipped.
+    """
+    src_path = project_path / 'src'
+    backup_dir = project_path / '.astro-optimizer-backups'
+    result = {'files': {}, 'skipped': []}
+    
+    layout_preloads = [p for p in preloads if p.scope == 'layout']
+    for layout in find_head_layouts(src_path):
+        rel = str(layout.relative_to(project_path))
+        result['files'][rel] = write_preload_block(layout, layout_preloads, backup_dir, project_path)
+    
+    for page, page_preloads in page_specific.items():
+        status = write_preload_block(project_path / page, page_preloads, backup_dir, project_path)
+        if status == 'no-head':
+            # Pages that render through a layout have no <head> of their own
+            result['skipped'].append({'file': page, 'reason': 'No <head> or preload markers in page'})
+        else:
+            result['files'][page] = status
+    for p in unplaced:
+        result['skipped'].append({'file': p.source_file, 'href': p.href,
+                                  'reason': f'No page renders an element matching {p.selector}'})
+    
+    return result
+
+def analyze_project(project_path: str, apply: bool = False) -> dict:
     """Analyze project and generate preload recommendations."""
     path = Path(project_path).resolve()
     src_path = path / 'src'
@@ -179,7 +364,8 @@ def analyze_project(project_path: str) -> dict:
     all_preloads = []
     
     # Analyze CSS files for fonts and critical images
-    css_files = list(src_path.rglob("*.css")) + list(src_path.rglob("*.scss"))
+    styles = walk(src_path, ['.css', '.scss'], project=path)
+    css_files = styles.get('.css', []) + styles.get('.scss', [])
     
     for css_file in css_files:
         try:
@@ -190,23 +376,33 @@ def analyze_project(project_path: str) -> dict:
             print(f"Warning: Could not process {css_file}: {e}", file=sys.stderr)
     
     # Analyze pages for page-specific resources
-    page_files = list((src_path / 'pages').rglob("*.astro")) if (src_path / 'pages').exists() else []
+    page_files = find_files(src_path / 'pages', ['.astro'], project=path)
     
     page_specific = {}
     for page_file in page_files:
         try:
             page_preloads = analyze_page_specific_resources(page_file, path)
             if page_preloads:
-                page_specific[str(page_file.relative_to(path))] = [asdict(p) for p in page_preloads]
+                page_specific[str(page_file.relative_to(path))] = page_preloads
         except Exception as e:
             print(f"Warning: Could not process {page_file}: {e}", file=sys.stderr)
     
+    # Background images from CSS go to the pages that render their selector
+    css_page_preloads = [p for p in all_preloads if p.scope == 'page']
+    pages_by_selector = selector_pages(path, sorted({p.selector for p in css_page_preloads}))
+    unplaced = []
+    for p in css_page_preloads:
+        for page in pages_by_selector[p.selector]:
+            page_specific.setdefault(page, []).append(p)
+        if not pages_by_selector[p.selector]:
+            unplaced.append(p)
+    
     # Generate HTML
     html = generate_preload_html(all_preloads)
     
-    return {
+    result = {
         'preloads': [asdict(p) for p in all_preloads],
-        'page_specific': page_specific,
+        'page_specific': {page: [asdict(p) for p in ps] for page, ps in page_specific.items()},
         'generated_html': html,
         'summary': {
             'total_preloads': len(all_preloads),
@@ -216,19 +412,28 @@ def analyze_project(project_path: str) -> dict:
             'images': len([p for p in all_preloads if p.as_type == 'image']),
         }
     }
+    
+    if apply:
+        result['applied'] = apply_preloads(path, all_preloads, page_specific, unplaced)
+    
+    return result
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: generate_preloads.py <project-path>", file=sys.stderr)
-        sys.exit(1)
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate preload directives for an Astro project')
+    parser.add_argument('project_path', help='Path to Astro project')
+    parser.add_argument('--apply', action='store_true',
+                        help='Write preloads into layout/page <head> between managed markers')
     
-    project_path = sys.argv[1]
+    args = parser.parse_args()
+    project_path = args.project_path
     
     if not Path(project_path).exists():
         print(f"Error: Path does not exist: {project_path}", file=sys.stderr)
         sys.exit(1)
     
-    result = analyze_project(project_path)
+    result = analyze_project(project_path, apply=args.apply)
     print(json.dumps(result, indent=2))
 
 if __name__ == "__main__":
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Language server that shows analyze.py and detect_js_patterns.py findings as
+editor diagnostics. Speaks LSP over stdio (JSON-RPC with Content-Length
+framing) using only the standard library.
+
+The project model stays in memory. Rules are loaded once. Findings that need
+the whole tree (project rules, rules with a finish step) and render_order's
+image loading plan come from a full run at startup, and are refreshed in a
+background thread after saves and file-system changes. Open documents are
+analyzed from their unsaved text after every change: only the rules for that
+one file run, on start tags re-tokenized around each edit rather than for the
+whole file. Safe rewrites from apply_optimizations.py are offered as code
+actions.
+"""
+
+import re
+import io
+import sys
+import json
+import time
+import queue
+import threading
+from pathlib import Path
+from bisect import bisect_right
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+from analyze import find_astro_root
+from rules import SourceFile, project_rules, is_project_rule, run_rules, check_file, parse_tags, retokenize
+from detect_js_patterns import analyze_content, SCANNED_EXTENSIONS
+from apply_optimizations import rewrite_content
+from render_order import loading_plan
+from report_formats import rule_id, finding_message
+
+SERVER_NAME = 'astro-optimizer'
+ANALYSIS_BUDGET_MS = 20  # Logged with --verbose when a single-file analysis exceeds it
+
+# LSP constants
+SEVERITIES = {'high': 2, 'medium': 3, 'low': 4}  # Warning, Information, Hint: these are hints, not errors
+SYNC_INCREMENTAL = 2
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+SERVER_NOT_INITIALIZED = -32002
+FIX_ALL_KIND = 'source.fixAll.astroOptimizer'
+
+# ---------------------------------------------------------------------------
+# Transport
+# ---------------------------------------------------------------------------
+
+def read_message(stream: io.BufferedReader) -> dict | None:
+    """One JSON-RPC message, or None at end of input."""
+    length = None
+    while True:
+        header = stream.readline()
+        if not header:
+            return None
+        header = header.strip()
+        if not header:
+            break
+        name, _, value = header.decode('ascii', errors='ignore').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value.strip())
+    if length is None:
+        return None
+    return json.loads(stream.read(length))
+
+def write_message(stream: io.BufferedWriter, message: dict):
+    body = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    stream.write(b'Content-Length: %d\r\n\r\n' % len(body) + body)
+    stream.flush()
+
+# ---------------------------------------------------------------------------
+# Documents and positions
+# ---------------------------------------------------------------------------
+
+def uri_to_path(uri: str) -> Path:
+    return Path(url2pathname(urlsplit(uri).path))
+
+def utf16_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode('utf-16-le')) // 2
+
+class Document:
+    """An open editor document: its text, start tags kept current edit by edit, and line starts."""
+    
+    def __init__(self, uri: str, text: str, version: int):
+        self.uri = uri
+        self.path = uri_to_path(uri).resolve()
+        self.version = version
+        self.set_text(text)
+        self.tags = parse_tags(text)
+    
+    def set_text(self, text: str):
+        self.text = text
+        self.line_starts = [0] + [m.end() for m in re.finditer('\n', text)]
+    
+    def offset_at(self, position: dict) -> int:
+        """Character offset of an LSP position (UTF-16 columns)."""
+        line = position['line']
+        if line >= len(self.line_starts):
+            return len(self.text)
+        start = self.line_starts[line]
+        end = self.line_starts[line + 1] - 1 if line + 1 < len(self.line_starts) else len(self.text)
+        segment = self.text[start:end]
+        if segment.isascii():
+            return start + min(position['character'], len(segment))
+        units = 0
+        for i, char in enumerate(segment):
+            if units >= position['character']:
+                return start + i
+            units += 2 if ord(char) > 0xFFFF else 1
+        return end
+    
+    def position_at(self, offset: int) -> dict:
+        line = bisect_right(self.line_starts, offset) - 1
+        return {'line': line, 'character': utf16_length(self.text[self.line_starts[line]:offset])}
+    
+    def apply_change(self, change: dict):
+        """Apply one contentChanges entry; ranged edits re-tokenize only around the edit."""
+        if 'range' not in change:
+            self.set_text(change['text'])
+            self.tags = parse_tags(self.text)
+            return
+        start = self.offset_at(change['range']['start'])
+        old_end = self.offset_at(change['range']['end'])
+        inserted = change['text']
+        line_delta = inserted.count('\n') - self.text.count('\n', start, old_end)
+        self.set_text(self.text[:start] + inserted + self.text[old_end:])
+        self.tags = retokenize(self.tags, self.text, start, old_end, start + len(inserted), line_delta)
+
+def line_range(lines: list[str], line: int | None) -> dict:
+    """The range of a finding's line without its indentation (the first line when it has none)."""
+    index = min(max((line or 1) - 1, 0), max(len(lines) - 1, 0))
+    text = lines[index] if lines else ''
+    indent = len(text) - len(text.lstrip())
+    return {'start': {'line': index, 'character': utf16_length(text[:indent])},
+            'end': {'line': index, 'character': utf16_length(text.rstrip())}}
+
+def to_diagnostic(finding: dict, lines: list[str]) -> dict:
+    message = finding_message(finding)
+    if finding.get('suggestion'):
+        message += f"\n{finding['suggestion']}"
+    return {
+        'range': line_range(lines, finding.get('line')),
+        'severity': SEVERITIES.get(finding.get('severity'), 3),
+        'source': SERVER_NAME,
+        'code': rule_id(finding),
+        'message': message,
+        'data': {'auto_fixable': bool(finding.get('auto_fixable'))},
+    }
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+def minimal_edit(doc: Document, new_text: str) -> dict:
+    """One TextEdit replacing only the span between the common prefix and suffix."""
+    old_text = doc.text
+    limit = min(len(old_text), len(new_text))
+    prefix = 0
+    while prefix < limit and old_text[prefix] == new_text[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_text[-1 - suffix] == new_text[-1 - suffix]:
+        suffix += 1
+    return {
+        'range': {'start': doc.position_at(prefix), 'end': doc.position_at(len(old_text) - suffix)},
+        'newText': new_text[prefix:len(new_text) - suffix],
+    }
+
+def kind_requested(kind: str, only: list[str] | None) -> bool:
+    return only is None or any(kind == wanted or kind.startswith(wanted + '.') for wanted in only)
+
+class Server:
+    """
+    Handles one client. Messages are read on a separate thread and handled in
+    order on the main one; document analysis waits until no message is
+    queued, so a burst of keystrokes is analyzed once.
+    """
+    
+    def __init__(self, stdout, verbose: bool = False):
+        self.stdout = stdout
+        self.verbose = verbose
+        self.inbox: queue.Queue = queue.Queue()
+        self.root: Path | None = None
+        self.file_rules = []
+        self.whole_project_rules = []
+        self.documents: dict[str, Document] = {}
+        self.pending: set[str] = set()  # Open documents changed since they were last analyzed
+        # From the last whole-tree run: project rule findings by file, and the
+        # image loading plan with the file text it was computed for
+        self.project_findings: dict[str, list[dict]] = {}
+        self.loading: dict[str, tuple[str, dict[int, str]]] = {}
+        self.refreshing = False
+        self.refresh_again = False
+        self.shutdown_requested = False
+        self.handlers = {
+            'initialize': self.initialize,
+            'initialized': lambda params: None,
+            'shutdown': self.shutdown,
+            'textDocument/didOpen': self.did_open,
+            'textDocument/didChange': self.did_change,
+            'textDocument/didSave': lambda params: self.refresh(),
+            'textDocument/didClose': self.did_close,
+            'textDocument/codeAction': self.code_action,
+            'workspace/didChangeWatchedFiles': lambda params: self.refresh(),
+        }
+    
+    def log(self, message: str):
+        if self.verbose:
+            print(f"[{SERVER_NAME}] {message}", file=sys.stderr)
+    
+    def send(self, message: dict):
+        write_message(self.stdout, {'jsonrpc': '2.0', **message})
+    
+    # -- main loop ---------------------------------------------------------
+    
+    def read_loop(self, stdin):
+        while True:
+            try:
+                message = read_message(stdin)
+            except ValueError as e:
+                print(f"Warning: unreadable message: {e}", file=sys.stderr)
+                continue
+            except OSError:
+                message = None
+            self.inbox.put(('message', message))
+            # Stop reading so interpreter shutdown does not wait on stdin
+            if message is None or message.get('method') == 'exit':
+                return
+    
+    def serve(self, stdin) -> int:
+        threading.Thread(target=self.read_loop, args=(stdin,)).start()
+        while True:
+            if self.pending:
+                try:
+                    event, payload = self.inbox.get_nowait()
+                except queue.Empty:
+                    self.flush()
+                    continue
+            else:
+                event, payload = self.inbox.get()
+            
+            if event == 'project':
+                self.project_loaded(payload)
+            elif payload is None or payload.get('method') == 'exit':
+                return 0 if self.shutdown_requested else 1
+            else:
+                self.dispatch(payload)
+    
+    def dispatch(self, message: dict):
+        method = message.get('method')
+        request_id = message.get('id')
+        if method is None:
+            return  # A response to a request we never send
+        handler = self.handlers.get(method)
+        if handler is None:
+            if request_id is not None:
+                self.send({'id': request_id, 'error': {'code': METHOD_NOT_FOUND, 'message': f"Unhandled method {method}"}})
+            return
+        if self.root is None and method != 'initialize':
+            if request_id is not None:
+                self.send({'id': request_id, 'error': {'code': SERVER_NOT_INITIALIZED, 'message': 'Not initialized'}})
+            return
+        try:
+            result = handler(message.get('params') or {})
+        except Exception as e:
+            print(f"Warning: {method} failed: {e}", file=sys.stderr)
+            if request_id is not None:
+                self.send({'id': request_id, 'error': {'code': INTERNAL_ERROR, 'message': str(e)}})
+            return
+        if request_id is not None:
+            self.send({'id': request_id, 'result': result})
+    
+    # -- lifecycle ---------------------------------------------------------
+    
+    def initialize(self, params: dict) -> dict:
+        folders = params.get('workspaceFolders') or []
+        root_uri = params.get('rootUri') or (folders[0]['uri'] if folders else None)
+        start = uri_to_path(root_uri) if root_uri else Path(params.get('rootPath') or '.')
+        self.root = find_astro_root(str(start)) or start.resolve()
+        rules = project_rules(self.root)
+        self.file_rules = [r for r in rules if not is_project_rule(r)]
+        self.whole_project_rules = [r for r in rules if is_project_rule(r)]
+        self.log(f"project {self.root}: {len(self.file_rules)} per-file rules, "
+                 f"{len(self.whole_project_rules)} project rules")
+        self.refresh()
+        return {
+            'capabilities': {
+                'textDocumentSync': {'openClose': True, 'change': SYNC_INCREMENTAL, 'save': {'includeText': False}},
+                'codeActionProvider': {'codeActionKinds': ['quickfix', FIX_ALL_KIND]},
+            },
+            'serverInfo': {'name': SERVER_NAME},
+        }
+    
+    def shutdown(self, params: dict):
+        self.shutdown_requested = True
+        return None
+    
+    # -- project model -----------------------------------------------------
+    
+    def refresh(self):
+        """Re-run the whole-tree analysis in the background; at most one run at a time."""
+        if self.refreshing:
+            self.refresh_again = True
+            return
+        self.refreshing = True
+        threading.Thread(target=lambda: self.inbox.put(('project', self.analyze_tree())), daemon=True).start()
+    
+    def analyze_tree(self) -> dict:
+        """Project rule findings and the loading plan, from the files on disk. Runs on a background thread."""
+        started = time.perf_counter()
+        findings: dict[str, list[dict]] = {}
+        for finding in run_rules(self.root, self.whole_project_rules):
+            finding = finding.to_dict()
+            findings.setdefault(finding['file'], []).append(finding)
+        loading = {}
+        try:
+            for rel, plan in loading_plan(self.root).items():
+                loading[rel] = ((self.root / rel).read_bytes().decode('utf-8', errors='ignore'), plan)
+        except Exception as e:
+            print(f"Warning: render order unavailable, image loading fixes are not offered: {e}", file=sys.stderr)
+        self.log(f"project analysis took {(time.perf_counter() - started) * 1000:.0f} ms")
+        return {'findings': findings, 'loading': loading}
+    
+    def project_loaded(self, results: dict):
+        self.project_findings = results['findings']
+        self.loading = results['loading']
+        self.pending.update(self.documents)
+        self.refreshing = False
+        if self.refresh_again:
+            self.refresh_again = False
+            self.refresh()
+    
+    # -- documents ---------------------------------------------------------
+    
+    def did_open(self, params: dict):
+        item = params['textDocument']
+        self.documents[item['uri']] = Document(item['uri'], item['text'], item.get('version', 0))
+        self.pending.add(item['uri'])
+    
+    def did_change(self, params: dict):
+        doc = self.documents.get(params['textDocument']['uri'])
+        if doc is None:
+            return
+        for change in params['contentChanges']:
+            doc.apply_change(change)
+        doc.version = params['textDocument'].get('version', doc.version)
+        self.pending.add(doc.uri)
+    
+    def did_close(self, params: dict):
+        uri = params['textDocument']['uri']
+        self.documents.pop(uri, None)
+        self.pending.discard(uri)
+        self.send({'method': 'textDocument/publishDiagnostics', 'params': {'uri': uri, 'diagnostics': []}})
+    
+    def flush(self):
+        for uri in sorted(self.pending):
+            self.publish(self.documents[uri])
+        self.pending.clear()
+    
+    def findings_for(self, doc: Document) -> list[dict]:
+        """Per-file rules and JS patterns on the document's text, plus project rule findings for its file."""
+        rel = self.rel(doc.path)
+        if rel is None:
+            return []
+        source = SourceFile.from_text(doc.path, self.root, doc.text, doc.tags)
+        findings = [f.to_dict() for f in check_file(source, self.file_rules)]
+        if source.suffix in SCANNED_EXTENSIONS and doc.path.is_relative_to(self.root / 'src'):
+            # One finding per pattern and file, like detect_js_patterns.py
+            patterns = set()
+            for finding in analyze_content(doc.text, source.suffix, rel):
+                if finding.pattern not in patterns:
+                    patterns.add(finding.pattern)
+                    findings.append(finding.to_dict())
+        findings.extend(self.project_findings.get(rel, ()))
+        return findings
+    
+    def publish(self, doc: Document):
+        started = time.perf_counter()
+        findings = self.findings_for(doc)
+        lines = doc.text.split('\n')
+        diagnostics = [to_diagnostic(finding, lines) for finding in findings]
+        elapsed = (time.perf_counter() - started) * 1000
+        self.send({'method': 'textDocument/publishDiagnostics',
+                   'params': {'uri': doc.uri, 'version': doc.version, 'diagnostics': diagnostics}})
+        if elapsed > ANALYSIS_BUDGET_MS:
+            self.log(f"{doc.path.name}: {len(diagnostics)} diagnostics in {elapsed:.1f} ms (over budget)")
+        else:
+            self.log(f"{doc.path.name}: {len(diagnostics)} diagnostics in {elapsed:.1f} ms")
+    
+    def rel(self, path: Path) -> str | None:
+        return str(path.relative_to(self.root)) if path.is_relative_to(self.root) else None
+    
+    # -- code actions ------------------------------------------------------
+    
+    def code_action(self, params: dict) -> list[dict]:
+        """The safe rewrites apply_optimizations.py would make, as one edit for the whole document."""
+        doc = self.documents.get(params['textDocument']['uri'])
+        if doc is None or self.rel(doc.path) is None:
+            return []
+        # The loading plan's offsets only hold for the text it was computed from
+        planned_text, loading = self.loading.get(self.rel(doc.path), (None, None))
+        new_text, changes = rewrite_content(doc.text, doc.path.suffix.lower(), False,
+                                            loading if planned_text == doc.text else None)
+        if new_text == doc.text:
+            return []
+        
+        edit = {'changes': {doc.uri: [minimal_edit(doc, new_text)]}}
+        title = changes[0] if len(changes) == 1 else f"{changes[0]} (and {len(changes) - 1} more safe fixes)"
+        context = params.get('context') or {}
+        only = context.get('only')
+        actions = []
+        fixable = [d for d in context.get('diagnostics', [])
+                   if d.get('source') == SERVER_NAME and (d.get('data') or {}).get('auto_fixable')]
+        if fixable and kind_requested('quickfix', only):
+            actions.append({'title': title, 'kind': 'quickfix', 'diagnostics': fixable,
+                            'isPreferred': True, 'edit': edit})
+        if kind_requested(FIX_ALL_KIND, only):
+            actions.append({'title': f"Apply all safe optimizations ({len(changes)})",
+                            'kind': FIX_ALL_KIND, 'edit': edit})
+        return actions
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Language server with astro-optimizer diagnostics and safe-fix code actions')
+    parser.add_argument('--stdio', action='store_true', help='Communicate over stdin/stdout (the default; accepted for editor clients)')
+    parser.add_argument('--verbose', action='store_true', help='Log analysis timings to stderr')
+    
+    args = parser.parse_args()
+    
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # stdout carries the protocol; anything a rule prints goes to stderr instead
+    sys.stdout = sys.stderr
+    sys.exit(Server(stdout, args.verbose).serve(stdin))
+
+if __name__ == "__main__":
+    main()
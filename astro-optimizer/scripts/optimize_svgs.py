@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Minifies the SVGs in dist/ and cuts the requests pages make for them.
+
+Every SVG is minified: metadata, comments, editor namespaces (Inkscape,
+Sodipodi, Sketch, Serif) and redundant numeric precision are removed. Pages
+then reference the icons in one of three ways:
+  - icons shown by <img> on SPRITE_MIN_PAGES or more routes are merged into
+    one cacheable sprite, and the <img> becomes <svg><use href="sprite#id">
+  - other icons up to INLINE_BYTES are inlined as data: URIs
+  - everything else keeps its own (minified) file
+
+Minified output is cached by content hash outside dist/, and files are
+minified in parallel. The report gives bytes saved and requests removed per
+route.
+"""
+
+import os
+import re
+import json
+import sys
+import html
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+
+from walker import find_files
+from dist_pages import find_dist, iter_pages, parse_page, resolve_local
+
+DEFAULT_CACHE_DIR = '.astro-optimizer-cache'
+INLINE_BYTES = 1024       # Icons up to this size (minified) are inlined as data: URIs
+SPRITE_MIN_PAGES = 2      # Icons on this many routes go into the shared sprite
+SPRITE_MIN_ICONS = 2      # A sprite of one icon saves no request
+SPRITE_MAX_BYTES = 16384  # Larger SVGs are illustrations, not icons
+
+EDITOR_PREFIXES = 'sodipodi|inkscape|sketch|serif'
+ROOT_ATTRS_DROPPED = {'xmlns', 'xmlns:xlink', 'width', 'height', 'version', 'x', 'y', 'id', 'viewbox'}
+IMG_ATTRS_KEPT = ('id', 'class', 'style', 'width', 'height')
+PRECISION_ATTRS = re.compile(
+    r'''(\s(?:d|points|transform|x|y|x1|y1|x2|y2|cx|cy|r|rx|ry|width|height|stroke-width|offset)=")([^"]*)(")'''
+)
+NUMBER_PATTERN = re.compile(r'-?\d*\.\d+(?:[eE][-+]?\d+)?')
+ATTR_PATTERN = re.compile(r'''([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?''')
+SPRITE_NAME = re.compile(r'sprite\.[0-9a-f]{8}\.svg')
+IMG_TAG_PATTERN = re.compile(r'''<img\b(?:[^>"']|"[^"]*"|'[^']*')*>''', re.IGNORECASE)
+
+@dataclass
+class SvgAsset:
+    file: str            # dist-relative
+    raw: int
+    minified: int
+    cached: bool
+    error: str | None = None
+
+# ---------------------------------------------------------------------------
+# Minification
+# ---------------------------------------------------------------------------
+
+def decimals_for(svg: str) -> int:
+    """Decimal places to keep: 3 for typical viewBoxes, more for tiny coordinate spaces."""
+    box = re.search(r'''\sviewBox=["']([^"']+)["']''', svg)
+    try:
+        size = max(abs(float(v)) for v in re.split(r'[\s,]+', box.group(1).strip())[2:4]) if box else 100
+    except ValueError:
+        size = 100
+    return 3 if size >= 10 else 4 if size >= 1 else 5
+
+def round_numbers(value: str, decimals: int) -> str:
+    def shorten(match):
+        text = match.group()
+        if 'e' not in text.lower() and len(text.split('.')[1]) <= decimals:
+            return text
+        rounded = f"{float(text):.{decimals}f}".rstrip('0').rstrip('.')
+        return '0' if rounded in ('-0', '') else rounded
+    # "0.5" -> ".5" is valid in every attribute this is applied to
+    return re.sub(r'(?<![\d.])(-?)0\.(?=\d)', r'\1.', NUMBER_PATTERN.sub(shorten, value))
+
+def minify_svg(svg: str) -> str:
+    """Minify SVG markup. Files with entities or scripts are returned unchanged."""
+    if '<!ENTITY' in svg or '<script' in svg.lower():
+        return svg
+    svg = re.sub(r'<\?xml[^>]*\?>|<!DOCTYPE[^>]*>|<!--.*?-->', '', svg, flags=re.DOTALL | re.IGNORECASE)
+    svg = re.sub(r'<metadata\b[^>]*/>|<metadata\b.*?</metadata\s*>', '', svg, flags=re.DOTALL | re.IGNORECASE)
+    svg = re.sub(rf'<(?:{EDITOR_PREFIXES}):[\w-]+\b[^>]*/>', '', svg)
+    svg = re.sub(rf'<((?:{EDITOR_PREFIXES}):[\w-]+)\b.*?</\1\s*>', '', svg, flags=re.DOTALL)
+    svg = re.sub(rf'''\s(?:xmlns:)?(?:{EDITOR_PREFIXES})(?::[\w-]+)?=(?:"[^"]*"|'[^']*')''', '', svg)
+    svg = re.sub(r'''\sversion=["']1\.[01]["']''', '', svg)
+    # Namespace declarations nothing uses any more (xlink, dc, cc, rdf once metadata is gone)
+    for prefix in set(re.findall(r'\sxmlns:([\w-]+)=', svg)):
+        if not re.search(rf'[<\s]{re.escape(prefix)}:', svg.replace(f'xmlns:{prefix}=', '')):
+            svg = re.sub(rf'''\sxmlns:{re.escape(prefix)}=(?:"[^"]*"|'[^']*')''', '', svg)
+    
+    decimals = decimals_for(svg)
+    svg = PRECISION_ATTRS.sub(lambda m: m.group(1) + round_numbers(m.group(2), decimals) + m.group(3), svg)
+    
+    # Collapse whitespace inside tags, and between tags unless the SVG has text content
+    svg = re.sub(r'<[^>]+>', lambda m: re.sub(r'\s+', ' ', m.group()).replace(' />', '/>').replace(' >', '>'), svg)
+    if not re.search(r'<(?:text|tspan|textPath|style)\b', svg):
+        svg = re.sub(r'>\s+<', '><', svg)
+    return svg.strip()
+
+def replace_text(path: Path, text: str):
+    """Write through a temp file and rename, so a page or sprite is never half-written."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+def cache_blob(data: bytes, cache: Path) -> Path:
+    return cache / f"{hashlib.sha256(data).hexdigest()[:32]}.svg"
+
+def minified_text(file: Path, cache: Path) -> str:
+    """Minified markup of a dist SVG: the cache entry in report mode, the file itself once written."""
+    blob = cache_blob(file.read_bytes(), cache)
+    return (blob if blob.exists() else file).read_text(errors='ignore')
+
+def minify_file(file_path: str, dist_path: str, cache_path: str, write: bool) -> SvgAsset:
+    """Minify one SVG (through the cache). Runs inside a worker process."""
+    src = Path(file_path)
+    data = src.read_bytes()
+    rel = src.relative_to(dist_path).as_posix()
+    blob = cache_blob(data, Path(cache_path))
+    cached = blob.exists()
+    try:
+        if not cached:
+            minified = minify_svg(data.decode('utf-8')).encode()
+            # Temp file + rename so an interrupted run never leaves a truncated cache entry
+            tmp = blob.with_name(f"{blob.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(minified if len(minified) < len(data) else data)
+            os.replace(tmp, blob)
+        result = blob.read_bytes()
+    except (UnicodeDecodeError, OSError) as e:
+        return SvgAsset(file=rel, raw=len(data), minified=len(data), cached=False, error=str(e))
+    
+    if write and result != data:
+        tmp = src.with_name(f".{src.name}.tmp")
+        tmp.write_bytes(result)
+        os.replace(tmp, src)
+    return SvgAsset(file=rel, raw=len(data), minified=len(result), cached=cached)
+
+# ---------------------------------------------------------------------------
+# Inlining and sprites
+# ---------------------------------------------------------------------------
+
+def data_uri(svg: str) -> str:
+    """A compact data: URI that is safe inside a double-quoted HTML attribute."""
+    if "'" in svg:
+        svg = svg.replace('"', '%22')
+    else:
+        svg = svg.replace('"', "'")
+    return 'data:image/svg+xml,' + re.sub(r'[\r\n%#{}<>&]', lambda m: f"%{ord(m.group()):02X}", svg)
+
+def parse_attrs(tag: str) -> dict[str, str]:
+    attrs = {}
+    for match in ATTR_PATTERN.finditer(re.sub(r'^<\w+|/?>$', '', tag)):
+        value = next((g for g in match.groups()[1:] if g is not None), '')
+        attrs[match.group(1).lower()] = value
+    return attrs
+
+def symbol_for(svg: str, symbol_id: str) -> tuple[str, str | None, tuple[str, str] | None]:
+    """
+    Turn a minified SVG into a <symbol>. Internal ids are prefixed with the
+    symbol id, since icons exported from one tool often reuse the same ids.
+    Returns (symbol markup, viewBox, (width, height) of the root element or None).
+    """
+    root = re.search(r'<svg\b[^>]*>', svg)
+    end = svg.rfind('</svg')
+    if not root or end == -1:
+        raise ValueError("not an <svg> document")
+    attrs = parse_attrs(root.group())
+    view_box = attrs.get('viewbox')
+    if not view_box and attrs.get('width') and attrs.get('height'):
+        view_box = f"0 0 {attrs['width']} {attrs['height']}".replace('px', '')
+    inner = svg[root.end():end]
+    
+    ids = set(re.findall(r'''\sid=["']([^"']+)["']''', inner))
+    for old in sorted(ids, key=len, reverse=True):
+        new = f"{symbol_id}-{old}"
+        inner = re.sub(rf'''(\sid=["']){re.escape(old)}(["'])''', rf'\g<1>{new}\g<2>', inner)
+        inner = re.sub(rf'''url\(\s*(["']?)#{re.escape(old)}\1\s*\)''', f"url(#{new})", inner)
+        inner = re.sub(rf'''((?:xlink:)?href=["'])#{re.escape(old)}(["'])''', rf'\g<1>#{new}\g<2>', inner)
+    
+    kept = ''.join(
+        f' {name}="{value}"' for name, value in re.findall(r'''\s([\w:-]+)=["']([^"']*)["']''', root.group())
+        if name.lower() not in ROOT_ATTRS_DROPPED and not name.lower().startswith('xmlns')
+    )
+    box = f' viewBox="{view_box}"' if view_box else ''
+    size = (attrs['width'], attrs['height']) if attrs.get('width') and attrs.get('height') else None
+    return f'<symbol id="{symbol_id}"{box}{kept}>{inner}</symbol>', view_box, size
+
+def symbol_id(rel: str) -> str:
+    stem = re.sub(r'[^a-zA-Z0-9_-]+', '-', Path(rel).stem.split('.')[0]).strip('-') or 'icon'
+    return f"{stem}-{hashlib.sha256(rel.encode()).hexdigest()[:6]}"
+
+def build_sprite(dist: Path, cache: Path,
+                 files: list[str]) -> tuple[str, dict[str, tuple[str, str | None, tuple[str, str]]]]:
+    """Sprite markup and, per dist-relative file, (symbol id, viewBox, intrinsic size)."""
+    symbols = []
+    refs = {}
+    for rel in files:
+        sid = symbol_id(rel)
+        try:
+            markup, view_box, size = symbol_for(minified_text(dist / rel, cache), sid)
+        except ValueError:
+            continue
+        if size is None:
+            # An <img> of it sizes to the SVG's own width/height; an inline <svg>
+            # without them stretches to its container, so it keeps its file
+            continue
+        symbols.append(markup)
+        refs[rel] = (sid, view_box, size)
+    sprite = f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">{"".join(symbols)}</svg>'
+    return sprite, refs
+
+def attr_value(raw: str) -> str:
+    """A raw attribute value (entities as written) re-escaped for a double-quoted attribute."""
+    return html.escape(html.unescape(raw), quote=True)
+
+def sprite_reference(attrs: dict[str, str], href: str, view_box: str | None, size: tuple[str, str]) -> str:
+    """
+    The inline <svg><use> that replaces an <img> of a sprited icon. An <img>
+    without width or height took the SVG's intrinsic size, so the <svg> gets it.
+    """
+    kept = {name: attrs[name] for name in IMG_ATTRS_KEPT if name in attrs}
+    if 'width' not in kept and 'height' not in kept:
+        kept['width'], kept['height'] = size
+    out = ''.join(f' {name}="{attr_value(value)}"' for name, value in kept.items())
+    if view_box:
+        out += f' viewBox="{attr_value(view_box)}"'
+    if attrs.get('alt'):
+        out += f' role="img" aria-label="{attr_value(attrs["alt"])}"'
+    else:
+        out += ' aria-hidden="true"'
+    return f'<svg{out}><use href="{href}"></use></svg>'
+
+# ---------------------------------------------------------------------------
+# Pages
+# ---------------------------------------------------------------------------
+
+def page_svgs(html_file: Path, route: str, dist: Path) -> list[str]:
+    """dist-relative SVG files a page shows through <img>, in document order."""
+    files = []
+    for tag in parse_page(html_file, dist).tags:
+        if tag.tag != 'img':
+            continue
+        file = resolve_local(tag.attrs.get('src') or '', dist, route)
+        if file and file.suffix.lower() == '.svg':
+            files.append(file.relative_to(dist).as_posix())
+    return files
+
+def plan_references(dist: Path, pages: dict[str, list[str]], sizes: dict[str, int]) -> dict[str, str]:
+    """dist-relative SVG -> "sprite", "inline" or "file"."""
+    routes_using: dict[str, set[str]] = {}
+    for route, files in pages.items():
+        for rel in files:
+            routes_using.setdefault(rel, set()).add(route)
+    plan = {}
+    for rel, routes in routes_using.items():
+        size = sizes.get(rel, 0)
+        if len(routes) >= SPRITE_MIN_PAGES and size <= SPRITE_MAX_BYTES:
+            plan[rel] = 'sprite'
+        elif size <= INLINE_BYTES:
+            plan[rel] = 'inline'
+        else:
+            plan[rel] = 'file'
+    return plan
+
+def rewrite_page(html: str, route: str, dist: Path, plan: dict[str, str], inline: dict[str, str],
+                 sprite_href: str | None, symbols: dict[str, tuple[str, str | None, tuple[str, str]]]) -> str:
+    def rewrite(match):
+        attrs = parse_attrs(match.group())
+        file = resolve_local(attrs.get('src') or '', dist, route)
+        rel = file.relative_to(dist).as_posix() if file and file.suffix.lower() == '.svg' else None
+        kind = plan.get(rel)
+        if kind == 'sprite' and sprite_href:
+            sid, view_box, size = symbols[rel]
+            return sprite_reference(attrs, f"{sprite_href}#{sid}", view_box, size)
+        if kind == 'inline':
+            return re.sub(r'''(\ssrc\s*=\s*)(?:"[^"]*"|'[^']*'|[^\s>]+)''',
+                          lambda m: f'{m.group(1)}"{inline[rel]}"', match.group(), count=1)
+        return match.group()
+    return IMG_TAG_PATTERN.sub(rewrite, html)
+
+def optimize_project(project_path: str, write: bool = False, jobs: int | None = None,
+                     cache_dir: str = DEFAULT_CACHE_DIR) -> dict:
+    """Minify every SVG in dist/ and report (or apply) inlining and sprite references."""
+    path = Path(project_path).resolve()
+    dist = find_dist(path)
+    if not dist:
+        return {'error': f"No build output found at {path / 'dist'}. Run `astro build` first."}
+    
+    cache = path / cache_dir / 'svg'
+    cache.mkdir(parents=True, exist_ok=True)
+    
+    # Earlier sprites are rebuilt, not minified or counted as page assets
+    svgs = [f for f in find_files(dist, ['.svg'], gitignore=False) if not SPRITE_NAME.fullmatch(f.name)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(minify_file, str(f), str(dist), str(cache), write) for f in svgs]
+        assets = [f.result() for f in futures]
+    by_file = {a.file: a for a in assets}
+    sizes = {a.file: a.minified for a in assets}
+    
+    pages = {route: (html_file, page_svgs(html_file, route, dist)) for route, html_file in iter_pages(dist)}
+    plan = plan_references(dist, {r: files for r, (_, files) in pages.items()}, sizes)
+    
+    sprite_files = sorted(rel for rel, kind in plan.items() if kind == 'sprite')
+    sprite, symbols = build_sprite(dist, cache, sprite_files) if len(sprite_files) >= SPRITE_MIN_ICONS else ('', {})
+    inline = {
+        rel: data_uri(minified_text(dist / rel, cache))
+        for rel, kind in plan.items() if kind == 'inline' and rel in by_file and not by_file[rel].error
+    }
+    # Whatever could not be sprited or inlined keeps its own request
+    for rel, kind in plan.items():
+        if (kind == 'sprite' and rel not in symbols) or (kind == 'inline' and rel not in inline):
+            plan[rel] = 'file'
+    
+    sprite_rel = sprite_href = None
+    if symbols:
+        digest = hashlib.sha256(sprite.encode()).hexdigest()[:8]
+        sprite_dir = '_astro/' if (dist / '_astro').is_dir() else ''
+        sprite_rel = f"{sprite_dir}sprite.{digest}.svg"
+        sprite_href = '/' + sprite_rel
+        # Written before any page references it
+        if write:
+            replace_text(dist / sprite_rel, sprite)
+    
+    routes = []
+    rewritten = []
+    for route, (html_file, files) in pages.items():
+        distinct = sorted(set(files))
+        own_requests = [f for f in distinct if plan.get(f) == 'file']
+        uses_sprite = any(plan.get(f) == 'sprite' for f in distinct)
+        before_bytes = sum(by_file[f].raw for f in distinct if f in by_file)
+        after_bytes = sum(sizes.get(f, 0) for f in own_requests) + (len(sprite.encode()) if uses_sprite else 0)
+        if files:
+            html = html_file.read_text(errors='ignore')
+            updated = rewrite_page(html, route, dist, plan, inline, sprite_href, symbols)
+            # Inlined data: URIs and <svg><use> markup are paid for in the HTML
+            after_bytes += len(updated.encode()) - len(html.encode())
+            if write and updated != html:
+                replace_text(html_file, updated)
+                rewritten.append(html_file.relative_to(dist).as_posix())
+        after_requests = len(own_requests) + (1 if uses_sprite else 0)
+        routes.append({
+            'route': route,
+            'svgs': len(distinct),
+            'requests_before': len(distinct),
+            'requests_after': after_requests,
+            'requests_removed': len(distinct) - after_requests,
+            'bytes_before': before_bytes,
+            'bytes_after': after_bytes,
+            'bytes_saved': before_bytes - after_bytes,
+        })
+    
+    return {
+        'project_path': str(path),
+        'cache_dir': os.path.relpath(cache, path),
+        'assets': [asdict(a) for a in assets],
+        'references': {rel: plan[rel] for rel in sorted(plan)},
+        'sprite': {'file': sprite_rel, 'icons': len(symbols), 'bytes': len(sprite.encode())} if sprite_rel else None,
+        'routes': routes,
+        'rewritten': rewritten,
+        'summary': {
+            'svgs': len(assets),
+            'cached': len([a for a in assets if a.cached]),
+            'errors': len([a for a in assets if a.error]),
+            'raw_bytes': sum(a.raw for a in assets),
+            'minified_bytes': sum(a.minified for a in assets),
+            'inlined': len(inline),
+            'sprited': len(symbols),
+            'requests_removed': sum(r['requests_removed'] for r in routes),
+            'bytes_saved': sum(r['bytes_saved'] for r in routes),
+            'written': write,
+        }
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Minify built SVGs, inline small icons and sprite shared ones')
+    parser.add_argument('project_path', help='Path to Astro project (built with `astro build`)')
+    parser.add_argument('--write', action='store_true',
+                        help='Write minified SVGs and the sprite into dist/ and rewrite <img> references')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Minification cache relative to the project (default: %(default)s)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    result = optimize_project(args.project_path, args.write, args.jobs, args.cache_dir)
+    print(json.dumps(result, indent=2))
+    if 'error' in result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
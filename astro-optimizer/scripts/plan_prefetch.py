@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Plans per-link data-astro-prefetch strategies from the site's internal link graph.
+Ranks link targets by reach (how many pages link to them) and position (nav and
+header links outrank footer links), then assigns load/viewport/hover within a
+per-page bandwidth budget. Use --apply to write the attributes into src/.
+"""
+
+import re
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+
+from apply_optimizations import backup_file
+from walker import find_files
+from dist_pages import find_dist, iter_pages, parse_page, resolve_route
+from estimate_lcp import transfer_size
+
+# How likely a link in each landmark is to be followed
+POSITION_WEIGHTS = {'nav': 1.0, 'header': 0.9, 'main': 0.6, 'aside': 0.4, 'footer': 0.2}
+DEFAULT_POSITION_WEIGHT = 0.5
+
+LOAD_MIN_SCORE = 0.5
+VIEWPORT_MIN_SCORE = 0.15
+VIEWPORT_HIT_RATE = 0.5  # Share of viewport prefetches assumed to actually fire
+
+@dataclass
+class LinkTarget:
+    route: str
+    bytes: int
+    pages: set[str] = field(default_factory=set)
+    links: int = 0
+    position_total: float = 0.0
+    score: float = 0.0
+    strategy: str = 'hover'
+
+@dataclass
+class PrefetchLink:
+    page: str
+    href: str
+    target: str
+    landmark: str
+    strategy: str = 'hover'
+
+def position_weight(landmarks: tuple[str, ...], offset: int, page_size: int) -> tuple[str, float]:
+    """Weight a link by its innermost landmark, with a bonus for appearing early in the page."""
+    landmark = landmarks[-1] if landmarks else 'body'
+    weight = POSITION_WEIGHTS.get(landmark, DEFAULT_POSITION_WEIGHT)
+    earliness = 1 - 0.5 * (offset / page_size if page_size else 0)
+    return landmark, weight * earliness
+
+def build_link_graph(dist: Path) -> tuple[int, dict[str, LinkTarget], list[PrefetchLink], list[dict]]:
+    """
+    Build the internal link graph in one pass over every <a> in every page.
+    Returns (page count, targets by route, links, dangling links).
+    """
+    pages = 0
+    targets: dict[str, LinkTarget] = {}
+    links: list[PrefetchLink] = []
+    dangling: list[dict] = []
+    resolved: dict[tuple[str, str], str | None] = {}
+    
+    for route, html_file in iter_pages(dist):
+        pages += 1
+        page = parse_page(html_file, dist)
+        for tag in page.tags:
+            href = tag.attrs.get('href')
+            if tag.tag != 'a' or not href:
+                continue
+            key = (href, route if not href.startswith('/') else '/')
+            if key not in resolved:
+                resolved[key] = resolve_route(href, dist, route)
+            target_route = resolved[key]
+            if target_route is None:
+                if href.startswith('/'):
+                    dangling.append({'page': route, 'href': href})
+                continue
+            if target_route == route:
+                continue
+            
+            target = targets.get(target_route)
+            if target is None:
+                target = targets[target_route] = LinkTarget(
+                    route=target_route,
+                    bytes=transfer_size(html_for_route(dist, target_route)),
+                )
+            landmark, weight = position_weight(tag.landmarks, tag.offset, page.size)
+            target.pages.add(route)
+            target.links += 1
+            target.position_total += weight
+            links.append(PrefetchLink(page=route, href=href, target=target_route, landmark=landmark))
+    
+    return pages, targets, links, dangling
+
+def html_for_route(dist: Path, route: str) -> Path:
+    if route.endswith('/'):
+        return dist / route.lstrip('/') / 'index.html'
+    return dist / (route.lstrip('/') + '.html')
+
+def plan_strategies(page_count: int, targets: dict[str, LinkTarget], budget_bytes: int) -> list[LinkTarget]:
+    """
+    Assign a strategy to each target, best first, without letting any page's
+    eager prefetch bytes exceed the budget. Linear in total link count.
+    """
+    for target in targets.values():
+        reach = len(target.pages) / page_count if page_count else 0
+        target.score = round(reach * target.position_total / target.links, 3)
+    
+    ranked = sorted(targets.values(), key=lambda t: (-t.score, t.bytes, t.route))
+    spent: Counter = Counter()
+    for target in ranked:
+        if target.score >= LOAD_MIN_SCORE and all(spent[p] + target.bytes <= budget_bytes for p in target.pages):
+            target.strategy = 'load'
+            cost = target.bytes
+        elif target.score >= VIEWPORT_MIN_SCORE and all(
+                spent[p] + target.bytes * VIEWPORT_HIT_RATE <= budget_bytes for p in target.pages):
+            target.strategy = 'viewport'
+            cost = target.bytes * VIEWPORT_HIT_RATE
+        else:
+            target.strategy = 'hover'
+            continue
+        for p in target.pages:
+            spent[p] += cost
+    return ranked
+
+# ---------------------------------------------------------------------------
+# Apply
+# ---------------------------------------------------------------------------
+
+LINK_TAG_PATTERN = re.compile(r'<(a|Button)\b[^>]*?\bhref=(?:"([^"]*)"|\'([^\']*)\'|\{`([^`]*)`\})[^>]*>', re.DOTALL)
+
+def template_regex(template: str) -> re.Pattern:
+    """Turn `/services/${service.id}` into a route regex like ^/services/[^/]+/?$."""
+    parts = re.split(r'\$\{[^}]*\}', template)
+    body = '[^/]+'.join(re.escape(p) for p in parts)
+    return re.compile('^' + body.rstrip('/') + '/?$')
+
+def strategy_for_href(href: str, is_template: bool, dist: Path, strategies: dict[str, str]) -> str | None:
+    """The planned strategy for a source-level href, or None if it links nowhere we planned."""
+    if is_template:
+        regex = template_regex(href)
+        matched = [s for route, s in strategies.items() if regex.match(route)]
+        return Counter(matched).most_common(1)[0][0] if matched else None
+    route = resolve_route(href, dist)
+    return strategies.get(route) if route else None
+
+PREFETCH_ATTR_PATTERN = re.compile(r'\sdata-astro-prefetch(?:=("[^"]*"|\'[^\']*\'|\{[^}]*\}|[^\s>]+))?')
+
+def existing_prefetch(tag: str) -> str | None:
+    """The tag's own data-astro-prefetch value ("" when bare), or None if it has none."""
+    match = PREFETCH_ATTR_PATTERN.search(tag)
+    if not match:
+        return None
+    value = match.group(1) or ''
+    return value[1:-1] if value[:1] in ('"', "'") else value
+
+def set_prefetch_attr(tag: str, strategy: str) -> str:
+    attr = f' data-astro-prefetch="{strategy}"'
+    href = re.search(r'\bhref=(?:"[^"]*"|\'[^\']*\'|\{`[^`]*`\})', tag)
+    return tag[:href.end()] + attr + tag[href.end():]
+
+def enable_prefetch_config(project_path: Path, backup_dir: Path) -> str | None:
+    """Turn on Astro prefetch so data-astro-prefetch is honored. Returns the config changed."""
+    config_files = list(project_path.glob("astro.config.*"))
+    if not config_files:
+        return None
+    config = config_files[0]
+    content = config.read_text(errors='ignore')
+    if 'prefetch' in content:
+        return None
+    updated = re.sub(r'(defineConfig\(\{\n?)', r'\1  prefetch: true,\n', content, count=1)
+    if updated == content:
+        return None
+    backup_file(config, backup_dir)
+    config.write_text(updated)
+    return str(config.relative_to(project_path))
+
+def apply_plan(project_path: Path, dist: Path, ranked: list[LinkTarget]) -> dict:
+    """Write data-astro-prefetch attributes on <a>/<Button> links in src/."""
+    backup_dir = project_path / '.astro-optimizer-backups'
+    strategies = {t.route: t.strategy for t in ranked}
+    result = {'files_modified': [], 'skipped': [], 'config': None}
+    
+    for astro_file in find_files(project_path / 'src', ['.astro'], project=project_path):
+        content = astro_file.read_text(errors='ignore')
+        changes = []
+        skipped = []
+        
+        def rewrite(match):
+            static_href = match.group(2) if match.group(2) is not None else match.group(3)
+            href = static_href if static_href is not None else match.group(4)
+            strategy = strategy_for_href(href, static_href is None, dist, strategies)
+            if strategy is None:
+                return match.group(0)
+            # A value already in the source (including an opt-out with "false") was set by hand
+            current = existing_prefetch(match.group(0))
+            if current is not None:
+                if current != strategy:
+                    skipped.append({'href': href, 'value': current, 'planned': strategy})
+                return match.group(0)
+            tag = set_prefetch_attr(match.group(0), strategy)
+            if tag != match.group(0):
+                changes.append(f"{href}: data-astro-prefetch=\"{strategy}\"")
+            return tag
+        
+        updated = LINK_TAG_PATTERN.sub(rewrite, content)
+        rel = str(astro_file.relative_to(project_path))
+        result['skipped'].extend({'file': rel, **s} for s in skipped)
+        if updated != content:
+            backup_file(astro_file, backup_dir)
+            astro_file.write_text(updated)
+            result['files_modified'].append({
+                'file': rel,
+                'changes': changes,
+            })
+    
+    result['config'] = enable_prefetch_config(project_path, backup_dir)
+    return result
+
+def plan_project(project_path: str, budget_kb: float = 100, apply: bool = False) -> dict:
+    """Build the link graph for the built site and plan prefetch strategies."""
+    path = Path(project_path).resolve()
+    dist = find_dist(path)
+    if not dist:
+        return {'error': f"No build output found at {path / 'dist'}. Run `astro build` first."}
+    
+    page_count, targets, links, dangling = build_link_graph(dist)
+    ranked = plan_strategies(page_count, targets, int(budget_kb * 1024))
+    for link in links:
+        link.strategy = targets[link.target].strategy
+    
+    result = {
+        'project_path': str(path),
+        'budget_kb': budget_kb,
+        'targets': [
+            {
+                'route': t.route,
+                'score': t.score,
+                'reach': len(t.pages),
+                'links': t.links,
+                'bytes': t.bytes,
+                'strategy': t.strategy,
+            }
+            for t in ranked
+        ],
+        'links': [asdict(l) for l in links],
+        'dangling': dangling,
+        'summary': {
+            'pages': page_count,
+            'links': len(links),
+            'targets': len(ranked),
+            'by_strategy': dict(Counter(t.strategy for t in ranked)),
+            'dangling': len(dangling),
+        }
+    }
+    
+    if apply:
+        result['applied'] = apply_plan(path, dist, ranked)
+    
+    return result
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Plan data-astro-prefetch strategies from the link graph')
+    parser.add_argument('project_path', help='Path to Astro project (built with `astro build`)')
+    parser.add_argument('--budget-kb', type=float, default=100,
+                        help='Max eager prefetch bytes per page view, in KB (default: %(default)s)')
+    parser.add_argument('--apply', action='store_true',
+                        help='Write data-astro-prefetch attributes into src/ and enable prefetch in astro.config')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    result = plan_project(args.project_path, args.budget_kb, args.apply)
+    print(json.dumps(result, indent=2))
+    if 'error' in result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,703 @@
+#!/usr/bin/env python3
+"""
+Composed render order of images, per page, from the Astro sources.
+
+Each page in src/pages/ is expanded the way Astro renders it: the page's
+template, with every imported .astro component replaced by that component's
+template and each <slot /> filled with the children passed in. Layout markup
+before the slot (the header) comes first, then the page's sections, then
+whatever the layout renders after the slot (the footer).
+
+Images are placed into fold bands by counting top-level <section>, <article>
+and <footer> elements in that composed stream: band 0 is everything before
+the first one (header and navigation), band 1 is the first section, and so
+on. The LCP candidate is the largest visible image in bands 0-1; images past
+EAGER_BANDS are clearly below the fold.
+
+Framework components (.jsx/.tsx/.vue/.svelte imports, or any tag with a
+client:* directive) are recorded as islands at their place in the same
+stream, with the band and estimated top of the section they render in.
+"""
+
+import re
+import struct
+from pathlib import Path
+from functools import cached_property
+from dataclasses import dataclass
+
+from changed_files import path_aliases, resolve_import
+from walker import find_files
+
+IMAGE_TAGS = {'img', 'Image', 'Picture'}
+LANDMARK_TAGS = {'section', 'article', 'footer'}
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.svg'}
+ISLAND_EXTENSIONS = {'.jsx', '.tsx', '.vue', '.svelte'}
+
+LCP_BANDS = 1     # Header and the first section can hold the LCP element
+EAGER_BANDS = 2   # The next section may still be in the first viewport on large screens
+MAX_DEPTH = 12    # Component nesting limit (guards against cycles through props)
+VIEWPORT = (1366, 768)
+MIN_CANDIDATE_SIZE = 100  # Icons and decorations never win LCP
+
+# Start/end tags; attribute values may contain ">" inside quotes or {expressions} (nested up to 3 deep)
+TAG_PATTERN = re.compile(
+    r'''<(/?)([A-Za-z][\w.:-]*)((?:[^>"'{]|"[^"]*"|'[^']*'|\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\})*)>'''
+)
+FRONTMATTER_PATTERN = re.compile(r'\A\s*---\n(.*?)\n---', re.DOTALL)
+MASKED_BLOCK_PATTERN = re.compile(r'<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+DEFAULT_IMPORT_PATTERN = re.compile(r'''\bimport\s+(\w+)\s+from\s*["']([^"']+)["']''')
+FULL_BLEED_PATTERN = re.compile(r'\b(?:w-full|w-screen|inset-0|object-cover)\b|width:\s*100%')
+
+# Section height estimates (for contain-intrinsic-size), laid out as a phone-width single column
+MOBILE_VIEWPORT = (390, 844)
+CONTENT_WIDTH = 358       # Viewport minus typical container padding
+HEADER_HEIGHT = 80        # Markup before the first section
+FOLD_VIEWPORTS = 1.5      # Sections starting this far down are skipped until scrolled near
+LONG_PAGE_VIEWPORTS = 3   # Shorter pages gain little from skipping rendering
+LINE_HEIGHT = 24
+CHARS_PER_LINE = 40
+EXPRESSION_CHARS = 12     # Rendered length assumed for a {expression} in text
+MAP_REPEAT = 4            # Items assumed for .map() over data that is not a literal array
+IMAGE_HEIGHT = 200        # Images of unknown size
+BLOCK_HEIGHTS = {'h1': 48, 'h2': 40, 'h3': 32, 'h4': 28, 'h5': 24, 'h6': 24,
+                 'button': 48, 'input': 48, 'select': 48, 'textarea': 120, 'hr': 16}
+VOID_ELEMENTS = {'area', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+OUT_OF_FLOW_CLASSES = {'hidden', 'sr-only', 'absolute', 'fixed'}
+
+# Unprefixed (mobile) Tailwind utilities; one spacing unit is 4px
+SPACING_PATTERN = re.compile(r'^(p|py|pt|pb|m|my|mt|mb|gap|gap-y|space-y)-(\d+(?:\.5)?)$')
+HEIGHT_PATTERN = re.compile(r'^(min-h|h)-(?:\[(\d+)px\]|(\d+)|(screen))$')
+GRID_COLUMNS_PATTERN = re.compile(r'^grid-cols-(\d+)$')
+MAP_PATTERN = re.compile(r'(\w+)\s*\.map\s*\(')
+CLIENT_DIRECTIVE_PATTERN = re.compile(
+    r'''\sclient:(load|idle|visible|only|media)\b(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|\{((?:[^{}]|\{[^{}]*\})*)\}))?'''
+)
+
+# Paint containment clips overflow, and layout containment captures position: fixed
+CONTAINMENT_HAZARD_PATTERN = re.compile(
+    r'''(?:^|[\s"'`:])(?:fixed|-(?:top|bottom|left|right|inset|translate-[xy]|m[tbxylr]?)-[\w.\[\]-]+)(?=[\s"'`])'''
+    r'|position:\s*fixed|content-visibility'
+)
+
+@dataclass
+class ImageRef:
+    file: str      # Project-relative source file holding the tag
+    offset: int    # Tag start in that file
+    line: int
+    band: int      # Fold band (see module docstring)
+    area: int      # Estimated rendered area in px, 0 when unknown
+    visible: bool  # False for images hidden on small screens
+    tag: str
+
+@dataclass
+class PageImages:
+    page: str
+    images: list[ImageRef]
+    lcp: ImageRef | None
+
+@dataclass
+class SectionRef:
+    file: str      # Project-relative source file holding the element
+    offset: int    # Start tag offset in that file
+    line: int
+    tag: str
+    band: int
+    top: int       # Estimated distance from the top of the page, px
+    height: int    # Estimated height, px
+
+@dataclass
+class PageSections:
+    page: str
+    sections: list[SectionRef]
+    height: int
+
+@dataclass
+class DeferredSection:
+    """A top-level section that can get content-visibility: auto."""
+    file: str
+    offset: int
+    line: int
+    tag: str
+    height: int        # Estimated height for contain-intrinsic-size, px
+    pages: list[str]   # Long pages where it starts below the fold
+
+@dataclass
+class IslandRef:
+    file: str             # Project-relative source file holding the component tag
+    offset: int           # Tag start in that file
+    line: int
+    component: str        # Tag name, e.g. "Counter"
+    source: str | None    # Project-relative component file, None when unresolved
+    directive: str | None  # load, idle, visible, only or media; None renders static HTML
+    value: str | None     # Directive value, e.g. the media query or client:only framework
+    band: int
+    top: int              # Estimated top of the section it renders in, px
+
+@dataclass
+class PageIslands:
+    page: str
+    islands: list[IslandRef]
+
+def client_directive(tag: str) -> tuple[str | None, str | None]:
+    """The client:* directive on a component tag and its value."""
+    match = CLIENT_DIRECTIVE_PATTERN.search(tag)
+    if not match:
+        return None, None
+    return match.group(1), next((v for v in match.group(2, 3, 4) if v is not None), None)
+
+def attribute(tag: str, name: str) -> str | None:
+    """A static attribute value ("..." or {literal}) from a start tag."""
+    match = re.search(rf'''\s{name}\s*=\s*(?:"([^"]*)"|'([^']*)'|\{{([^{{}}]*)\}})''', tag)
+    if not match:
+        return None
+    value = next(g for g in match.groups() if g is not None)
+    return value.strip().strip('"\'')
+
+def image_size(path: Path) -> tuple[int, int] | None:
+    """Intrinsic (width, height) from the file header, for the common web formats."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(64 * 1024)
+    except OSError:
+        return None
+    if head.startswith(b'\x89PNG') and len(head) >= 24:
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        chunk = head[12:16]
+        if chunk == b'VP8X':
+            return 1 + int.from_bytes(head[24:27], 'little'), 1 + int.from_bytes(head[27:30], 'little')
+        if chunk == b'VP8L':
+            bits = int.from_bytes(head[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8 ':
+            w, h = struct.unpack('<HH', head[26:30])
+            return w & 0x3FFF, h & 0x3FFF
+    if head[:2] == b'\xff\xd8':
+        pos = 2
+        while pos + 9 < len(head):
+            if head[pos] != 0xFF:
+                pos += 1
+                continue
+            marker = head[pos + 1]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                h, w = struct.unpack('>HH', head[pos + 5:pos + 9])
+                return w, h
+            pos += 2 + struct.unpack('>H', head[pos + 2:pos + 4])[0]
+    if path.suffix.lower() == '.svg':
+        text = head.decode('utf-8', errors='ignore')
+        root = re.search(r'<svg\b[^>]*>', text)
+        if root:
+            w, h = attribute(root.group(), 'width'), attribute(root.group(), 'height')
+            if w and h and w.replace('.', '').isdigit() and h.replace('.', '').isdigit():
+                return int(float(w)), int(float(h))
+            box = attribute(root.group(), 'viewBox')
+            if box and len(box.split()) == 4:
+                return int(float(box.split()[2])), int(float(box.split()[3]))
+    return None
+
+def class_list(tag: str) -> list[str]:
+    """Static classes of a start tag, including the literal parts of class={`...`}."""
+    value = attribute(tag, 'class')
+    if value is None:
+        match = re.search(r'\sclass\s*=\s*\{\s*`([^`]*)`\s*\}', tag)
+        value = re.sub(r'\$\{[^}]*\}', ' ', match.group(1)) if match else ''
+    return value.split()
+
+def literal_length(frontmatter: str, name: str) -> int | None:
+    """Number of items in `const name = [...]` when the frontmatter spells the array out."""
+    match = re.search(rf'\b{re.escape(name)}\s*(?::[^=;]*)?=\s*\[', frontmatter)
+    if not match:
+        return None
+    depth, items, pending = 0, 0, True
+    quote, escaped = None, False
+    for char in frontmatter[match.end():]:
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+            continue
+        if depth == 0:
+            if char == ']':
+                return items
+            if char == ',':
+                pending = True
+                continue
+            if pending and not char.isspace():
+                items += 1
+                pending = False
+        if char in '"\'`':
+            quote = char
+        elif char in '[{(':
+            depth += 1
+        elif char in ']})':
+            depth -= 1
+    return None
+
+def text_height(text: str) -> int:
+    """Height of a run of text between tags; code inside {expressions} is not text."""
+    text = re.sub(r'\{[^{}]*\}', 'x' * EXPRESSION_CHARS, text)
+    if re.search(r'[{}]|=>', text):
+        return 0
+    chars = len(' '.join(text.split()))
+    return -(-chars // CHARS_PER_LINE) * LINE_HEIGHT
+
+def stacked_height(classes: list[str], children: list[int]) -> int:
+    """Children's combined height under the element's mobile flex/grid layout, plus gaps."""
+    columns = 1
+    for name in classes:
+        match = GRID_COLUMNS_PATTERN.match(name)
+        if match and 'grid' in classes:
+            columns = int(match.group(1))
+    if 'flex' in classes and 'flex-col' not in classes:
+        columns = 2 if 'flex-wrap' in classes else max(len(children), 1)
+    rows = [max(children[i:i + columns]) for i in range(0, len(children), columns)]
+    gap = 0
+    for name in classes:
+        match = SPACING_PATTERN.match(name)
+        if match and match.group(1) in ('gap', 'gap-y', 'space-y'):
+            gap = float(match.group(2)) * 4
+    return int(sum(rows) + gap * max(len(rows) - 1, 0))
+
+def box_spacing(classes: list[str]) -> int:
+    """Vertical padding and margin from the element's own classes."""
+    total = 0
+    for name in classes:
+        match = SPACING_PATTERN.match(name)
+        if not match or match.group(1) in ('gap', 'gap-y', 'space-y'):
+            continue
+        sides = 2 if match.group(1) in ('p', 'py', 'm', 'my') else 1
+        total += float(match.group(2)) * 4 * sides
+    return int(total)
+
+def fixed_height(classes: list[str]) -> tuple[int | None, int]:
+    """(height, min-height) set by h-*/min-h-* classes."""
+    height, minimum = None, 0
+    for name in classes:
+        match = HEIGHT_PATTERN.match(name)
+        if not match:
+            continue
+        value = MOBILE_VIEWPORT[1] if match.group(4) else int(match.group(2) or int(match.group(3)) * 4)
+        if match.group(1) == 'h':
+            height = value
+        else:
+            minimum = max(minimum, value)
+    return height, minimum
+
+def map_regions(template) -> list[tuple[int, int, int]]:
+    """(start, end, item count) of every {items.map(...)} in a template's markup."""
+    regions = []
+    for match in MAP_PATTERN.finditer(template.masked):
+        depth = 0
+        for end in range(match.end() - 1, len(template.masked)):
+            char = template.masked[end]
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        count = literal_length(template.frontmatter, match.group(1))
+        regions.append((match.start(), end, MAP_REPEAT if count is None else count))
+    return regions
+
+def number(value: str | None) -> int | None:
+    try:
+        return int(float(value)) if value else None
+    except ValueError:
+        return None
+
+def rendered_area(tag: str, intrinsic: tuple[int, int] | None) -> int:
+    """Approximate on-screen area: declared size, else intrinsic, clamped to the viewport."""
+    width, height = number(attribute(tag, 'width')), number(attribute(tag, 'height'))
+    if intrinsic:
+        if width and not height:
+            height = round(intrinsic[1] * width / intrinsic[0]) if intrinsic[0] else None
+        width, height = width or intrinsic[0], height or intrinsic[1]
+    classes = (attribute(tag, 'class') or '') + ' ' + (attribute(tag, 'style') or '')
+    if not (width and height):
+        # Unknown size: a full-bleed image covers the viewport, anything else is unranked
+        return VIEWPORT[0] * VIEWPORT[1] if FULL_BLEED_PATTERN.search(classes) else 0
+    if (width < MIN_CANDIDATE_SIZE or height < MIN_CANDIDATE_SIZE) and not FULL_BLEED_PATTERN.search(classes):
+        return 0
+    return min(width, VIEWPORT[0]) * min(height, VIEWPORT[1])
+
+class Template:
+    """A parsed .astro file: its start/end tags and what its frontmatter imports."""
+    
+    def __init__(self, path: Path, project_path: Path, aliases):
+        self.path = path
+        self.rel = path.relative_to(project_path).as_posix()
+        self.content = path.read_bytes().decode('utf-8', errors='ignore')
+        frontmatter = FRONTMATTER_PATTERN.match(self.content)
+        body_start = frontmatter.end() if frontmatter else 0
+        # Blank frontmatter, comments, scripts and styles without moving offsets
+        blank = lambda m: re.sub(r'[^\n]', ' ', m.group())
+        self.masked = blank(frontmatter) if frontmatter else ''
+        self.masked += MASKED_BLOCK_PATTERN.sub(blank, self.content[body_start:])
+        self.tags = [
+            (m.group(1) == '/', m.group(2), m.group(0), m.start(), m.group(3).rstrip().endswith('/'))
+            for m in TAG_PATTERN.finditer(self.masked, body_start)
+        ]
+        self.frontmatter = frontmatter.group(1) if frontmatter else ''
+        self.components: dict[str, Path] = {}
+        self.images: dict[str, Path] = {}
+        self.islands: dict[str, Path] = {}
+        for name, spec in DEFAULT_IMPORT_PATTERN.findall(self.frontmatter):
+            target = resolve_import(spec, path, aliases)
+            if not target:
+                continue
+            if target.suffix == '.astro':
+                self.components[name] = target
+            elif target.suffix.lower() in IMAGE_EXTENSIONS:
+                self.images[name] = target
+            elif target.suffix.lower() in ISLAND_EXTENSIONS:
+                self.islands[name] = target
+    
+    def line(self, offset: int) -> int:
+        return self.content.count('\n', 0, offset) + 1
+    
+    def repeat(self, offset: int, parent_offset: int) -> int:
+        """How many times an element renders relative to its parent, from enclosing .map() calls."""
+        if not hasattr(self, '_regions'):
+            self._regions = map_regions(self)
+        count = 1
+        for start, end, items in self._regions:
+            if start <= offset < end and not start <= parent_offset < end:
+                count *= items
+        return count
+    
+    def tag_end(self, i: int) -> int:
+        return self.tags[i][3] + len(self.tags[i][2])
+    
+    def close_index(self, i: int, end: int) -> int:
+        """Index of the end tag matching the start tag at i, or i if it is never closed."""
+        name = self.tags[i][1]
+        depth = 0
+        for j in range(i + 1, end):
+            closing, other, _, _, self_closing = self.tags[j]
+            if other != name or self_closing:
+                continue
+            if not closing:
+                depth += 1
+            elif depth == 0:
+                return j
+            else:
+                depth -= 1
+        return i
+
+class RenderOrder:
+    """Expands pages into their composed stream of images and landmark boundaries."""
+    
+    def __init__(self, project_path: Path, only: set[str] | None = None):
+        self.project_path = project_path
+        self.only = only  # Project-relative pages to expand instead of all of src/pages
+        self.aliases = path_aliases(project_path)
+        self.templates: dict[Path, Template] = {}
+        self.events: dict[Path, list] = {}
+    
+    @cached_property
+    def pages(self) -> list[Path]:
+        if self.only is not None:
+            return [self.project_path / rel for rel in sorted(self.only) if (self.project_path / rel).is_file()]
+        return find_files(self.project_path / 'src' / 'pages', ['.astro'], project=self.project_path)
+    
+    @cached_property
+    def loading_decisions(self) -> dict[tuple[str, int], tuple[str, ImageRef]]:
+        """
+        (source file, tag offset) -> ("lcp" or "lazy", the image where it first
+        renders). A tag shared by several pages is "lcp" if it is the candidate
+        on any of them, and "lazy" only if it is clearly below the fold on every
+        page that renders it. Tags not rendered by any page are left out.
+        """
+        lcp: set[tuple[str, int]] = set()
+        below: dict[tuple[str, int], bool] = {}
+        first: dict[tuple[str, int], ImageRef] = {}
+        for page in self.pages:
+            images = self.page_images(page)
+            if images.lcp:
+                lcp.add((images.lcp.file, images.lcp.offset))
+            for img in images.images:
+                key = (img.file, img.offset)
+                below[key] = below.get(key, True) and img.band > EAGER_BANDS
+                first.setdefault(key, img)
+        return {key: ('lcp' if key in lcp else 'lazy', first[key])
+                for key, is_below in below.items() if key in lcp or is_below}
+    
+    def template(self, path: Path) -> Template:
+        if path not in self.templates:
+            self.templates[path] = Template(path, self.project_path, self.aliases)
+        return self.templates[path]
+    
+    def intrinsic_size(self, template: Template, tag: str) -> tuple[int, int] | None:
+        src = attribute(tag, 'src')
+        if not src:
+            return None
+        if src in template.images:
+            return image_size(template.images[src])
+        if src.startswith('/') and not src.startswith('//'):
+            return image_size(self.project_path / 'public' / src.lstrip('/'))
+        return None
+    
+    def expand(self, template: Template, start: int, end: int, slot: list, depth: int, chain: tuple) -> list:
+        """
+        Composed events for tags[start:end] of a template: ('image', template,
+        tag index), ('island', template, tag index), and ('open', name,
+        template, tag index) and ('close', name) for landmarks.
+        """
+        events = []
+        i = start
+        while i < end:
+            closing, name, raw, offset, self_closing = template.tags[i]
+            if name in LANDMARK_TAGS:
+                events.append(('close', name) if closing else ('open', name, template, i))
+                i += 1
+                continue
+            if closing:
+                i += 1
+                continue
+            if name in IMAGE_TAGS:
+                events.append(('image', template, i))
+                # <Picture> children are its own sources
+                i = (template.close_index(i, end) if name == 'Picture' and not self_closing else i) + 1
+                continue
+            if name in template.islands or (name not in template.components and CLIENT_DIRECTIVE_PATTERN.search(raw)):
+                # Children are slot content rendered as static HTML, so keep walking them
+                events.append(('island', template, i))
+                i += 1
+                continue
+            if name == 'slot' and attribute(raw, 'name') is None:
+                events.extend(slot)
+                i = (i if self_closing else template.close_index(i, end)) + 1
+                continue
+            component = template.components.get(name)
+            if component and depth < MAX_DEPTH and component not in chain:
+                close = i if self_closing else template.close_index(i, end)
+                # Children render in the caller's context, then fill the component's slot
+                children = self.expand(template, i + 1, close, slot, depth, chain)
+                inner = self.template(component)
+                events.extend(self.expand(inner, 0, len(inner.tags), children, depth + 1, chain + (component,)))
+                i = close + 1
+                continue
+            i += 1
+        return events
+    
+    def page_events(self, page: Path) -> list:
+        """Composed events of a whole page (see expand), expanded once and shared by the page_* views."""
+        if page not in self.events:
+            template = self.template(page)
+            self.events[page] = self.expand(template, 0, len(template.tags), [], 0, (page,))
+        return self.events[page]
+    
+    def page_images(self, page: Path) -> PageImages:
+        template = self.template(page)
+        events = self.page_events(page)
+        
+        images = []
+        band, depth = 0, 0
+        for event in events:
+            if event[0] == 'open':
+                if depth == 0:
+                    band += 1
+                depth += 1
+            elif event[0] == 'close':
+                depth = max(0, depth - 1)
+            elif event[0] == 'image':
+                _, source, index = event
+                raw, offset = source.tags[index][2], source.tags[index][3]
+                classes = (attribute(raw, 'class') or '').split()
+                images.append(ImageRef(
+                    file=source.rel,
+                    offset=offset,
+                    line=source.line(offset),
+                    band=band,
+                    area=rendered_area(raw, self.intrinsic_size(source, raw)),
+                    visible='hidden' not in classes,
+                    tag=raw,
+                ))
+        
+        return PageImages(page=template.rel, images=images, lcp=pick_lcp(images))
+    
+    def child_heights(self, template: Template, start: int, end: int, parent_offset: int,
+                      slot: list[int], depth: int) -> list[int]:
+        """Estimated heights of the elements and text runs directly inside tags[start:end]."""
+        heights = []
+        cursor = template.tag_end(start - 1) if start > 0 else 0
+        i = start
+        while i < end:
+            closing, name, raw, offset, self_closing = template.tags[i]
+            text = text_height(template.masked[cursor:offset])
+            if text:
+                heights.append(text)
+            if closing:
+                cursor = template.tag_end(i)
+                i += 1
+                continue
+            close = i if self_closing or name.lower() in VOID_ELEMENTS else template.close_index(i, end)
+            height = self.element_height(template, i, close, slot, depth)
+            heights.extend([height] * template.repeat(offset, parent_offset))
+            cursor = template.tag_end(close)
+            i = close + 1
+        if end < len(template.tags):
+            text = text_height(template.masked[cursor:template.tags[end][3]])
+            if text:
+                heights.append(text)
+        return heights
+    
+    def element_height(self, template: Template, i: int, close: int, slot: list[int], depth: int) -> int:
+        """Estimated rendered height of the element whose tags span [i, close], margins included."""
+        _, name, raw, offset, _ = template.tags[i]
+        classes = class_list(raw)
+        if OUT_OF_FLOW_CLASSES & set(classes) or re.search(r'\shidden(?:[\s/>=])', raw):
+            return 0
+        height, minimum = fixed_height(classes)
+        
+        if height is None:
+            if name in IMAGE_TAGS:
+                declared = number(attribute(raw, 'height'))
+                intrinsic = self.intrinsic_size(template, raw)
+                width = number(attribute(raw, 'width')) or (intrinsic[0] if intrinsic else None)
+                height = declared or (intrinsic[1] if intrinsic else IMAGE_HEIGHT)
+                if width and width > CONTENT_WIDTH:
+                    height = height * CONTENT_WIDTH // width
+            elif name == 'slot':
+                height = sum(slot)
+            elif name in template.components and depth < MAX_DEPTH:
+                children = self.child_heights(template, i + 1, close, offset, slot, depth)
+                inner = self.template(template.components[name])
+                height = sum(self.child_heights(inner, 0, len(inner.tags), -1, children, depth + 1))
+            else:
+                children = self.child_heights(template, i + 1, close, offset, slot, depth)
+                height = max(stacked_height(classes, children), BLOCK_HEIGHTS.get(name.lower(), 0))
+        return max(height, minimum) + box_spacing(classes)
+    
+    def page_sections(self, page: Path) -> PageSections:
+        """Top-level sections of a page in composed order, with estimated positions and heights."""
+        template = self.template(page)
+        events = self.page_events(page)
+        
+        sections = []
+        band, depth, top = 0, 0, HEADER_HEIGHT
+        for event in events:
+            if event[0] == 'open':
+                if depth == 0:
+                    band += 1
+                    _, name, source, index = event
+                    close = source.close_index(index, len(source.tags))
+                    height = self.element_height(source, index, close, [], 0)
+                    offset = source.tags[index][3]
+                    sections.append(SectionRef(
+                        file=source.rel, offset=offset, line=source.line(offset), tag=name,
+                        band=band, top=top, height=height,
+                    ))
+                    top += height
+                depth += 1
+            elif event[0] == 'close':
+                depth = max(0, depth - 1)
+        return PageSections(page=template.rel, sections=sections, height=top)
+    
+    def page_islands(self, page: Path) -> PageIslands:
+        """Framework components of a page in composed order, placed by the section they render in."""
+        template = self.template(page)
+        events = self.page_events(page)
+        
+        islands = []
+        band, depth, top, section_top = 0, 0, HEADER_HEIGHT, 0
+        for event in events:
+            if event[0] == 'open':
+                if depth == 0:
+                    band += 1
+                    _, _, source, index = event
+                    close = source.close_index(index, len(source.tags))
+                    section_top = top
+                    top += self.element_height(source, index, close, [], 0)
+                depth += 1
+            elif event[0] == 'close':
+                depth = max(0, depth - 1)
+            elif event[0] == 'island':
+                _, source, index = event
+                _, name, raw, offset, _ = source.tags[index]
+                directive, value = client_directive(raw)
+                component = source.islands.get(name)
+                islands.append(IslandRef(
+                    file=source.rel, offset=offset, line=source.line(offset), component=name,
+                    source=component.relative_to(self.project_path).as_posix()
+                    if component and component.is_relative_to(self.project_path) else None,
+                    directive=directive, value=value, band=band,
+                    # Outside any section it sits in the header, or between two sections
+                    top=section_top if depth else (top if band else 0),
+                ))
+        return PageIslands(page=template.rel, islands=islands)
+
+def pick_lcp(images: list[ImageRef]) -> ImageRef | None:
+    """The largest visible image in the first bands; an explicit fetchpriority="high" wins."""
+    candidates = [img for img in images if img.band <= LCP_BANDS and img.visible and img.area]
+    for img in candidates:
+        if (attribute(img.tag, 'fetchpriority') or '').lower() == 'high':
+            return img
+    if not candidates:
+        return None
+    # max() keeps the first of equal areas, i.e. the earliest in render order
+    return max(candidates, key=lambda img: img.area)
+
+def project_pages(project_path: Path, order: RenderOrder | None = None) -> list[PageImages]:
+    """Images in composed render order for every .astro page."""
+    order = order or RenderOrder(project_path)
+    return [order.page_images(page) for page in order.pages]
+
+def loading_plan(project_path: Path, order: RenderOrder | None = None) -> dict[str, dict[int, str]]:
+    """Per source file, tag offset -> "lcp" or "lazy" (see RenderOrder.loading_decisions)."""
+    plan: dict[str, dict[int, str]] = {}
+    for (file, offset), (decision, _) in (order or RenderOrder(project_path)).loading_decisions.items():
+        plan.setdefault(file, {})[offset] = decision
+    return plan
+
+def deferrable_sections(project_path: Path, order: RenderOrder | None = None) -> list[DeferredSection]:
+    """
+    Top-level sections that can get content-visibility: auto. A section
+    qualifies when it starts at least FOLD_VIEWPORTS down a long page, is never
+    in the LCP bands of any page that renders it, and holds nothing that
+    containment would break (fixed positioning, content pulled outside the box
+    with negative offsets) or that already sets content-visibility.
+    """
+    order = order or RenderOrder(project_path)
+    pages = [order.page_sections(page) for page in order.pages]
+    fold = FOLD_VIEWPORTS * MOBILE_VIEWPORT[1]
+    long_page = LONG_PAGE_VIEWPORTS * MOBILE_VIEWPORT[1]
+    
+    rendered: dict[tuple[str, int], list[tuple[PageSections, SectionRef]]] = {}
+    for page in pages:
+        for section in page.sections:
+            rendered.setdefault((section.file, section.offset), []).append((page, section))
+    
+    deferred = []
+    for (file, offset), uses in rendered.items():
+        if any(section.band <= LCP_BANDS for _, section in uses):
+            continue
+        long_uses = [(page, section) for page, section in uses if page.height >= long_page]
+        if not long_uses or any(section.top < fold for _, section in long_uses):
+            continue
+        template = order.template(project_path / file)
+        index = next(i for i, tag in enumerate(template.tags) if tag[3] == offset)
+        close = template.close_index(index, len(template.tags))
+        if CONTAINMENT_HAZARD_PATTERN.search(template.masked[offset:template.tag_end(close)]):
+            continue
+        section = uses[0][1]
+        deferred.append(DeferredSection(
+            file=file, offset=offset, line=section.line, tag=section.tag,
+            # Rounded up, so small estimate changes do not churn the source
+            height=-(-max(s.height for _, s in uses) // 50) * 50,
+            pages=sorted({page.page for page, _ in long_uses}),
+        ))
+    return sorted(deferred, key=lambda d: (d.file, d.offset))
+
+def content_visibility_plan(project_path: Path, order: RenderOrder | None = None) -> dict[str, dict[int, int]]:
+    """Per source file, section start tag offset -> contain-intrinsic-size height in px."""
+    plan: dict[str, dict[int, int]] = {}
+    for section in deferrable_sections(project_path, order):
+        plan.setdefault(section.file, {})[section.offset] = section.height
+    return plan
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Stable finding fingerprints, baseline suppression and SARIF/JUnit output for
+analyze.py and detect_js_patterns.py.
+
+A fingerprint hashes the rule, the file and the normalized source line (or the
+message, for findings without a line). It does not include the line number,
+so unrelated edits above a finding keep its identity. A baseline is the set of
+fingerprints accepted at some point. Checking findings against it is one hash
+set lookup per finding.
+"""
+
+import re
+import json
+import math
+import hashlib
+from itertools import repeat
+from functools import lru_cache
+from pathlib import Path
+from collections import Counter
+import xml.etree.ElementTree as ET
+
+FORMATS = ['json', 'sarif', 'junit']
+BASELINE_VERSION = 1
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+FINGERPRINT_KEY = 'astroOptimizer/v1'
+HISTORY_DB = '.astro-optimizer/history.db'
+
+SARIF_LEVELS = {'high': 'error', 'medium': 'warning', 'low': 'note'}
+
+encode_string = json.encoder.encode_basestring_ascii
+CONSTANTS = {None: 'null', True: 'true', False: 'false'}
+CONTAINERS = (dict, list, tuple)
+
+@lru_cache(maxsize=None)
+def records_encoder(level: int) -> json.JSONEncoder:
+    """Separators that indent a record's fields; without indent, json uses its C encoder."""
+    return json.JSONEncoder(separators=(',\n' + '  ' * (level + 2), ': '))
+
+def is_flat_records(value: list) -> bool:
+    """A non-empty list of non-empty dicts holding only scalars, like a findings list."""
+    if not value:
+        return False
+    for record in value:
+        if not isinstance(record, dict) or not record:
+            return False
+        for item in record.values():
+            if isinstance(item, CONTAINERS):
+                return False
+    return True
+
+def dumps_records(records: list[dict], level: int) -> str:
+    """
+    A list of flat records at `level`, as json.dumps(indent=2) would write it,
+    in one call to the C encoder. Its item separator already indents the
+    fields; the only other difference is the separator between records, and
+    "},\n<indent>{" cannot occur inside an encoded string, so replacing it is
+    exact.
+    """
+    outer, inner, field = ('\n' + '  ' * n for n in (level, level + 1, level + 2))
+    text = records_encoder(level).encode(records)
+    text = text[2:-2].replace('},' + field + '{', inner + '},' + inner + '{' + field)
+    return '[' + inner + '{' + field + text + inner + '}' + outer + ']'
+
+def json_scalar(value) -> str | None:
+    """A scalar as json.dumps writes it, or None for containers and unsupported types."""
+    if isinstance(value, str):
+        return encode_string(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        if math.isfinite(value):
+            return float.__repr__(value)
+        return 'NaN' if value != value else ('Infinity' if value > 0 else '-Infinity')
+    return None
+
+def dumps_json(value, level: int = 0) -> str:
+    """
+    Same text as json.dumps(value, indent=2). The standard library falls back
+    to its pure-Python encoder whenever indent is set; this writer hands lists
+    of flat records (findings) to the C encoder and joins strings per
+    container elsewhere, which matters for reports with 100k+ findings.
+    """
+    # Subclasses (Counter, defaultdict, OrderedDict) are written like their base, as json does
+    if isinstance(value, list) and is_flat_records(value):
+        return dumps_records(value, level)
+    is_dict = isinstance(value, dict)
+    if not is_dict and not isinstance(value, (list, tuple)):
+        scalar = json_scalar(value)
+        # Unsupported types raise the same TypeError json.dumps would
+        return scalar if scalar is not None else json.dumps(value)
+    if not value:
+        return '{}' if is_dict else '[]'
+    inner = '\n' + '  ' * (level + 1)
+    items = []
+    pairs = value.items() if is_dict else zip(repeat(None), value)
+    for key, item in pairs:
+        item_kind = type(item)
+        if item_kind is str:
+            text = encode_string(item)
+        elif item_kind is int:
+            text = int.__repr__(item)
+        elif item_kind is bool or item is None:
+            text = CONSTANTS[item]
+        else:
+            text = dumps_json(item, level + 1)
+        if is_dict:
+            text = f"{encode_string(key if type(key) is str else json.dumps(key))}: {text}"
+        items.append(text)
+    brackets = '{}' if is_dict else '[]'
+    return brackets[0] + inner + (',' + inner).join(items) + '\n' + '  ' * level + brackets[1]
+
+def rule_id(finding: dict) -> str:
+    """analyze.py findings carry `type`, detect_js_patterns findings carry `pattern`."""
+    return finding.get('type') or finding['pattern']
+
+def finding_message(finding: dict) -> str:
+    if 'message' in finding:
+        return finding['message']
+    return f"{finding['explanation']} Replace with: {finding['html_css_solution']}"
+
+def normalize_context(text: str) -> str:
+    """Collapse whitespace and number literals so formatting and counts do not change identity."""
+    return re.sub(r'\d+', '0', ' '.join(text.split()))
+
+def add_fingerprints(findings: list[dict], project_path: Path) -> list[dict]:
+    """
+    Set `fingerprint` on every finding (in place) and return the list. Identical
+    contexts in one file are told apart by occurrence order.
+    """
+    lines_by_file: dict[str, list[str] | None] = {}
+    occurrences: Counter = Counter()
+    for finding in findings:
+        context = finding.get('evidence') or ''
+        line = finding.get('line')
+        if not context and line:
+            if finding['file'] not in lines_by_file:
+                source = project_path / finding['file']
+                lines_by_file[finding['file']] = (
+                    source.read_text(errors='ignore').split('\n') if source.is_file() else None
+                )
+            lines = lines_by_file[finding['file']]
+            if lines and line <= len(lines):
+                context = lines[line - 1]
+        if not context:
+            context = finding_message(finding)
+        
+        base = '\0'.join((rule_id(finding), finding['file'], normalize_context(context)))
+        occurrences[base] += 1
+        digest = hashlib.sha256(f"{base}\0{occurrences[base]}".encode()).hexdigest()
+        finding['fingerprint'] = digest[:32]
+    return findings
+
+# ---------------------------------------------------------------------------
+# Baseline
+# ---------------------------------------------------------------------------
+
+def load_baseline(path: Path) -> set[str]:
+    data = json.loads(path.read_text())
+    return set(data.get('fingerprints', []))
+
+def write_baseline(path: Path, findings: list[dict]):
+    path.write_text(json.dumps({
+        'version': BASELINE_VERSION,
+        'fingerprints': sorted({f['fingerprint'] for f in findings}),
+    }, indent=2) + '\n')
+
+def split_baseline(findings: list[dict], baseline: set[str]) -> tuple[list[dict], list[dict]]:
+    """Return (new, suppressed)."""
+    new, suppressed = [], []
+    for finding in findings:
+        (suppressed if finding['fingerprint'] in baseline else new).append(finding)
+    return new, suppressed
+
+# ---------------------------------------------------------------------------
+# SARIF / JUnit
+# ---------------------------------------------------------------------------
+
+def to_sarif(findings: list[dict], tool_name: str) -> dict:
+    """A SARIF 2.1.0 log with one run."""
+    rules = {}
+    for finding in findings:
+        rid = rule_id(finding)
+        if rid not in rules:
+            rules[rid] = {
+                'id': rid,
+                'shortDescription': {'text': finding.get('suggestion') or finding.get('html_css_solution') or rid},
+            }
+    
+    results = []
+    for finding in findings:
+        location = {'artifactLocation': {'uri': finding['file']}}
+        if finding.get('line'):
+            location['region'] = {'startLine': finding['line']}
+        results.append({
+            'ruleId': rule_id(finding),
+            'level': SARIF_LEVELS.get(finding['severity'], 'warning'),
+            'message': {'text': finding_message(finding)},
+            'locations': [{'physicalLocation': location}],
+            'partialFingerprints': {FINGERPRINT_KEY: finding['fingerprint']},
+        })
+    
+    return {
+        '$schema': SARIF_SCHEMA,
+        'version': '2.1.0',
+        'runs': [{
+            'tool': {'driver': {'name': tool_name, 'rules': list(rules.values())}},
+            'results': results,
+        }],
+    }
+
+def to_junit(findings: list[dict], tool_name: str) -> str:
+    """A JUnit XML report with one failing test case per finding."""
+    suite = ET.Element('testsuite', name=tool_name, tests=str(len(findings)), failures=str(len(findings)))
+    for finding in findings:
+        location = f"{finding['file']}:{finding['line']}" if finding.get('line') else finding['file']
+        case = ET.SubElement(suite, 'testcase', classname=rule_id(finding), name=location)
+        failure = ET.SubElement(case, 'failure', message=finding_message(finding), type=finding['severity'])
+        failure.text = finding.get('suggestion') or finding.get('html_css_solution') or ''
+    ET.indent(suite)
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(suite, encoding='unicode') + '\n'
+
+def add_report_arguments(parser):
+    parser.add_argument('--format', choices=FORMATS, default='json', help='Output format (default: %(default)s)')
+    parser.add_argument('--baseline', type=Path,
+                        help='Only report findings whose fingerprint is not in this baseline file; '
+                             'exit 1 if any remain')
+    parser.add_argument('--write-baseline', type=Path, metavar='FILE',
+                        help='Write the fingerprints of all current findings to FILE')
+    parser.add_argument('--history', nargs='?', const=HISTORY_DB, metavar='DB',
+                        help='Record this run in the SQLite run history (see run_history.py), '
+                             'relative to the project (default DB: %(const)s)')
+
+def emit(output: dict, key: str, project_path: Path, tool_name: str, args,
+         timings: dict[str, float] | None = None) -> int:
+    """
+    Fingerprint output[key], apply --write-baseline/--history/--baseline, print
+    in the requested format and return the exit code. The history gets every
+    finding, including baselined ones.
+    """
+    findings = add_fingerprints(output[key], project_path)
+    if args.write_baseline:
+        write_baseline(args.write_baseline, findings)
+    if args.history:
+        # run_history imports this module
+        from run_history import record_run, history_path
+        record_run(history_path(project_path, args.history), project_path, tool_name, findings,
+                   output.get('summary', {}), timings)
+    
+    status = 0
+    if args.baseline:
+        findings, suppressed = split_baseline(findings, load_baseline(args.baseline))
+        output[key] = findings
+        output['baseline'] = {'file': str(args.baseline), 'new': len(findings), 'suppressed': len(suppressed)}
+        status = 1 if findings else 0
+    
+    if args.format == 'sarif':
+        print(dumps_json(to_sarif(findings, tool_name)))
+    elif args.format == 'junit':
+        print(to_junit(findings, tool_name), end='')
+    else:
+        print(dumps_json(output))
+    return status
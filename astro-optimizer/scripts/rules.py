@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Rule registry and engine for analyze.py.
+
+A rule declares the file types it looks at and the parsed form it needs:
+"text" (raw content), "tags" (markup tag tokens), "css" (CSS rules, including
+<style> blocks in components), "file" (the SourceFile, with every form parsed
+lazily) or "project" (runs once against a project-level view). The engine walks
+the tree once, parses each file at most once per form, and hands the result
+only to the rules that declared that file type.
+
+Rules that only need substring checks should take the "file" form and call
+file.contains() / file.search(). Those run on the raw bytes, memory-mapped for
+large files, without decoding the whole file.
+
+Rules are registered with the @rule decorator. Besides the built-in rules in
+analyze.py, rules are discovered from the `astro_optimizer.rules` entry point
+group and from *.py files in the project's .astro-optimizer/rules/ directory:
+    
+    from rules import rule
+    from analyze import Finding
+    
+    @rule("no_inline_styles", extensions=[".astro"], form="tags")
+    def no_inline_styles(tags, file, state):
+        for tag in tags:
+            if ' style=' in tag.raw:
+                yield Finding(...)
+"""
+
+import re
+import sys
+import importlib.util
+from pathlib import Path
+from functools import cached_property
+from dataclasses import dataclass, field
+from typing import Callable
+
+from bisect import bisect_right
+
+from source_reader import SourceBuffer, SkippedFile, open_source
+from walker import find_files
+from render_order import RenderOrder
+
+FORMS = ("text", "tags", "css", "file", "project")
+ENTRY_POINT_GROUP = "astro_optimizer.rules"
+PLUGIN_DIR = ".astro-optimizer/rules"
+
+@dataclass
+class Rule:
+    name: str
+    check: Callable
+    form: str = "text"
+    extensions: frozenset[str] = frozenset()  # Empty for project rules
+    root: str = "src"                          # Directory the rule's files live under
+    finish: Callable | None = None             # Called once after all files: finish(project, state)
+
+# Registered rules by name, in registration order. Re-registering a name replaces it.
+RULES: dict[str, Rule] = {}
+
+def rule(name: str, *, extensions=(), form: str = "text", root: str = "src", finish: Callable | None = None):
+    """
+    Register a rule. File rules are called as check(parsed, file, state) for each
+    matching file and may return or yield findings; project rules are called as
+    check(project, state). `state` is a dict private to the rule, and `finish`
+    (if given) turns it into findings once every file has been seen.
+    """
+    if form not in FORMS:
+        raise ValueError(f"Unknown rule form: {form} (expected one of {', '.join(FORMS)})")
+    
+    def register(check: Callable) -> Callable:
+        RULES[name] = Rule(
+            name=name,
+            check=check,
+            form=form,
+            extensions=frozenset(e.lower() for e in extensions),
+            root=root,
+            finish=finish,
+        )
+        return check
+    
+    return register
+
+# ---------------------------------------------------------------------------
+# Parsed forms
+# ---------------------------------------------------------------------------
+
+TAG_PATTERN = re.compile(r'<([A-Za-z][\w:.-]*)\b[^>]*>')
+STYLE_BLOCK_PATTERN = re.compile(r'<style\b[^>]*>(.*?)</style\s*>', re.DOTALL | re.IGNORECASE)
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_BRACE_PATTERN = re.compile(r'[{}]')
+CSS_EXTENSIONS = {".css", ".scss", ".sass", ".less"}
+
+@dataclass
+class Tag:
+    name: str    # As written, so <Image> and <img> stay distinct
+    raw: str     # The full start tag
+    offset: int
+    line: int
+
+@dataclass
+class CssRule:
+    prelude: str  # Selector or at-rule, e.g. ".hero" or "@font-face"
+    body: str     # Declarations of the innermost block
+    offset: int
+    line: int
+
+def parse_tags(content: str) -> list[Tag]:
+    """Tokenize start tags in document order, counting lines as we go."""
+    tags = []
+    line, pos = 1, 0
+    for match in TAG_PATTERN.finditer(content):
+        line += content.count('\n', pos, match.start())
+        pos = match.start()
+        tags.append(Tag(name=match.group(1), raw=match.group(0), offset=pos, line=line))
+    return tags
+
+def retokenize(tags: list[Tag], content: str, start: int, old_end: int, new_end: int, line_delta: int) -> list[Tag]:
+    """
+    Update parse_tags() output after an edit replaced [start, old_end) of the
+    old content with what is now content[start:new_end], adding line_delta
+    lines. Tags ending before the edit are kept and tags after it are shifted;
+    only the text in between is scanned again, until the scan lines up with a
+    shifted tag. The result equals parse_tags(content).
+    """
+    delta = new_end - old_end
+    kept = bisect_right([tag.offset + len(tag.raw) for tag in tags], start)
+    # A tag ending exactly at the edit may be extended by it (e.g. typing inside "<a>" at ">")
+    while kept and tags[kept - 1].offset + len(tags[kept - 1].raw) >= start:
+        kept -= 1
+    result = tags[:kept]
+    following = tags[bisect_right([tag.offset for tag in tags], old_end - 1, lo=kept):]
+    
+    scan_from = result[-1].offset + len(result[-1].raw) if result else 0
+    line = content.count('\n', 0, scan_from) + 1
+    pos = scan_from
+    j = 0
+    for match in TAG_PATTERN.finditer(content, scan_from):
+        if match.start() >= new_end:
+            while j < len(following) and following[j].offset + delta < match.start():
+                j += 1
+            if j < len(following) and following[j].offset + delta == match.start() and following[j].raw == match.group(0):
+                result.extend(Tag(name=t.name, raw=t.raw, offset=t.offset + delta, line=t.line + line_delta)
+                              for t in following[j:])
+                return result
+        line += content.count('\n', pos, match.start())
+        pos = match.start()
+        result.append(Tag(name=match.group(1), raw=match.group(0), offset=pos, line=line))
+    return result
+
+def parse_css(content: str, start: int = 0, end: int | None = None) -> list[CssRule]:
+    """
+    Split CSS into innermost blocks: `@media (...) { .a { ... } }` yields `.a`.
+    Comments are ignored. Offsets are relative to the whole content.
+    """
+    end = len(content) if end is None else end
+    text = CSS_COMMENT_PATTERN.sub(lambda m: re.sub(r'[^\n]', ' ', m.group()), content[start:end])
+    rules = []
+    stack: list[tuple[str, int, bool]] = []  # (prelude, body start, has nested blocks)
+    boundary = 0
+    # Innermost blocks close in document order, so line numbers are counted incrementally
+    line, counted = 1, 0
+    for match in CSS_BRACE_PATTERN.finditer(text):
+        pos = match.start()
+        char = text[pos]
+        if char == '{':
+            if stack:
+                stack[-1] = (stack[-1][0], stack[-1][1], True)
+            # A prelude starts after the last brace or declaration
+            prelude_start = max(boundary, text.rfind(';', boundary, pos) + 1)
+            stack.append((text[prelude_start:pos].strip(), pos + 1, False))
+        elif stack:
+            prelude, body_start, nested = stack.pop()
+            if not nested:
+                offset = start + body_start
+                line += content.count('\n', counted, offset)
+                counted = offset
+                rules.append(CssRule(
+                    prelude=prelude,
+                    body=text[body_start:pos],
+                    offset=offset,
+                    line=line,
+                ))
+        boundary = pos + 1
+    return rules
+
+class SourceFile:
+    """
+    A file in the walk. Each parsed form is computed on first use and cached.
+    Content goes through source_reader: large files are memory-mapped, and
+    binary/generated files read as empty and are recorded in `skipped`.
+    """
+    
+    def __init__(self, path: Path, project_path: Path):
+        self.path = path
+        self.rel = str(path.relative_to(project_path))
+        self.suffix = path.suffix.lower()
+        self.skipped: SkippedFile | None = None
+    
+    @classmethod
+    def from_text(cls, path: Path, project_path: Path, text: str, tags: list[Tag] | None = None) -> 'SourceFile':
+        """A file read from an editor buffer instead of the disk, with its tags if already tokenized."""
+        source = cls(path, project_path)
+        source.__dict__['buffer'] = SourceBuffer.from_text(text)
+        source.__dict__['text'] = text
+        if tags is not None:
+            source.__dict__['tags'] = tags
+        return source
+    
+    @cached_property
+    def buffer(self) -> SourceBuffer | None:
+        buffer, self.skipped = open_source(self.path, self.rel)
+        return buffer
+    
+    def contains(self, *needles: bytes) -> bool:
+        """Substring prefilter on the raw bytes, without decoding the file."""
+        return self.buffer is not None and self.buffer.contains(*needles)
+    
+    def contains_folded(self, *needles: bytes) -> bool:
+        """contains() ignoring case; needles are lowercase."""
+        return self.buffer is not None and self.buffer.contains_folded(*needles)
+    
+    def search(self, pattern: re.Pattern) -> re.Match | None:
+        """Bytes regex over the raw file."""
+        return self.buffer.search(pattern) if self.buffer is not None else None
+    
+    @cached_property
+    def text(self) -> str:
+        return self.buffer.text() if self.buffer is not None else ''
+    
+    def close(self):
+        if self.__dict__.get('buffer') is not None:
+            self.buffer.close()
+    
+    @cached_property
+    def tags(self) -> list[Tag]:
+        return parse_tags(self.text)
+    
+    @cached_property
+    def css(self) -> list[CssRule]:
+        if self.suffix in CSS_EXTENSIONS:
+            return parse_css(self.text)
+        # Components carry their CSS in <style> blocks
+        rules = []
+        for match in STYLE_BLOCK_PATTERN.finditer(self.text):
+            rules.extend(parse_css(self.text, match.start(1), match.end(1)))
+        return rules
+    
+    def form(self, name: str):
+        return self if name == "file" else getattr(self, name)
+
+class ProjectView:
+    """Project-level facts shared by project rules."""
+    
+    def __init__(self, path: Path, pages: set[str] | None = None):
+        self.path = path
+        self.src = path / "src"
+        self.pages = pages  # Restricts render-order rules to these project-relative pages
+    
+    @cached_property
+    def config(self) -> Path | None:
+        configs = sorted(self.path.glob("astro.config.*"))
+        return configs[0] if configs else None
+    
+    @cached_property
+    def config_text(self) -> str:
+        return self.config.read_text(errors='ignore') if self.config else ""
+    
+    @cached_property
+    def render_order(self) -> RenderOrder:
+        """Composed page render order, shared so each page is expanded once per run."""
+        return RenderOrder(self.path, self.pages)
+    
+    def rel(self, path: Path) -> str:
+        return str(path.relative_to(self.path))
+
+# ---------------------------------------------------------------------------
+# Discovery
+# ---------------------------------------------------------------------------
+
+_entry_points_loaded = False
+
+def load_entry_points():
+    """Import rules published by installed packages under the entry point group (once per process)."""
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            loaded = entry_point.load()
+        except Exception as e:
+            print(f"Warning: could not load rule plugin {entry_point.name}: {e}", file=sys.stderr)
+            continue
+        # An entry point may name a module (which registers on import) or a Rule
+        if isinstance(loaded, Rule):
+            RULES[loaded.name] = loaded
+
+def load_plugin_dir(project_path: Path) -> dict[str, Rule]:
+    """
+    Import every *.py in the project's local rule directory and return the rules
+    they register. The global registry is restored afterwards so one project's
+    rules never apply to another project analyzed in the same process.
+    """
+    plugin_dir = project_path / PLUGIN_DIR
+    if not plugin_dir.is_dir():
+        return {}
+    if str(Path(__file__).parent) not in sys.path:
+        sys.path.insert(0, str(Path(__file__).parent))
+    before = dict(RULES)
+    try:
+        for plugin in sorted(plugin_dir.glob("*.py")):
+            spec = importlib.util.spec_from_file_location(f"astro_optimizer_rule_{plugin.stem}", plugin)
+            try:
+                spec.loader.exec_module(importlib.util.module_from_spec(spec))
+            except Exception as e:
+                print(f"Warning: could not load rule plugin {plugin.name}: {e}", file=sys.stderr)
+        return {name: r for name, r in RULES.items() if before.get(name) is not r}
+    finally:
+        RULES.clear()
+        RULES.update(before)
+
+def project_rules(project_path: Path) -> list[Rule]:
+    """Built-in and installed rules, plus (overriding by name) the project's own."""
+    load_entry_points()
+    rules = dict(RULES)
+    rules.update(load_plugin_dir(project_path))
+    return list(rules.values())
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+@dataclass
+class RuleRun:
+    rule: Rule
+    state: dict = field(default_factory=dict)
+    findings: list = field(default_factory=list)
+    failed: bool = False
+
+def _call(run: RuleRun, fn: Callable, *args):
+    if run.failed:
+        return
+    try:
+        run.findings.extend(fn(*args) or ())
+    except Exception as e:
+        # A broken rule reports nothing rather than partial results
+        print(f"Warning: {run.rule.name} failed: {e}", file=sys.stderr)
+        run.failed = True
+        run.findings = []
+
+def is_project_rule(r: Rule) -> bool:
+    """Rules whose findings depend on the whole project rather than one file."""
+    return r.form == "project" or r.finish is not None
+
+def check_file(source: SourceFile, rules: list[Rule]) -> list:
+    """
+    Run the per-file rules that handle one file, e.g. on an editor's unsaved
+    text. Project rules and rules with a finish step need the whole tree and
+    are skipped.
+    """
+    root = source.rel.replace('\\', '/').split('/', 1)[0]
+    findings = []
+    for r in rules:
+        if is_project_rule(r) or r.root != root or source.suffix not in r.extensions:
+            continue
+        run = RuleRun(r)
+        _call(run, r.check, source.form(r.form), source, run.state)
+        findings.extend(run.findings)
+    return findings
+
+def run_rules(project_path: Path, rules: list[Rule] | None = None, only: set[str] | None = None,
+              skipped: list[SkippedFile] | None = None, pages: set[str] | None = None) -> list:
+    """
+    Run rules over the project in a single pruned walk per root (walker.py). Returns
+    findings in rule order.
+    `only` restricts the walk to those project-relative files (missing ones are skipped).
+    `pages` restricts the pages project rules see through ProjectView.render_order.
+    Binary and generated files that a rule wanted to read are appended to `skipped`.
+    """
+    runs = [RuleRun(r) for r in (rules if rules is not None else RULES.values())]
+    project = ProjectView(project_path, pages)
+    
+    dispatch: dict[str, dict[str, list[RuleRun]]] = {}
+    for run in runs:
+        for ext in run.rule.extensions:
+            dispatch.setdefault(run.rule.root, {}).setdefault(ext, []).append(run)
+    
+    if only is not None:
+        walk = [(rel.split('/', 1)[0], project_path / rel) for rel in sorted(only)]
+    else:
+        walk = [
+            (root, path)
+            for root, by_ext in dispatch.items()
+            for path in find_files(project_path / root, by_ext, project=project_path)
+        ]
+    
+    for root, path in walk:
+        interested = dispatch.get(root, {}).get(path.suffix.lower())
+        if not interested or not path.is_file():
+            continue
+        source = SourceFile(path, project_path)
+        for run in interested:
+            if run.rule.form != "file" and source.buffer is None:
+                continue
+            _call(run, run.rule.check, source.form(run.rule.form), source, run.state)
+        source.close()
+        if source.skipped and skipped is not None:
+            skipped.append(source.skipped)
+    
+    for run in runs:
+        if run.rule.form == "project":
+            _call(run, run.rule.check, project, run.state)
+        if run.rule.finish:
+            _call(run, run.rule.finish, project, run.state)
+    
+    return [finding for run in runs for finding in run.findings]
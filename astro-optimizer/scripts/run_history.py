@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Run history: every recorded run's summary, findings, stage timings and dist
+route weights in a local SQLite database, keyed by git commit and time.
+
+Findings are stored once per fingerprint (see report_formats.py) and runs
+reference them by id, so thousands of runs of a mostly unchanged project stay
+small. All rows of a run are inserted in one transaction with executemany, and
+every query below is served by an index.
+
+Commands:
+  record       analyze the project (and dist/ weights, if built) and store the run
+  runs         list recorded runs
+  compare      new/resolved findings and summary, timing and route deltas between two runs
+  trend        findings per rule, or transfer bytes per route, across recent runs
+  regressions  compare two runs and exit 1 on new findings or heavier routes
+
+analyze.py and detect_js_patterns.py also record with --history.
+"""
+
+import json
+import sys
+import time
+import sqlite3
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+
+from analyze import analyze_project, find_astro_root
+from compress_assets import compress_project
+from dist_pages import find_dist
+from report_formats import add_fingerprints, rule_id, finding_message, HISTORY_DB
+from changed_files import git
+
+SCHEMA_VERSION = 1
+DEFAULT_TOOL = 'astro-optimizer'
+
+# Regression thresholds
+ROUTE_GROWTH_PCT = 5.0        # Route transfer bytes
+ROUTE_GROWTH_MIN_BYTES = 1024  # Ignore growth smaller than this, whatever the percentage
+TIMING_GROWTH_RATIO = 1.5     # Stage timings are noisy; only flag large slowdowns
+TIMING_GROWTH_MIN_SECONDS = 0.5
+
+# SQLite's default limit on bound parameters is 999 on older builds
+PARAMETER_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    project TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    git_commit TEXT,
+    dirty INTEGER NOT NULL DEFAULT 0,
+    recorded_at TEXT NOT NULL,  -- ISO 8601, UTC
+    summary TEXT NOT NULL       -- JSON
+);
+CREATE INDEX IF NOT EXISTS runs_by_project ON runs (project, tool, recorded_at);
+CREATE INDEX IF NOT EXISTS runs_by_commit ON runs (project, git_commit);
+
+-- One row per finding identity; runs reference it by id
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    rule TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    file TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS findings_by_rule ON findings (rule);
+
+CREATE TABLE IF NOT EXISTS run_findings (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    finding_id INTEGER NOT NULL REFERENCES findings (id),
+    line INTEGER,
+    PRIMARY KEY (run_id, finding_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS run_findings_by_finding ON run_findings (finding_id, run_id);
+
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (run_id, stage)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS route_weights (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    route TEXT NOT NULL,
+    resources INTEGER NOT NULL,
+    raw INTEGER NOT NULL,
+    transfer INTEGER NOT NULL,
+    PRIMARY KEY (run_id, route)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS route_weights_by_route ON route_weights (route, run_id);
+"""
+
+def history_path(project_path: Path, db: str | Path) -> Path:
+    """Database path; relative paths are relative to the project."""
+    db = Path(db)
+    return db if db.is_absolute() else project_path / db
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA foreign_keys = ON')
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"{db_path} was written by a newer astro-optimizer (schema {version})")
+    conn.executescript(SCHEMA)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return conn
+
+def chunks(items: list, size: int = PARAMETER_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def git_state(project_path: Path) -> tuple[str | None, bool]:
+    """(HEAD commit, whether tracked files have uncommitted changes), or (None, False) outside git."""
+    try:
+        commit = git(project_path, 'rev-parse', 'HEAD').decode().strip()
+        dirty = bool(git(project_path, 'status', '--porcelain', '--untracked-files=no', '--', '.').strip())
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None, False
+    return commit, dirty
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+def record_run(db_path: Path, project_path: Path, tool: str, findings: list[dict], summary: dict,
+               timings: dict[str, float] | None = None, routes: list[dict] | None = None) -> int:
+    """
+    Store one run. `findings` must be fingerprinted (report_formats.add_fingerprints).
+    `routes` are compress_assets route rows. Returns the run id.
+    """
+    commit, dirty = git_state(project_path)
+    recorded_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    conn = connect(db_path)
+    try:
+        with conn:
+            run_id = conn.execute(
+                'INSERT INTO runs (project, tool, git_commit, dirty, recorded_at, summary) VALUES (?, ?, ?, ?, ?, ?)',
+                (str(project_path), tool, commit, int(dirty), recorded_at, json.dumps(summary, sort_keys=True)),
+            ).lastrowid
+            
+            conn.executemany(
+                'INSERT INTO findings (fingerprint, rule, severity, file, message) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (fingerprint) DO UPDATE SET severity = excluded.severity, message = excluded.message',
+                [(f['fingerprint'], rule_id(f), f['severity'], f['file'], finding_message(f)) for f in findings],
+            )
+            ids = {}
+            for batch in chunks([f['fingerprint'] for f in findings]):
+                ids.update(conn.execute(
+                    f"SELECT fingerprint, id FROM findings WHERE fingerprint IN ({','.join('?' * len(batch))})", batch,
+                ).fetchall())
+            conn.executemany(
+                'INSERT OR IGNORE INTO run_findings (run_id, finding_id, line) VALUES (?, ?, ?)',
+                [(run_id, ids[f['fingerprint']], f.get('line')) for f in findings],
+            )
+            conn.executemany(
+                'INSERT INTO timings (run_id, stage, seconds) VALUES (?, ?, ?)',
+                [(run_id, stage, round(seconds, 4)) for stage, seconds in (timings or {}).items()],
+            )
+            conn.executemany(
+                'INSERT INTO route_weights (run_id, route, resources, raw, transfer) VALUES (?, ?, ?, ?, ?)',
+                [(run_id, r['route'], r['resources'], r['raw'], r['br'] if r.get('br') is not None else r['gzip'])
+                 for r in routes or []],
+            )
+    finally:
+        conn.close()
+    return run_id
+
+def record_project(project_path: Path, db_path: Path, jobs: int | None = None) -> dict:
+    """Analyze the project, measure dist/ route weights when there is a build, and store the run."""
+    timings = {}
+    started = time.perf_counter()
+    report = analyze_project(str(project_path))
+    timings['analyze'] = time.perf_counter() - started
+    findings = add_fingerprints([f.to_dict() for f in report.findings], project_path)
+    
+    routes = None
+    if find_dist(project_path):
+        started = time.perf_counter()
+        routes = compress_project(str(project_path), jobs=jobs).get('routes')
+        timings['dist_weights'] = time.perf_counter() - started
+    
+    run_id = record_run(db_path, project_path, DEFAULT_TOOL, findings, report.summary, timings, routes)
+    return {'run': run_id, 'findings': len(findings), 'routes': len(routes or []),
+            'timings': {k: round(v, 3) for k, v in timings.items()}}
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+def run_info(row: sqlite3.Row) -> dict:
+    return {'id': row['id'], 'commit': row['git_commit'], 'dirty': bool(row['dirty']), 'recorded_at': row['recorded_at']}
+
+def resolve_run(conn: sqlite3.Connection, project: str, tool: str, ref: str) -> sqlite3.Row:
+    """
+    A run by id, "latest", "previous" (the one before latest) or git commit
+    prefix (the latest run at that commit).
+    """
+    base = 'SELECT * FROM runs WHERE project = ? AND tool = ?'
+    if ref in ('latest', 'previous'):
+        row = conn.execute(f'{base} ORDER BY recorded_at DESC, id DESC LIMIT 1 OFFSET ?',
+                           (project, tool, 0 if ref == 'latest' else 1)).fetchone()
+    elif ref.isdigit() and len(ref) < 7:
+        row = conn.execute(f'{base} AND id = ?', (project, tool, int(ref))).fetchone()
+    else:
+        row = conn.execute(f"{base} AND git_commit >= ? AND git_commit < ? ORDER BY recorded_at DESC, id DESC LIMIT 1",
+                           (project, tool, ref.lower(), ref.lower() + 'g')).fetchone()
+    if row is None:
+        raise LookupError(f"No {tool} run matches {ref!r} for {project}")
+    return row
+
+def list_runs(conn: sqlite3.Connection, project: str, tool: str, limit: int) -> list[dict]:
+    rows = conn.execute(
+        'SELECT r.*, (SELECT COUNT(*) FROM run_findings WHERE run_id = r.id) AS findings '
+        'FROM runs r WHERE project = ? AND tool = ? ORDER BY recorded_at DESC, id DESC LIMIT ?',
+        (project, tool, limit),
+    ).fetchall()
+    return [{**run_info(r), 'findings': r['findings'], 'summary': json.loads(r['summary'])} for r in rows]
+
+def flatten(summary: dict, prefix: str = '') -> dict[str, float]:
+    """Numeric summary values keyed by dotted path, e.g. "by_severity.high"."""
+    out = {}
+    for key, value in summary.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[f"{prefix}{key}"] = value
+    return out
+
+def run_findings(conn: sqlite3.Connection, run_id: int) -> dict[int, dict]:
+    rows = conn.execute(
+        'SELECT f.id, f.fingerprint, f.rule, f.severity, f.file, f.message, rf.line '
+        'FROM run_findings rf JOIN findings f ON f.id = rf.finding_id WHERE rf.run_id = ?',
+        (run_id,),
+    ).fetchall()
+    return {r['id']: {k: r[k] for k in ('fingerprint', 'rule', 'severity', 'file', 'line', 'message')} for r in rows}
+
+def keyed(conn: sqlite3.Connection, sql: str, run_id: int) -> dict:
+    return {row[0]: row[1:] for row in conn.execute(sql, (run_id,)).fetchall()}
+
+def compare_runs(conn: sqlite3.Connection, before: sqlite3.Row, after: sqlite3.Row) -> dict:
+    """Findings, summary, timing and route differences from `before` to `after`."""
+    old, new = run_findings(conn, before['id']), run_findings(conn, after['id'])
+    
+    old_summary, new_summary = flatten(json.loads(before['summary'])), flatten(json.loads(after['summary']))
+    summary = {
+        key: {'before': old_summary.get(key), 'after': new_summary.get(key),
+              'delta': new_summary.get(key, 0) - old_summary.get(key, 0)}
+        for key in sorted(old_summary.keys() | new_summary.keys())
+    }
+    
+    timing_sql = 'SELECT stage, seconds FROM timings WHERE run_id = ?'
+    old_times, new_times = keyed(conn, timing_sql, before['id']), keyed(conn, timing_sql, after['id'])
+    timings = {
+        stage: {'before': old_times[stage][0], 'after': new_times[stage][0],
+                'delta': round(new_times[stage][0] - old_times[stage][0], 4)}
+        for stage in sorted(old_times.keys() & new_times.keys())
+    }
+    
+    route_sql = 'SELECT route, transfer, raw, resources FROM route_weights WHERE run_id = ?'
+    old_routes, new_routes = keyed(conn, route_sql, before['id']), keyed(conn, route_sql, after['id'])
+    routes = []
+    # A run recorded without a build has no route data; that is not every route being added or removed
+    for route in sorted(old_routes.keys() | new_routes.keys()) if old_routes and new_routes else ():
+        was = old_routes.get(route, (0, 0, 0))
+        now = new_routes.get(route, (0, 0, 0))
+        routes.append({
+            'route': route,
+            'status': 'added' if route not in old_routes else 'removed' if route not in new_routes else 'changed',
+            'transfer_before': was[0], 'transfer_after': now[0], 'transfer_delta': now[0] - was[0],
+            'raw_delta': now[1] - was[1], 'resources_delta': now[2] - was[2],
+        })
+    
+    return {
+        'before': run_info(before),
+        'after': run_info(after),
+        'new': [new[i] for i in sorted(new.keys() - old.keys())],
+        'resolved': [old[i] for i in sorted(old.keys() - new.keys())],
+        'summary': summary,
+        'timings': timings,
+        'routes': [r for r in routes if r['status'] != 'changed' or r['transfer_delta'] or r['resources_delta']],
+    }
+
+def trend(conn: sqlite3.Connection, project: str, tool: str, by: str, name: str | None, limit: int) -> dict:
+    """
+    Findings per rule (by="rule") or transfer bytes per route (by="route") for
+    the last `limit` runs, oldest first. Runs without route data show None.
+    """
+    runs = conn.execute(
+        'SELECT * FROM runs WHERE project = ? AND tool = ? ORDER BY recorded_at DESC, id DESC LIMIT ?',
+        (project, tool, limit),
+    ).fetchall()[::-1]
+    ids = [r['id'] for r in runs]
+    position = {run_id: i for i, run_id in enumerate(ids)}
+    placeholders = ','.join('?' * len(ids))
+    
+    if by == 'rule':
+        sql = (f'SELECT rf.run_id, f.rule, COUNT(*) FROM run_findings rf JOIN findings f ON f.id = rf.finding_id '
+               f'WHERE rf.run_id IN ({placeholders})' + (' AND f.rule = ?' if name else '') +
+               ' GROUP BY rf.run_id, f.rule')
+        empty = 0
+    else:
+        sql = (f'SELECT run_id, route, transfer FROM route_weights WHERE run_id IN ({placeholders})' +
+               (' AND route = ?' if name else ''))
+        empty = None
+    rows = conn.execute(sql, ids + ([name] if name else [])).fetchall() if ids else []
+    
+    series: dict[str, list] = {}
+    for run_id, key, value in rows:
+        series.setdefault(key, [empty] * len(ids))[position[run_id]] = value
+    if name and name not in series and ids:
+        series[name] = [empty] * len(ids)
+    return {
+        'by': by,
+        'runs': [run_info(r) for r in runs],
+        'series': {key: series[key] for key in sorted(series)},
+    }
+
+def find_regressions(conn: sqlite3.Connection, before: sqlite3.Row, after: sqlite3.Row,
+                     threshold_pct: float = ROUTE_GROWTH_PCT) -> dict:
+    """New findings, routes that got heavier than the threshold, and large stage slowdowns."""
+    diff = compare_runs(conn, before, after)
+    routes = [
+        r for r in diff['routes']
+        if r['status'] == 'changed' and r['transfer_delta'] >= ROUTE_GROWTH_MIN_BYTES
+        and r['transfer_delta'] * 100 >= threshold_pct * r['transfer_before']
+    ]
+    timings = [
+        {'stage': stage, **t} for stage, t in diff['timings'].items()
+        if t['delta'] >= TIMING_GROWTH_MIN_SECONDS and t['after'] >= TIMING_GROWTH_RATIO * t['before']
+    ]
+    return {
+        'before': diff['before'],
+        'after': diff['after'],
+        'new_findings': diff['new'],
+        'heavier_routes': routes,
+        'slower_stages': timings,
+        'summary': {
+            'new_findings': len(diff['new']),
+            'new_by_severity': {s: len([f for f in diff['new'] if f['severity'] == s]) for s in ('high', 'medium', 'low')},
+            'heavier_routes': len(routes),
+            'slower_stages': len(timings),
+            'regressed': bool(diff['new'] or routes or timings),
+        },
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Record analysis runs and query trends and regressions')
+    parser.add_argument('--db', default=HISTORY_DB,
+                        help='History database, relative to the project (default: %(default)s)')
+    parser.add_argument('--tool', default=DEFAULT_TOOL,
+                        help='Which tool\'s runs to query (default: %(default)s; '
+                             'detect_js_patterns.py records as astro-optimizer-js-patterns)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    def command(name: str, help: str):
+        sub = commands.add_parser(name, help=help)
+        sub.add_argument('project_path', help='Path to Astro project (or a directory inside it)')
+        return sub
+    
+    record = command('record', help='Analyze the project and store the run')
+    record.add_argument('--jobs', type=int, default=None, help='Worker processes for dist/ weights (default: CPU count)')
+    
+    runs = command('runs', help='List recorded runs, newest first')
+    runs.add_argument('--limit', type=int, default=20)
+    
+    compare = command('compare', help='Compare two runs')
+    compare.add_argument('before', help='Run id, git commit prefix, "latest" or "previous"')
+    compare.add_argument('after', nargs='?', default='latest', help='(default: %(default)s)')
+    
+    trends = command('trend', help='Findings per rule or transfer bytes per route across runs')
+    group = trends.add_mutually_exclusive_group(required=True)
+    group.add_argument('--rule', nargs='?', const='', metavar='RULE', help='Per rule, or only RULE')
+    group.add_argument('--route', nargs='?', const='', metavar='ROUTE', help='Per route, or only ROUTE')
+    trends.add_argument('--limit', type=int, default=30, help='Most recent runs to include (default: %(default)s)')
+    
+    regress = command('regressions', help='Exit 1 if `run` regressed against `against`')
+    regress.add_argument('--run', default='latest', help='(default: %(default)s)')
+    regress.add_argument('--against', default='previous', help='(default: %(default)s)')
+    regress.add_argument('--threshold', type=float, default=ROUTE_GROWTH_PCT,
+                         help='Route transfer growth, in percent, that counts as a regression (default: %(default)s)')
+    
+    args = parser.parse_args()
+    
+    project = find_astro_root(args.project_path)
+    if not project:
+        print(f"Error: Could not find Astro project at {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    db_path = history_path(project, args.db)
+    
+    if args.command == 'record':
+        print(json.dumps(record_project(project, db_path, args.jobs), indent=2))
+        return
+    
+    if not db_path.exists():
+        print(f"Error: No run history at {db_path}. Record a run first.", file=sys.stderr)
+        sys.exit(1)
+    
+    conn = connect(db_path)
+    status = 0
+    try:
+        if args.command == 'runs':
+            output = list_runs(conn, str(project), args.tool, args.limit)
+        elif args.command == 'compare':
+            output = compare_runs(conn, resolve_run(conn, str(project), args.tool, args.before),
+                                  resolve_run(conn, str(project), args.tool, args.after))
+        elif args.command == 'trend':
+            by, name = ('rule', args.rule) if args.rule is not None else ('route', args.route)
+            output = trend(conn, str(project), args.tool, by, name or None, args.limit)
+        else:
+            output = find_regressions(conn, resolve_run(conn, str(project), args.tool, args.against),
+                                      resolve_run(conn, str(project), args.tool, args.run), args.threshold)
+            status = 1 if output['summary']['regressed'] else 0
+    except LookupError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
+    
+    print(json.dumps(output, indent=2))
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Bounded-memory access to source files for the analyzers.
+
+Small files are read into memory. Files above LARGE_FILE_BYTES are memory-mapped,
+so substring prefilters and byte regexes run without decoding the whole file,
+and at most MAX_LARGE_FILES large files are mapped at once. Binary files and
+files that look generated or minified are not scanned; callers record them as
+SkippedFile entries so reports show what was left out.
+"""
+
+import re
+import mmap
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+
+LARGE_FILE_BYTES = 1 << 20  # 1 MiB
+MAX_LARGE_FILES = 2
+SNIFF_BYTES = 8192
+MINIFIED_LINE_LENGTH = 1000  # Average line length in the sniffed sample
+
+GENERATED_NAME_PATTERN = re.compile(r'\.(?:min|bundle)\.(?:[cm]?js|css)$|\.map$|(?:^|[-.])lock\.(?:json|ya?ml)$', re.IGNORECASE)
+GENERATED_MARKERS = (b'@generated', b'DO NOT EDIT', b'auto-generated', b'autogenerated')
+
+_large_slots = threading.BoundedSemaphore(MAX_LARGE_FILES)
+
+@dataclass
+class SkippedFile:
+    file: str
+    reason: str  # "binary", "generated" or "minified"
+    size: int
+
+def sniff(path: Path) -> tuple[int, str | None]:
+    """Return (size, skip reason or None) from the file name and its first few KB."""
+    size = path.stat().st_size
+    with open(path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES)
+    if b'\0' in sample:
+        return size, 'binary'
+    if GENERATED_NAME_PATTERN.search(path.name) or any(m in sample[:1024] for m in GENERATED_MARKERS):
+        return size, 'generated'
+    if len(sample) == SNIFF_BYTES and len(sample) / (sample.count(b'\n') + 1) > MINIFIED_LINE_LENGTH:
+        return size, 'minified'
+    return size, None
+
+class SourceBuffer:
+    """A file's bytes: read into memory when small, memory-mapped when large."""
+    
+    def __init__(self, path: Path, size: int | None = None):
+        size = path.stat().st_size if size is None else size
+        self.large = size > LARGE_FILE_BYTES
+        self._file = None
+        if self.large:
+            _large_slots.acquire()
+            try:
+                self._file = open(path, 'rb')
+                self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except Exception:
+                if self._file:
+                    self._file.close()
+                _large_slots.release()
+                raise
+        else:
+            self.data = path.read_bytes()
+    
+    @classmethod
+    def from_text(cls, text: str) -> 'SourceBuffer':
+        """A buffer over content that is not on disk, such as an unsaved editor document."""
+        buffer = cls.__new__(cls)
+        buffer.large, buffer._file, buffer.data = False, None, text.encode('utf-8')
+        return buffer
+    
+    def contains(self, *needles: bytes) -> bool:
+        """True if any needle occurs in the file."""
+        return any(self.data.find(needle) != -1 for needle in needles)
+    
+    def contains_folded(self, *needles: bytes) -> bool:
+        """
+        True if any lowercase needle occurs in the file, ignoring case. Cheaper
+        than an IGNORECASE regex, which tries every position; large files are
+        not copied and use one anyway.
+        """
+        if self.large:
+            return self.search(re.compile(b'|'.join(map(re.escape, needles)), re.IGNORECASE)) is not None
+        data = self.data.lower()
+        return any(data.find(needle) != -1 for needle in needles)
+    
+    def search(self, pattern: re.Pattern) -> re.Match | None:
+        """Run a bytes regex over the file (on the map itself for large files)."""
+        return pattern.search(self.data)
+    
+    def text(self) -> str:
+        return self.data[:].decode('utf-8', errors='ignore')
+    
+    def close(self):
+        if self.large and self._file:
+            self.data.close()
+            self._file.close()
+            self._file = None
+            _large_slots.release()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def open_source(path: Path, rel: str) -> tuple[SourceBuffer | None, SkippedFile | None]:
+    """Open a file for scanning, or explain why it is skipped."""
+    size, reason = sniff(path)
+    if reason:
+        return None, SkippedFile(file=rel, reason=reason, size=size)
+    return SourceBuffer(path, size), None
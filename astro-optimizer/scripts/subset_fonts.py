@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+Subsets web fonts to the glyphs the built site actually renders.
+
+Every page in dist/ is walked with the site's CSS applied: each element gets
+the web font family its matching rules (or its parent) declare, and its text
+is credited to that family. Each @font-face file is then subset to its
+family's characters (within the face's unicode-range) with fontTools, and
+the @font-face URLs and font preloads are rewritten to the subsets.
+
+Matching is deliberately generous: an element is credited to every family
+any of its matching rules names, including :hover and other state rules,
+and both cases of every letter are kept for text-transform. A font may
+keep a few unused glyphs, but it never loses one a page needs.
+
+Subsets are cached outside dist/ by (font hash, glyph set hash), so a rebuild
+only runs fontTools for fonts or texts that changed.
+"""
+
+import os
+import re
+import json
+import sys
+import shutil
+import hashlib
+from html.parser import HTMLParser
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from fontTools import subset as ft_subset
+except ImportError:  # Glyph usage is still reported without fontTools
+    ft_subset = None
+
+from walker import find_files
+from rules import parse_css
+from dist_pages import find_dist, iter_pages
+from estimate_lcp import SITE_ORIGIN, absolute, local_file
+
+DEFAULT_CACHE_DIR = '.astro-optimizer-cache'
+SUBSET_MARKER = '.subset-'
+ALWAYS_KEEP = '\u0020\u00a0'  # Space and no-break space are needed for any text
+
+URL_PATTERN = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''')
+STYLE_BLOCK_PATTERN = re.compile(r'(<style\b[^>]*>)(.*?)(</style\s*>)', re.DOTALL | re.IGNORECASE)
+PRELOAD_PATTERN = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+VAR_PATTERN = re.compile(r'var\(\s*(--[\w-]+)\s*(?:,\s*([^()]*(?:\([^()]*\)[^()]*)*))?\)')
+PSEUDO_PATTERN = re.compile(r'(?<!\\)::?[\w-]+(?:\([^()]*(?:\([^()]*\)[^()]*)*\))?')
+CONTENT_PATTERN = re.compile(r'''content\s*:\s*(["'])(.*?)\1''')
+SKIP_TEXT_TAGS = {'script', 'style', 'template'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+@dataclass
+class FontFace:
+    family: str                 # Lowercased, unquoted
+    url: str                    # Absolute (SITE_ORIGIN for same-site)
+    file: Path | None
+    ranges: list[tuple[int, int]] | None  # unicode-range, None for all
+
+@dataclass
+class SubsetResult:
+    family: str
+    font: str                   # dist-relative original
+    subset: str | None          # dist-relative subset, when written
+    codepoints: int
+    raw_bytes: int
+    subset_bytes: int | None = None
+    cached: bool = False
+    error: str | None = None
+
+@dataclass
+class SelectorRule:
+    tag: str | None
+    classes: frozenset[str]
+    element_id: str | None
+    families: tuple[str, ...]
+    conditional: bool  # Depends on state, attributes or ancestors we do not check
+
+# ---------------------------------------------------------------------------
+# CSS
+# ---------------------------------------------------------------------------
+
+def unquote(name: str) -> str:
+    return name.strip().strip('"\'').strip().lower()
+
+def parse_unicode_range(value: str) -> list[tuple[int, int]]:
+    ranges = []
+    for part in value.split(','):
+        part = part.strip().upper().removeprefix('U+')
+        if not part:
+            continue
+        if '?' in part:
+            ranges.append((int(part.replace('?', '0'), 16), int(part.replace('?', 'F'), 16)))
+        elif '-' in part:
+            low, high = part.split('-', 1)
+            ranges.append((int(low, 16), int(high.removeprefix('U+'), 16)))
+        else:
+            ranges.append((int(part, 16), int(part, 16)))
+    return ranges
+
+def declarations(body: str) -> dict[str, str]:
+    result = {}
+    for declaration in body.split(';'):
+        name, sep, value = declaration.partition(':')
+        if sep:
+            result[name.strip().lower()] = value.strip().removesuffix('!important').strip()
+    return result
+
+def resolve_vars(value: str, variables: dict[str, str], depth: int = 0) -> str:
+    if depth > 8 or 'var(' not in value:
+        return value
+    def replace(match):
+        return variables.get(match.group(1), match.group(2) or '')
+    return resolve_vars(VAR_PATTERN.sub(replace, value), variables, depth + 1)
+
+def family_list(props: dict[str, str], variables: dict[str, str]) -> list[str] | None:
+    """The font-family list a rule sets (from font-family or the font shorthand), or None."""
+    if 'font-family' in props:
+        value = resolve_vars(props['font-family'], variables)
+    elif 'font' in props:
+        value = resolve_vars(props['font'], variables)
+        # The family list follows the size (and optional /line-height)
+        match = re.search(r'[\d.]+(?:px|r?em|%|pt|vw|vh)(?:\s*/\s*\S+)?\s+(.+)$', value)
+        if not match:
+            return None
+        value = match.group(1)
+    else:
+        return None
+    if value.strip().lower() in ('inherit', 'unset', 'initial', 'revert', ''):
+        return None
+    return [unquote(name) for name in value.split(',')]
+
+def split_selectors(prelude: str) -> list[str]:
+    """Split a selector list on top-level commas."""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(prelude[start:i])
+            start = i + 1
+    parts.append(prelude[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+def key_compound(selector: str) -> tuple[str | None, frozenset[str], str | None, bool] | None:
+    """
+    The rightmost compound selector as (tag, classes, id, conditional).
+    Pseudo-classes and attribute selectors are dropped and ancestors ignored,
+    so the match only ever over-approximates; `conditional` records that
+    something was dropped.
+    """
+    selector = selector.replace(':root', 'html')
+    stripped = PSEUDO_PATTERN.sub('', re.sub(r'\[[^\]]*\]', '', selector))
+    compounds = [c for c in re.split(r'\s*[>+~]\s*|\s+', stripped.strip()) if c]
+    if not compounds:
+        return None
+    compound = compounds[-1]
+    tag = re.match(r'[a-zA-Z][\w-]*', compound)
+    classes = frozenset(re.sub(r'\\(.)', r'\1', c) for c in re.findall(r'\.((?:\\.|[\w-])+)', compound))
+    element_id = re.search(r'#((?:\\.|[\w-])+)', compound)
+    return (
+        tag.group().lower() if tag else None,
+        classes,
+        element_id.group(1) if element_id else None,
+        stripped.strip() != selector.strip() or len(compounds) > 1,
+    )
+
+class Stylesheet:
+    """Font faces and font-family rules from every stylesheet in dist/."""
+    
+    def __init__(self):
+        self.faces: list[FontFace] = []
+        self.rules: list[tuple[str, str]] = []  # (prelude, body) in source order
+        self.content_text = ''                  # Strings from `content:` declarations
+    
+    def add(self, css: str, css_url: str, dist: Path):
+        for block in parse_css(css):
+            prelude = block.prelude.strip()
+            if prelude.lower() == '@font-face':
+                props = declarations(block.body)
+                family = props.get('font-family')
+                urls = URL_PATTERN.findall(props.get('src', ''))
+                if not family or not urls:
+                    continue
+                # Browsers take the first format they support; every target supports woff2
+                url = next((u for _, u in urls if '.woff2' in u.lower()), urls[0][1])
+                url = absolute(url, css_url)
+                ranges = props.get('unicode-range')
+                self.faces.append(FontFace(
+                    family=unquote(family),
+                    url=url,
+                    file=local_file(url, dist),
+                    ranges=parse_unicode_range(ranges) if ranges else None,
+                ))
+            elif not prelude.startswith('@'):
+                self.rules.append((prelude, block.body))
+                for _, text in CONTENT_PATTERN.findall(block.body):
+                    self.content_text += text
+    
+    def selector_rules(self) -> dict[str, list[SelectorRule]]:
+        """Rules that set a web font, indexed by id, class, tag or "*" for lookup."""
+        variables: dict[str, str] = {}
+        for _, body in self.rules:
+            for name, value in declarations(body).items():
+                if name.startswith('--'):
+                    variables[name] = value
+        webfonts = {face.family for face in self.faces}
+        
+        index: dict[str, list[SelectorRule]] = {}
+        for prelude, body in self.rules:
+            families = family_list(declarations(body), variables)
+            if families is None:
+                continue
+            # The first family with an @font-face renders the text
+            chosen = next((f for f in families if f in webfonts), None)
+            for selector in split_selectors(prelude):
+                compound = key_compound(selector)
+                if compound is None:
+                    continue
+                tag, classes, element_id, conditional = compound
+                rule = SelectorRule(tag, classes, element_id, (chosen,) if chosen else (), conditional)
+                key = f"#{element_id}" if element_id else (f".{min(classes)}" if classes else (tag or '*'))
+                index.setdefault(key, []).append(rule)
+        return index
+
+# ---------------------------------------------------------------------------
+# Glyph usage
+# ---------------------------------------------------------------------------
+
+class _GlyphCollector(HTMLParser):
+    """Credits each text node to the font families of its element."""
+    
+    def __init__(self, index: dict[str, list[SelectorRule]], usage: dict[str, set[str]]):
+        super().__init__(convert_charrefs=True)
+        self.index = index
+        self.usage = usage
+        self.stack: list[tuple[str, tuple[str, ...]]] = [('', ())]
+    
+    def families_for(self, tag: str, attrs: dict[str, str | None], inherited: tuple[str, ...]) -> tuple[str, ...]:
+        """
+        Union of the families of every matching rule. Unless one of them
+        applies unconditionally, the inherited family may still show, so it
+        is kept too.
+        """
+        classes = set((attrs.get('class') or '').split())
+        element_id = attrs.get('id')
+        keys = ['*', tag] + [f".{c}" for c in classes] + ([f"#{element_id}"] if element_id else [])
+        matched: set[str] = set()
+        definite = False
+        for key in keys:
+            for rule in self.index.get(key, ()):
+                if rule.tag and rule.tag != tag:
+                    continue
+                if rule.element_id and rule.element_id != element_id:
+                    continue
+                if not rule.classes <= classes:
+                    continue
+                matched.update(rule.families)
+                definite = definite or not rule.conditional
+        inline = re.search(r'font-family\s*:\s*([^;]+)', attrs.get('style') or '', re.IGNORECASE)
+        if inline:
+            matched.add(unquote(inline.group(1).split(',')[0]))
+            definite = True
+        if not definite:
+            matched.update(inherited)
+        return tuple(sorted(matched))
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        # Rules that name no web font still reset the family away from the parent's
+        families = self.families_for(tag, attrs, self.stack[-1][1])
+        for name in ('placeholder', 'value'):
+            if attrs.get(name) and tag in ('input', 'textarea', 'button', 'option'):
+                self.credit(families, attrs[name])
+        if tag not in VOID_TAGS:
+            self.stack.append((tag, families))
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.stack.pop()
+    
+    def handle_endtag(self, tag):
+        if any(t == tag for t, _ in self.stack[1:]):
+            # Pop back to the matching element, tolerating unclosed children
+            while self.stack.pop()[0] != tag:
+                pass
+    
+    def handle_data(self, data):
+        tag, families = self.stack[-1]
+        if tag not in SKIP_TEXT_TAGS:
+            self.credit(families, data)
+    
+    def credit(self, families: tuple[str, ...], text: str):
+        for family in families:
+            self.usage.setdefault(family, set()).update(text)
+
+def with_case_variants(chars: set[str]) -> set[str]:
+    """Add both cases of every letter, since text-transform can change either way."""
+    variants = set(chars)
+    for char in chars:
+        variants.update(char.upper(), char.lower())
+    return {c for c in variants if len(c) == 1}
+
+def in_ranges(codepoint: int, ranges: list[tuple[int, int]] | None) -> bool:
+    return ranges is None or any(low <= codepoint <= high for low, high in ranges)
+
+def collect_stylesheet(dist: Path) -> tuple[Stylesheet, list[tuple[str, Path]]]:
+    """Load every dist/ stylesheet and inline <style> block. Returns it with the pages."""
+    sheet = Stylesheet()
+    for css_file in find_files(dist, ['.css'], gitignore=False):
+        url = SITE_ORIGIN + '/' + css_file.relative_to(dist).as_posix()
+        sheet.add(css_file.read_text(errors='ignore'), url, dist)
+    pages = list(iter_pages(dist))
+    for route, html_file in pages:
+        for match in STYLE_BLOCK_PATTERN.finditer(html_file.read_text(errors='ignore')):
+            sheet.add(match.group(2), SITE_ORIGIN + route, dist)
+    return sheet, pages
+
+def glyph_usage(sheet: Stylesheet, pages: list[tuple[str, Path]]) -> dict[str, set[str]]:
+    """Characters rendered in each web font family across every page."""
+    index = sheet.selector_rules()
+    usage: dict[str, set[str]] = {}
+    for _, html_file in pages:
+        collector = _GlyphCollector(index, usage)
+        collector.feed(html_file.read_text(errors='ignore'))
+        collector.close()
+    # Generated content (::before/::after) may use any family
+    for family in {face.family for face in sheet.faces}:
+        usage.setdefault(family, set()).update(sheet.content_text)
+    return usage
+
+# ---------------------------------------------------------------------------
+# Subsetting
+# ---------------------------------------------------------------------------
+
+def subset_name(font: Path, glyph_hash: str) -> str:
+    return f"{font.stem}{SUBSET_MARKER}{glyph_hash[:8]}{font.suffix}"
+
+def subset_font(font_path: str, family: str, codepoints: list[int], dist_path: str,
+                cache_path: str, write: bool) -> SubsetResult:
+    """Subset one font file (through the cache). Runs inside a worker process."""
+    font = Path(font_path)
+    data = font.read_bytes()
+    result = SubsetResult(
+        family=family,
+        font=font.relative_to(dist_path).as_posix(),
+        subset=None,
+        codepoints=len(codepoints),
+        raw_bytes=len(data),
+    )
+    font_hash = hashlib.sha256(data).hexdigest()
+    glyph_hash = hashlib.sha256(','.join(map(str, codepoints)).encode()).hexdigest()
+    blob = Path(cache_path) / f"{font_hash[:16]}-{glyph_hash[:16]}{font.suffix}"
+    
+    if blob.exists():
+        result.cached = True
+    elif ft_subset is None:
+        result.error = "fontTools is not installed (pip install fonttools brotli)"
+        return result
+    else:
+        try:
+            options = ft_subset.Options()
+            options.flavor = {'.woff2': 'woff2', '.woff': 'woff'}.get(font.suffix.lower())
+            options.layout_features = ['*']  # Keep kerning, ligatures and other features
+            options.notdef_outline = True
+            loaded = ft_subset.load_font(str(font), options)
+            subsetter = ft_subset.Subsetter(options)
+            subsetter.populate(unicodes=codepoints)
+            subsetter.subset(loaded)
+            # Temp file + rename so an interrupted run never leaves a truncated cache entry
+            tmp = blob.with_name(f"{blob.name}.{os.getpid()}.tmp")
+            ft_subset.save_font(loaded, str(tmp), options)
+            os.replace(tmp, blob)
+        except Exception as e:
+            result.error = str(e)
+            return result
+    
+    result.subset_bytes = blob.stat().st_size
+    if write and result.subset_bytes < len(data):
+        target = font.with_name(subset_name(font, glyph_hash))
+        shutil.copyfile(blob, target)
+        result.subset = target.relative_to(dist_path).as_posix()
+    return result
+
+# ---------------------------------------------------------------------------
+# Rewriting
+# ---------------------------------------------------------------------------
+
+def rewrite_font_urls(css: str, css_url: str, renamed: dict[str, str]) -> str:
+    """Point @font-face src URLs at their subsets (same directory, new file name)."""
+    def rewrite_block(block):
+        def rewrite_url(match):
+            url = absolute(match.group(2), css_url)
+            if url not in renamed:
+                return match.group(0)
+            token = match.group(2)
+            return f"url({match.group(1)}{token[:token.rfind('/') + 1]}{renamed[url]}{match.group(1)})"
+        return URL_PATTERN.sub(rewrite_url, block.group(0))
+    return re.sub(r'@font-face\s*\{[^}]*\}', rewrite_block, css, flags=re.IGNORECASE)
+
+def rewrite_preloads(html: str, page_url: str, renamed: dict[str, str]) -> str:
+    def rewrite_link(match):
+        tag = match.group(0)
+        if 'preload' not in tag.lower():
+            return tag
+        def rewrite_href(href):
+            url = absolute(href.group(2), page_url)
+            if url not in renamed:
+                return href.group(0)
+            token = href.group(2)
+            return f"href={href.group(1)}{token[:token.rfind('/') + 1]}{renamed[url]}{href.group(1)}"
+        return re.sub(r'''href=(["'])([^"']+)\1''', rewrite_href, tag)
+    return PRELOAD_PATTERN.sub(rewrite_link, html)
+
+def replace_text(file: Path, content: str):
+    tmp = file.with_name(f".{file.name}.tmp")
+    tmp.write_text(content)
+    os.replace(tmp, file)
+
+def rewrite_dist(dist: Path, pages: list[tuple[str, Path]], renamed: dict[str, str]) -> list[str]:
+    """Rewrite stylesheets, inline <style> blocks and font preloads. Returns the files changed."""
+    changed = []
+    for css_file in find_files(dist, ['.css'], gitignore=False):
+        css = css_file.read_text(errors='ignore')
+        url = SITE_ORIGIN + '/' + css_file.relative_to(dist).as_posix()
+        updated = rewrite_font_urls(css, url, renamed)
+        if updated != css:
+            replace_text(css_file, updated)
+            changed.append(css_file.relative_to(dist).as_posix())
+    for route, html_file in pages:
+        html = html_file.read_text(errors='ignore')
+        page_url = SITE_ORIGIN + route
+        updated = STYLE_BLOCK_PATTERN.sub(
+            lambda m: m.group(1) + rewrite_font_urls(m.group(2), page_url, renamed) + m.group(3), html)
+        updated = rewrite_preloads(updated, page_url, renamed)
+        if updated != html:
+            replace_text(html_file, updated)
+            changed.append(html_file.relative_to(dist).as_posix())
+    return changed
+
+def subset_project(project_path: str, write: bool = False, jobs: int | None = None,
+                   cache_dir: str = DEFAULT_CACHE_DIR) -> dict:
+    """Subset every same-site web font to the glyphs its family renders."""
+    path = Path(project_path).resolve()
+    dist = find_dist(path)
+    if not dist:
+        return {'error': f"No build output found at {path / 'dist'}. Run `astro build` first."}
+    if ft_subset is None:
+        print("Warning: fontTools not installed (pip install fonttools brotli), reporting glyph usage only",
+              file=sys.stderr)
+    
+    cache = path / cache_dir / 'fonts'
+    cache.mkdir(parents=True, exist_ok=True)
+    
+    sheet, pages = collect_stylesheet(dist)
+    usage = glyph_usage(sheet, pages)
+    
+    jobs_args = []
+    skipped = []
+    seen = set()
+    for face in sheet.faces:
+        if face.file is None or face.url in seen:
+            continue
+        seen.add(face.url)
+        rel = face.file.relative_to(dist).as_posix()
+        if SUBSET_MARKER in face.file.name:
+            skipped.append({'font': rel, 'reason': 'already subset'})
+            continue
+        chars = with_case_variants(usage.get(face.family, set()))
+        codepoints = sorted(ord(c) for c in chars if in_ranges(ord(c), face.ranges))
+        if not codepoints:
+            # The browser never downloads a face none of the text needs
+            skipped.append({'font': rel, 'reason': 'no rendered text in this face'})
+            continue
+        codepoints = sorted(set(codepoints) | {ord(c) for c in ALWAYS_KEEP if in_ranges(ord(c), face.ranges)})
+        jobs_args.append((str(face.file), face.family, codepoints))
+    
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(subset_font, f, family, cps, str(dist), str(cache), write)
+                   for f, family, cps in jobs_args]
+        results = [future.result() for future in futures]
+    
+    renamed = {
+        SITE_ORIGIN + '/' + r.font: Path(r.subset).name
+        for r in results if r.subset
+    }
+    rewritten = rewrite_dist(dist, pages, renamed) if write and renamed else []
+    
+    measured = [r for r in results if r.subset_bytes is not None]
+    return {
+        'project_path': str(path),
+        'cache_dir': os.path.relpath(cache, path),
+        'families': {family: ''.join(sorted(chars)) for family, chars in sorted(usage.items()) if chars},
+        'fonts': [asdict(r) for r in results],
+        'skipped': skipped,
+        'rewritten': rewritten,
+        'summary': {
+            'faces': len(results),
+            'cached': len([r for r in results if r.cached]),
+            'errors': len([r for r in results if r.error]),
+            'raw_bytes': sum(r.raw_bytes for r in measured),
+            'subset_bytes': sum(r.subset_bytes for r in measured),
+            'saved_bytes': sum(max(0, r.raw_bytes - r.subset_bytes) for r in measured),
+            'written': write,
+        }
+    }
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Subset built web fonts to the glyphs each page renders')
+    parser.add_argument('project_path', help='Path to Astro project (built with `astro build`)')
+    parser.add_argument('--write', action='store_true',
+                        help='Write subset fonts into dist/ and rewrite @font-face URLs and font preloads')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Subset cache relative to the project (default: %(default)s)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.project_path).exists():
+        print(f"Error: Path does not exist: {args.project_path}", file=sys.stderr)
+        sys.exit(1)
+    
+    result = subset_project(args.project_path, args.write, args.jobs, args.cache_dir)
+    print(json.dumps(result, indent=2))
+    if 'error' in result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
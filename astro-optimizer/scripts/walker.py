@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+The directory walk shared by every script.
+
+One os.scandir pass per root. Ignored directories are pruned before they are
+entered, so node_modules/, dist/ and anything matched by .gitignore cost one
+directory entry each rather than a full descent. Files are grouped by
+extension as they are found, so a caller interested in several file types
+still walks the tree once.
+
+What is ignored:
+  - DEFAULT_IGNORE (dependency, build and tool directories), by name at any depth
+  - .gitignore files from the project root down, with git's matching rules
+    (anchored and dir-only patterns, `**`, negation)
+  - the project's .astro-optimizer/ignore, same syntax, relative to the project
+  - extra names or patterns passed by the caller
+
+Build output walks (dist/) pass gitignore=False, since dist/ itself is
+normally gitignored.
+"""
+
+import os
+import re
+from pathlib import Path
+from functools import lru_cache
+
+DEFAULT_IGNORE = (
+    'node_modules', 'dist', '.git', '.astro', '.vercel', '.netlify',
+    '.astro-optimizer-backups', '.astro-optimizer-cache', '__pycache__',
+)
+IGNORE_FILE = '.astro-optimizer/ignore'
+
+# (regex, negated, directories only)
+Pattern = tuple[re.Pattern, bool, bool]
+
+def translate(glob: str) -> str:
+    """Regex body for one gitignore glob (without anchoring)."""
+    out = []
+    i = 0
+    while i < len(glob):
+        char = glob[i]
+        if glob.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+            continue
+        if glob.startswith('/**', i) and i + 3 == len(glob):
+            out.append('/.*')
+            i += 3
+            continue
+        if glob.startswith('**', i):
+            out.append('.*')
+            i += 2
+            continue
+        if char == '*':
+            out.append('[^/]*')
+        elif char == '?':
+            out.append('[^/]')
+        elif char == '[':
+            end = glob.find(']', i + 2)
+            if end == -1:
+                out.append(r'\[')
+            else:
+                body = glob[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end
+        elif char == '\\' and i + 1 < len(glob):
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(char))
+        i += 1
+    return ''.join(out)
+
+def parse_ignore(text: str) -> list[Pattern]:
+    """Parse gitignore syntax into patterns matched against paths relative to the file's directory."""
+    patterns = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to the ignore file's directory
+        anchored = '/' in line
+        body = translate(line.lstrip('/'))
+        regex = re.compile(('^' if anchored else '(?:^|.*/)') + body + '$')
+        patterns.append((regex, negated, dir_only))
+    return patterns
+
+@lru_cache(maxsize=256)
+def _load_ignore_file(path: str, mtime: float) -> tuple[Pattern, ...]:
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        return tuple(parse_ignore(f.read()))
+
+def load_ignore_file(path: Path) -> tuple[Pattern, ...]:
+    try:
+        return _load_ignore_file(str(path), path.stat().st_mtime)
+    except OSError:
+        return ()
+
+def is_ignored(rules: list[tuple[str, tuple[Pattern, ...]]], path: str, is_dir: bool) -> bool:
+    """Apply ignore files outermost first; the last matching pattern decides."""
+    ignored = False
+    for base, patterns in rules:
+        rel = path[len(base):]
+        for regex, negated, dir_only in patterns:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel):
+                ignored = not negated
+    return ignored
+
+def _base(directory: str) -> str:
+    return directory.rstrip(os.sep) + os.sep
+
+def outer_ignore_rules(root: Path, project: Path) -> list[tuple[str, tuple[Pattern, ...]]]:
+    """Ignore files that apply to root from above: .gitignore files from project down to root's parent, and IGNORE_FILE."""
+    rules = []
+    for directory in reversed(root.parents):
+        if not directory.is_relative_to(project):
+            continue
+        patterns = load_ignore_file(directory / '.gitignore')
+        if patterns:
+            rules.append((_base(str(directory)), patterns))
+    patterns = load_ignore_file(project / IGNORE_FILE)
+    if patterns:
+        rules.append((_base(str(project)), patterns))
+    return rules
+
+def walk(root: Path, extensions=None, *, project: Path | None = None, ignore=(),
+         gitignore: bool = True) -> dict[str, list[Path]]:
+    """
+    Walk root once and return {extension: sorted files}, extensions lowercased
+    with their dot ("" for files without one). With `extensions`, only those
+    are collected. `project` is where .gitignore lookup starts (default: root).
+    `ignore` adds names or globs matched against entry names at any depth.
+    """
+    root = Path(root)
+    project = Path(project) if project is not None else root
+    wanted = {e.lower() for e in extensions} if extensions is not None else None
+    names = set(DEFAULT_IGNORE)
+    globs = [re.compile(translate(p) + '$') for p in ignore if any(c in p for c in '*?[')]
+    names.update(p for p in ignore if not any(c in p for c in '*?['))
+    
+    groups: dict[str, list[Path]] = {}
+    if not root.is_dir():
+        return groups
+    
+    stack = [(str(root), outer_ignore_rules(root, project) if gitignore else [])]
+    while stack:
+        directory, rules = stack.pop()
+        if gitignore:
+            patterns = load_ignore_file(Path(directory) / '.gitignore')
+            if patterns:
+                rules = rules + [(_base(directory), patterns)]
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if name in names or any(g.match(name) for g in globs):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if rules and is_ignored(rules, entry.path, is_dir):
+                    continue
+                if is_dir:
+                    stack.append((entry.path, rules))
+                    continue
+                ext = os.path.splitext(name)[1].lower()
+                if wanted is not None and ext not in wanted:
+                    continue
+                if entry.is_file():
+                    groups.setdefault(ext, []).append(Path(entry.path))
+    
+    for files in groups.values():
+        files.sort()
+    return groups
+
+def find_files(root: Path, extensions=None, **options) -> list[Path]:
+    """Files under root with one of the extensions, sorted by path. Same options as walk()."""
+    return sorted(f for files in walk(root, extensions, **options).values() for f in files)
@@ -0,0 +1,81 @@
+"""
+Regression checks for analyze.py --since. Run from the repository root:
+    
+    python3 -m unittest discover astro-optimizer/tests
+"""
+
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from analyze import analyze_since, analyze_project
+
+SECTION = '''<section class="block">
+  <h2>Section {i}</h2>
+  <p>{text}</p>
+  <img src="/photo-{i}.png" alt="" width="800" height="1200">
+</section>
+'''
+
+def git(root: Path, *args: str):
+    subprocess.run(['git', '-C', str(root), *args], check=True, capture_output=True)
+
+class SinceProjectChecksTest(unittest.TestCase):
+    """A global CSS change re-runs project rules on both sides; unrelated edits must not add findings."""
+    
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        files = {
+            'astro.config.mjs': 'export default {};\n',
+            'tsconfig.json': json.dumps({'compilerOptions': {'baseUrl': '.', 'paths': {'@/*': ['src/*']}}}),
+            'src/styles/global.css': 'body { margin: 0; }\n',
+            # The sections live in a component reached only through the @/ alias
+            'src/components/Sections.astro': ''.join(
+                SECTION.format(i=i, text='Lorem ipsum dolor sit amet. ' * 40) for i in range(12)),
+            # global.css is global because a layout imports it
+            'src/layouts/Base.astro': '---\nimport "../styles/global.css";\n---\n<html><head></head><body><slot /></body></html>\n',
+            'src/pages/index.astro': '---\nimport Base from "../layouts/Base.astro";\n'
+                                     'import Sections from "@/components/Sections.astro";\n---\n'
+                                     '<Base><main>\n<Sections />\n</main></Base>\n',
+            'src/pages/about.astro': '---\nimport Base from "../layouts/Base.astro";\n---\n<Base><p>About</p></Base>\n',
+        }
+        for rel, text in files.items():
+            (self.root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel).write_text(text)
+        git(self.root, 'init', '-q')
+        git(self.root, 'add', '-A')
+        git(self.root, '-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'init')
+    
+    def test_global_css_comment_adds_no_findings(self):
+        project_types = {f.type for f in analyze_project(str(self.root)).findings}
+        # The fixture only guards the regression if a project rule reports on it
+        self.assertIn('css_content_visibility', project_types)
+        
+        with open(self.root / 'src/styles/global.css', 'a') as f:
+            f.write('/* a comment */\n')
+        result = analyze_since(str(self.root), 'HEAD')
+        
+        self.assertTrue(result['project_checks'])
+        self.assertEqual(result['new'], [])
+        self.assertEqual(result['resolved'], [])
+    
+    def test_component_edit_rechecks_only_its_pages(self):
+        with open(self.root / 'src/components/Sections.astro', 'a') as f:
+            f.write(SECTION.format(i=12, text='More text. ' * 40))
+        result = analyze_since(str(self.root), 'HEAD')
+        
+        self.assertFalse(result['project_checks'])
+        self.assertEqual(result['rechecked_pages'], ['src/pages/index.astro'])
+        new = [(f['type'], f['file']) for f in result['new']]
+        self.assertIn(('image_loading', 'src/components/Sections.astro'), new)
+        self.assertEqual(result['resolved'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Checks for apply_optimizations.py's batch commit, --resume and --rollback. Run
+from the repository root:
+    
+    python3 -m unittest discover astro-optimizer/tests
+"""
+
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import apply_optimizations
+from apply_optimizations import (optimize_project, resume_run, rollback_run, load_manifest, temp_path,
+                                 BACKUP_DIR, MANIFEST_NAME)
+
+FILES = {
+    'src/pages/index.astro': '---\n---\n<html><head></head><body><img src="/a.png" alt="" width="10" height="10"></body></html>\n',
+    'src/pages/about.astro': '---\n---\n<p>About</p>\n<img src="/b.png" alt="" width="10" height="10">\n',
+    'src/styles/global.css': '@font-face { font-family: X; src: url(/x.woff2); }\n',
+}
+
+class Interrupted(Exception):
+    pass
+
+class ApplyRunTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        for rel, text in FILES.items():
+            (self.root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel).write_text(text)
+    
+    def contents(self) -> dict[str, bytes]:
+        return {rel: (self.root / rel).read_bytes() for rel in FILES}
+    
+    def manifest(self) -> dict:
+        return load_manifest(self.root / BACKUP_DIR / MANIFEST_NAME)
+    
+    def applied_contents(self) -> dict[str, bytes]:
+        """What an uninterrupted run writes, from a copy of the fixture."""
+        copy = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, copy)
+        for rel, text in FILES.items():
+            (copy / rel).parent.mkdir(parents=True, exist_ok=True)
+            (copy / rel).write_text(text)
+        optimize_project(str(copy), jobs=1)
+        return {rel: (copy / rel).read_bytes() for rel in FILES}
+    
+    def test_interrupted_commit_is_resumed(self):
+        commit_files = apply_optimizations.commit_files
+        
+        def crash_after_first_file(contents):
+            # Dies between renames: one file is new, the next one's temp file is left behind
+            first, second = list(contents)[:2]
+            commit_files({first: contents[first]})
+            temp_path(second).write_bytes(contents[second][:5])
+            raise Interrupted()
+        
+        with mock.patch.object(apply_optimizations, 'commit_files', crash_after_first_file):
+            with self.assertRaises(Interrupted):
+                optimize_project(str(self.root), jobs=1)
+        self.assertEqual(self.manifest()['status'], 'pending')
+        
+        blocked = optimize_project(str(self.root), jobs=1)
+        self.assertEqual(blocked['files_modified'], [])
+        self.assertEqual(len(blocked['errors']), 1)
+        
+        result = resume_run(str(self.root), jobs=1)
+        
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(len(result['already_applied']), 1)
+        self.assertEqual(len(result['applied']), len(FILES) - 1)
+        self.assertEqual(self.manifest()['status'], 'complete')
+        self.assertEqual(self.contents(), self.applied_contents())
+        self.assertEqual([p for p in self.root.rglob('*') if p.name.endswith(apply_optimizations.TMP_SUFFIX)], [])
+    
+    def test_rollback_restores_identical_files(self):
+        original = self.contents()
+        applied = optimize_project(str(self.root), jobs=1)
+        self.assertEqual(len(applied['files_modified']), len(FILES))
+        self.assertNotEqual(self.contents(), original)
+        
+        result = rollback_run(str(self.root))
+        
+        self.assertEqual(sorted(result['restored']), sorted(FILES))
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(self.contents(), original)
+        self.assertEqual(self.manifest()['status'], 'rolled_back')
+    
+    def test_second_apply_is_a_no_op(self):
+        optimize_project(str(self.root), jobs=1)
+        applied = self.contents()
+        manifest = self.manifest()
+        
+        second = optimize_project(str(self.root), jobs=1)
+        
+        self.assertEqual(second['files_modified'], [])
+        self.assertEqual(second['total_changes'], 0)
+        self.assertEqual(self.contents(), applied)
+        self.assertEqual(self.manifest(), manifest)
+
+if __name__ == '__main__':
+    unittest.main()
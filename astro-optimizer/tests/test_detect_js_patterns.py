@@ -0,0 +1,46 @@
+"""
+Checks for the script lexer in detect_js_patterns.py. Run from the repository root:
+    
+    python3 -m unittest discover astro-optimizer/tests
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from detect_js_patterns import lex_js, analyze_content
+
+def found(content: str, suffix: str = '.astro') -> list[tuple[str, int]]:
+    return [(f.pattern, f.line) for f in analyze_content(content, suffix, f'src/a{suffix}')]
+
+class LexerTest(unittest.TestCase):
+    
+    def test_comment_markers_inside_strings_and_regexes(self):
+        text = 'const a = "x // y"; // slideToggle\nconst r = /"/g; const s = `a ${"}"} b`;\n'
+        comments, strings = lex_js(text)
+        
+        self.assertEqual([text[s:e] for s, e in comments], ['// slideToggle'])
+        self.assertIn('"x // y"', [text[s:e] for s, e in strings])
+        self.assertIn('/"/g', [text[s:e] for s, e in strings])
+    
+    def test_only_script_code_matches(self):
+        content = ('---\n---\n<p>Call .slideToggle() to open</p>\n<script>\n'
+                   '// $(el).slideToggle()\nconst quote = /"/;\nconst s = "$(el).slideToggle()";\n'
+                   '$(el).slideToggle();\n</script>\n')
+        
+        self.assertEqual(found(content), [('accordion_toggle', 8)])
+    
+    def test_nothing_outside_code(self):
+        content = ('<p>.slideToggle</p>\n<script type="application/ld+json">{"a": ".slideToggle()"}</script>\n'
+                   '<script>/* $(el).slideToggle() */ const t = `${"$(el).slideToggle()"}`;</script>\n')
+        
+        self.assertEqual(found(content), [])
+    
+    def test_selector_patterns_match_in_strings(self):
+        self.assertEqual(found('const panel = document.querySelector(".accordion");\n', '.js'),
+                         [('accordion_toggle', 1)])
+
+if __name__ == '__main__':
+    unittest.main()
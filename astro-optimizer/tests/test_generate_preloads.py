@@ -0,0 +1,79 @@
+"""
+Checks for generate_preloads.py --apply. Run from the repository root:
+    
+    python3 -m unittest discover astro-optimizer/tests
+"""
+
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from generate_preloads import analyze_project, PRELOAD_BLOCK_START
+
+FILES = {
+    'src/styles/global.css': (
+        "@font-face { font-family: Inter; src: url('/fonts/inter.woff2') format('woff2'); }\n"
+        ".hero { background-image: url('/hero.jpg'); }\n"
+        ".splash-unused { background: url('/splash.jpg'); }\n"
+    ),
+    # The font preload is already written by hand in a component the layout imports
+    'src/components/Meta.astro': '<link rel="preload" href="/fonts/inter.woff2" as="font" type="font/woff2" crossorigin>\n',
+    'src/components/Hero.astro': '<div class="hero"><h1>Welcome</h1></div>\n',
+    'src/layouts/Base.astro': (
+        '---\nimport Meta from "../components/Meta.astro";\nimport "../styles/global.css";\n---\n'
+        '<html>\n  <head>\n    <Meta />\n  </head>\n  <body><slot /></body>\n</html>\n'
+    ),
+    'src/pages/index.astro': '---\nimport Base from "../layouts/Base.astro";\n---\n<Base><p>Home</p></Base>\n',
+    # A page with its own <head> that renders the .hero selector through a component
+    'src/pages/standalone.astro': (
+        '---\nimport Hero from "../components/Hero.astro";\n---\n'
+        '<html>\n  <head>\n    <title>Standalone</title>\n  </head>\n'
+        '  <body>\n    <img class="banner" src="/banner.jpg" alt="">\n    <Hero />\n  </body>\n</html>\n'
+    ),
+}
+
+class ApplyPreloadsTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        for rel, text in FILES.items():
+            (self.root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel).write_text(text)
+    
+    def backups(self) -> list[Path]:
+        return sorted((self.root / '.astro-optimizer-backups').rglob('*'))
+    
+    def test_second_apply_is_unchanged(self):
+        first = analyze_project(str(self.root), apply=True)['applied']
+        self.assertEqual(first['files']['src/pages/standalone.astro'], 'updated')
+        backups = self.backups()
+        contents = {rel: (self.root / rel).read_text() for rel in FILES}
+        
+        second = analyze_project(str(self.root), apply=True)['applied']
+        
+        self.assertEqual(set(second['files'].values()), {'unchanged'})
+        self.assertEqual({rel: (self.root / rel).read_text() for rel in FILES}, contents)
+        self.assertEqual(self.backups(), backups)
+    
+    def test_page_scope_css_image_goes_to_pages_using_the_selector(self):
+        applied = analyze_project(str(self.root), apply=True)['applied']
+        
+        standalone = (self.root / 'src/pages/standalone.astro').read_text()
+        self.assertIn('href="/hero.jpg"', standalone)
+        self.assertIn('href="/banner.jpg"', standalone)
+        self.assertEqual(standalone.count(PRELOAD_BLOCK_START), 1)
+        self.assertIn({'file': 'src/styles/global.css', 'href': '/splash.jpg',
+                       'reason': 'No page renders an element matching .splash-unused'}, applied['skipped'])
+    
+    def test_preload_in_imported_head_component_is_not_repeated(self):
+        analyze_project(str(self.root), apply=True)
+        
+        self.assertNotIn('/fonts/inter.woff2', (self.root / 'src/layouts/Base.astro').read_text())
+
+if __name__ == '__main__':
+    unittest.main()
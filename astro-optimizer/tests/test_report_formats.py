@@ -0,0 +1,64 @@
+"""
+Checks for finding fingerprints and baseline suppression. Run from the repository root:
+    
+    python3 -m unittest discover astro-optimizer/tests
+"""
+
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+SCRIPTS = Path(__file__).resolve().parent.parent / 'scripts'
+sys.path.insert(0, str(SCRIPTS))
+
+from report_formats import add_fingerprints
+
+PAGE = '---\n---\n<main>\n  <img src="/photo.png" alt="">\n</main>\n'
+
+class FingerprintTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        (self.root / 'src/pages').mkdir(parents=True)
+        (self.root / 'astro.config.mjs').write_text('export default {};\n')
+        self.page = self.root / 'src/pages/index.astro'
+        self.page.write_text(PAGE)
+    
+    def analyze(self, *args: str) -> tuple[int, dict]:
+        run = subprocess.run([sys.executable, str(SCRIPTS / 'analyze.py'), str(self.root), *args],
+                             capture_output=True, text=True)
+        return run.returncode, json.loads(run.stdout)
+    
+    def test_fingerprint_survives_line_shift(self):
+        finding = {'type': 'image_cls', 'file': 'src/pages/index.astro', 'line': 4, 'message': 'Image missing width/height'}
+        before = add_fingerprints([dict(finding)], self.root)[0]['fingerprint']
+        
+        self.page.write_text(PAGE.replace('<main>\n', '<main>\n  <h1>Title</h1>\n\n'))
+        after = add_fingerprints([dict(finding, line=6)], self.root)[0]['fingerprint']
+        
+        self.assertEqual(before, after)
+    
+    def test_baseline_suppresses_known_findings_only(self):
+        baseline = self.root / 'baseline.json'
+        self.analyze('--write-baseline', str(baseline))
+        
+        # Known finding moved down by an unrelated edit: suppressed, clean exit
+        self.page.write_text(PAGE.replace('<main>\n', '<main>\n  <h1>Title</h1>\n'))
+        code, output = self.analyze('--baseline', str(baseline))
+        self.assertEqual(code, 0)
+        self.assertEqual(output['findings'], [])
+        self.assertGreater(output['baseline']['suppressed'], 0)
+        
+        # A new image is reported on its own
+        self.page.write_text(self.page.read_text().replace('</main>', '  <img src="/new.png" alt="">\n</main>'))
+        code, output = self.analyze('--baseline', str(baseline))
+        self.assertEqual(code, 1)
+        self.assertEqual({(f['type'], f['line']) for f in output['findings']}, {('image_cls', 6)})
+
+if __name__ == '__main__':
+    unittest.main()